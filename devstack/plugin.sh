@@ -228,6 +228,7 @@ function install_ec2api() {
 function start_ec2api() {
     screen_it ec2-api "cd $EC2API_DIR && $EC2API_BIN_DIR/ec2-api --config-file $EC2API_CONF_DIR/ec2api.conf"
     screen_it ec2-api-metadata "cd $EC2API_DIR && $EC2API_BIN_DIR/ec2-api-metadata --config-file $EC2API_CONF_DIR/ec2api.conf"
+    screen_it ec2-api-image-importer "cd $EC2API_DIR && $EC2API_BIN_DIR/ec2-api-image-importer --config-file $EC2API_CONF_DIR/ec2api.conf"
 }
 
 
@@ -236,6 +237,7 @@ function stop_ec2api() {
     # Kill the ec2api screen windows
     screen -S $SCREEN_NAME -p ec2-api -X kill
     screen -S $SCREEN_NAME -p ec2-api-metadata -X kill
+    screen -S $SCREEN_NAME -p ec2-api-image-importer -X kill
 }
 
 function cleanup_ec2api() {
@@ -15,25 +15,30 @@
 """
 Starting point for routing EC2 requests.
 """
+import collections
+import datetime
 import hashlib
 import sys
 
+from keystoneclient.contrib.ec2 import utils as ec2_utils
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import timeutils
-import requests
 import six
 import webob
 import webob.dec
 import webob.exc
 
 from ec2api.api import apirequest
+from ec2api.api import clients
 from ec2api.api import ec2utils
 from ec2api.api import faults
 from ec2api import context
 from ec2api import exception
+from ec2api import http_pool
 from ec2api.i18n import _
+from ec2api import utils
 from ec2api import wsgi
 
 
@@ -49,12 +54,31 @@ ec2_opts = [
     cfg.IntOpt('ec2_timestamp_expiry',
                default=300,
                help='Time in seconds before ec2 timestamp expires'),
+    cfg.IntOpt('keystone_ec2_tokens_cache_time',
+               default=0,
+               help='Time in seconds to reuse a Keystone token got for an '
+                    'EC2 access key. Signatures of next requests with the '
+                    'access key are verified locally by its EC2 secret key, '
+                    'which is got from Keystone and kept in memory. A '
+                    'revoked token or a deleted EC2 credential is accepted '
+                    'until the time passes, so it is limited by 300 '
+                    'seconds. Zero disables the cache.'),
+    cfg.IntOpt('keystone_ec2_tokens_cache_size',
+               default=1000,
+               help='Maximum number of cached Keystone tokens'),
+    cfg.BoolOpt('stream_api_response',
+                default=False,
+                help='Send EC2 API responses by chunks while they are '
+                     'rendered instead of rendering whole responses first'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(ec2_opts)
 CONF.import_opt('use_forwarded_for', 'ec2api.api.auth')
 
+# NOTE(ft): this limits the time while a revoked token is accepted
+TOKEN_CACHE_MAX_TIME = 300
+
 
 EMPTY_SHA256_HASH = (
     'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855')
@@ -120,6 +144,52 @@ class InvalidCredentialsException(Exception):
         self.msg = msg
 
 
+class TokenCache(object):
+
+    """LRU cache of Keystone auth data with per entry expiration.
+
+    Entries are keyed by EC2 access keys and keep the EC2 secret key to
+    verify signatures of requests.
+    """
+
+    def __init__(self):
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return (secret, auth_data) cached for the access key or None."""
+        entry = self._entries.pop(key, None)
+        if entry is None or entry[0] <= timeutils.utcnow():
+            self.misses += 1
+            return None
+        self._entries[key] = entry
+        self.hits += 1
+        return entry[1:]
+
+    def put(self, key, secret, auth_data, expires_at):
+        self._entries.pop(key, None)
+        while (self._entries and
+                len(self._entries) >= CONF.keystone_ec2_tokens_cache_size):
+            self._entries.popitem(last=False)
+        if CONF.keystone_ec2_tokens_cache_size > 0:
+            self._entries[key] = (expires_at, secret, auth_data)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def revoke_token(self, token_id):
+        for key, (_expires_at, _secret, auth_data) in self._entries.items():
+            if auth_data['token_id'] == token_id:
+                del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
 class EC2KeystoneAuth(wsgi.Middleware):
 
     """Authenticate an EC2 request with keystone and convert to context."""
@@ -171,6 +241,104 @@ class EC2KeystoneAuth(wsgi.Middleware):
         cred_str = auth_str.partition("Credential=")[2].split(',')[0]
         return cred_str.split("/")[0]
 
+    def _get_cached_auth_data(self, cred_dict):
+        """Return cached auth data if the request is signed by its secret."""
+        entry = token_cache.get(cred_dict['access'])
+        LOG.debug('Keystone token cache: %(hits)s hits, '
+                  '%(misses)s misses',
+                  {'hits': token_cache.hits,
+                   'misses': token_cache.misses})
+        if entry is None:
+            return None
+        secret, auth_data = entry
+        # NOTE(ft): this repeats Keystone's check of EC2 signatures, so
+        # a request is accepted here only if Keystone would accept it
+        signer = ec2_utils.Ec2Signer(secret)
+        credentials = dict(cred_dict)
+        signature = str(cred_dict['signature'])
+        if utils.constant_time_compare(str(signer.generate(credentials)),
+                                       signature):
+            return auth_data
+        # NOTE(ft): some client libraries don't use the port when signing
+        # requests
+        if ':' in credentials['host']:
+            credentials['host'] = credentials['host'].split(':')[0]
+            if utils.constant_time_compare(
+                    str(signer.generate(credentials)), signature):
+                return auth_data
+        # NOTE(ft): the secret key may be changed, so the request and the
+        # next ones are authenticated by Keystone
+        token_cache.invalidate(cred_dict['access'])
+        return None
+
+    def _get_ec2_secret(self, access, auth_data):
+        """Get the EC2 secret key of the access key from Keystone."""
+        url = '%s/users/%s/credentials/OS-EC2/%s' % (
+            CONF.keystone_url, auth_data['user_id'], access)
+        response = http_pool.request(
+            'GET', url, headers={'X-Auth-Token': auth_data['token_id']})
+        if response.status_code != 200:
+            LOG.debug('Failed to get EC2 secret key from Keystone: %s',
+                      response.reason)
+            return None
+        try:
+            return response.json()['credential']['secret']
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def _get_cache_expiration(self, token_expires):
+        cache_time = min(CONF.keystone_ec2_tokens_cache_time,
+                         TOKEN_CACHE_MAX_TIME)
+        expires_at = (timeutils.utcnow() +
+                      datetime.timedelta(seconds=cache_time))
+        if token_expires:
+            token_expires_at = timeutils.normalize_time(
+                timeutils.parse_isotime(token_expires))
+            expires_at = min(expires_at, token_expires_at)
+        return expires_at
+
+    def _authenticate(self, request_id, cred_dict):
+        """Get auth data for EC2 credentials from Keystone.
+
+        Return a dict of auth data or an EC2 error response.
+        """
+        token_url = CONF.keystone_ec2_tokens_url
+        if "ec2" in token_url:
+            creds = {'ec2Credentials': cred_dict}
+        else:
+            creds = {'auth': {'OS-KSEC2:ec2Credentials': cred_dict}}
+        creds_json = jsonutils.dumps(creds)
+        headers = {'Content-Type': 'application/json'}
+
+        response = http_pool.request('POST', token_url,
+                                     data=creds_json, headers=headers)
+        status_code = response.status_code
+        if status_code != 200:
+            msg = response.reason
+            return faults.ec2_error_response(request_id, "AuthFailure", msg,
+                                             status=status_code)
+        result = response.json()
+
+        try:
+            token = result['access']['token']
+            auth_data = {
+                'token_id': token['id'],
+                'token_expires': token.get('expires'),
+                'user_id': result['access']['user']['id'],
+                'project_id': token['tenant']['id'],
+                'user_name': result['access']['user'].get('name'),
+                'project_name': token['tenant'].get('name'),
+                'roles': [role['name'] for role
+                          in result['access']['user']['roles']],
+                'catalog': result['access']['serviceCatalog'],
+            }
+        except (AttributeError, KeyError) as e:
+            LOG.exception(_("Keystone failure: %s") % e)
+            msg = _("Failure communicating with keystone")
+            return faults.ec2_error_response(request_id, "AuthFailure", msg,
+                                             status=400)
+        return auth_data
+
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
         request_id = context.generate_request_id()
@@ -210,55 +378,47 @@ class EC2KeystoneAuth(wsgi.Middleware):
             'body_hash': body_hash
         }
 
-        token_url = CONF.keystone_ec2_tokens_url
-        if "ec2" in token_url:
-            creds = {'ec2Credentials': cred_dict}
-        else:
-            creds = {'auth': {'OS-KSEC2:ec2Credentials': cred_dict}}
-        creds_json = jsonutils.dumps(creds)
-        headers = {'Content-Type': 'application/json'}
-
-        response = requests.request('POST', token_url,
-                                    data=creds_json, headers=headers)
-        status_code = response.status_code
-        if status_code != 200:
-            msg = response.reason
-            return faults.ec2_error_response(request_id, "AuthFailure", msg,
-                                             status=status_code)
-        result = response.json()
-
-        try:
-            token_id = result['access']['token']['id']
-            user_id = result['access']['user']['id']
-            project_id = result['access']['token']['tenant']['id']
-            user_name = result['access']['user'].get('name')
-            project_name = result['access']['token']['tenant'].get('name')
-            roles = [role['name'] for role
-                     in result['access']['user']['roles']]
-        except (AttributeError, KeyError) as e:
-            LOG.exception(_("Keystone failure: %s") % e)
-            msg = _("Failure communicating with keystone")
-            return faults.ec2_error_response(request_id, "AuthFailure", msg,
-                                             status=400)
+        use_cache = CONF.keystone_ec2_tokens_cache_time > 0
+        auth_data = None
+        if use_cache:
+            auth_data = self._get_cached_auth_data(cred_dict)
+        if auth_data is None:
+            auth_data = self._authenticate(request_id, cred_dict)
+            if not isinstance(auth_data, dict):
+                return auth_data
+            if use_cache:
+                secret = self._get_ec2_secret(access, auth_data)
+                if secret:
+                    token_cache.put(
+                        access, secret, auth_data,
+                        self._get_cache_expiration(
+                            auth_data['token_expires']))
 
         remote_address = req.remote_addr
         if CONF.use_forwarded_for:
             remote_address = req.headers.get('X-Forwarded-For',
                                              remote_address)
 
-        catalog = result['access']['serviceCatalog']
-        ctxt = context.RequestContext(user_id, project_id,
-                                      user_name=user_name,
-                                      project_name=project_name,
-                                      roles=roles,
-                                      auth_token=token_id,
+        ctxt = context.RequestContext(auth_data['user_id'],
+                                      auth_data['project_id'],
+                                      user_name=auth_data['user_name'],
+                                      project_name=auth_data['project_name'],
+                                      roles=list(auth_data['roles']),
+                                      auth_token=auth_data['token_id'],
                                       remote_address=remote_address,
-                                      service_catalog=catalog,
+                                      service_catalog=auth_data['catalog'],
                                       api_version=req.params.get('Version'))
 
         req.environ['ec2api.context'] = ctxt
 
-        return self.application
+        if not use_cache:
+            return self.application
+        response = req.get_response(self.application)
+        # NOTE(ft): OpenStack services reject a revoked token, so drop it
+        # to authenticate next requests by Keystone again
+        if response.status_int == 401:
+            token_cache.revoke_token(auth_data['token_id'])
+        return response
 
 
 class Requestify(wsgi.Middleware):
@@ -299,7 +459,8 @@ class Requestify(wsgi.Middleware):
 
         # Success!
         api_request = apirequest.APIRequest(
-            action, req.params['Version'], args)
+            action, req.params['Version'], args,
+            streaming=CONF.stream_api_response)
         req.environ['ec2.request'] = api_request
         return self.application
 
@@ -391,12 +552,27 @@ class Executor(wsgi.Application):
         try:
             result = api_request.invoke(context)
         except Exception as ex:
-            return ec2_error_ex(
-                ex, req, unexpected=not isinstance(ex, exception.EC2Exception))
+            unexpected = not isinstance(ex, exception.EC2Exception)
+            if unexpected:
+                # NOTE(ft): find endpoints in the catalog again in case
+                # the failure is caused by a moved service
+                clients.reset_endpoints()
+            return ec2_error_ex(ex, req, unexpected=unexpected)
         else:
-            resp = webob.Response()
+            LOG.debug('DB identity map of %(action)s: %(hits)s hits, '
+                      '%(misses)s misses',
+                      {'action': api_request.action,
+                       'hits': context.db_identity_map.hits,
+                       'misses': context.db_identity_map.misses},
+                      context=context)
+            if api_request.streaming:
+                # NOTE(ft): the response has no Content-Length, so WSGI
+                # server sends it with chunked transfer encoding
+                resp = webob.Response(app_iter=result)
+            else:
+                resp = webob.Response()
+                resp.body = str(result)
             resp.status = 200
             resp.headers['Content-Type'] = 'text/xml'
-            resp.body = str(result)
 
             return resp
@@ -17,13 +17,9 @@ APIRequest class
 """
 
 import datetime
-# TODO(termie): replace minidom with etree
-from xml.dom import minidom
 
-from lxml import etree
 from oslo_config import cfg
 from oslo_log import log as logging
-from oslo_utils import encodeutils
 import six
 
 from ec2api.api import cloud
@@ -49,18 +45,44 @@ def _database_to_isoformat(datetimeobj):
     return datetimeobj.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + 'Z'
 
 
+# NOTE(ft): a number of rendered text pieces to join into one response chunk,
+# it is about 40-80 KB of xml for describe operations
+RESPONSE_CHUNK_PIECES = 2000
+
+# NOTE(ft): response keys are a limited set of names, so cache their xml form
+_xmlcase_names = {}
+
+
+def _get_xml_name(name):
+    xml_name = _xmlcase_names.get(name)
+    if xml_name is None:
+        xml_name = _xmlcase_names[name] = _underscore_to_xmlcase(name)
+    return xml_name
+
+
+def _escape_xml_text(text):
+    return (text.replace('&', '&amp;').replace('<', '&lt;').
+            replace('>', '&gt;').replace('\r', '&#13;'))
+
+
 class APIRequest(object):
 
-    def __init__(self, action, version, args):
+    def __init__(self, action, version, args, streaming=False):
         self.action = action
         self.version = version
         self.args = args
+        self.streaming = streaming
         if CONF.full_vpc_support:
             self.controller = cloud.VpcCloudController()
         else:
             self.controller = cloud.CloudController()
 
     def invoke(self, context):
+        """Call the API method and render its result.
+
+        Return the whole xml response, or an iterator of the response chunks
+        if the request is streaming.
+        """
         try:
             method = getattr(self.controller,
                              ec2utils.camelcase_to_underscore(self.action))
@@ -91,30 +113,14 @@ class APIRequest(object):
 
         args = convert_dicts_to_lists(args)
         result = method(context, **args)
+        if self.streaming:
+            LOG.debug('Streaming %s response', self.action)
+            return self._render_response_chunks(result, context.request_id)
         return self._render_response(result, context.request_id)
 
     def _render_response(self, response_data, request_id):
-        xml = minidom.Document()
-
-        response_el = xml.createElement(self.action + 'Response')
-        response_el.setAttribute('xmlns',
-                                 'http://ec2.amazonaws.com/doc/%s/'
-                                 % self.version)
-        request_id_el = xml.createElement('requestId')
-        request_id_el.appendChild(xml.createTextNode(request_id))
-        response_el.appendChild(request_id_el)
-        if response_data is True:
-            self._render_dict(xml, response_el, {'return': 'true'})
-        else:
-            self._render_dict(xml, response_el, response_data)
-
-        xml.appendChild(response_el)
-
-        response = xml.toxml()
-        root = etree.fromstring(response)
-        response = etree.tostring(root, pretty_print=True)
-
-        xml.unlink()
+        response = ''.join(self._render_response_chunks(response_data,
+                                                        request_id))
 
         # Don't write private key to log
         if self.action != "CreateKeyPair":
@@ -124,33 +130,85 @@ class APIRequest(object):
 
         return response
 
-    def _render_dict(self, xml, el, data):
+    def _render_response_chunks(self, response_data, request_id):
+        """Render response data to a sequence of xml chunks.
+
+        The result is the same pretty printed xml in ascii encoding with
+        character references which lxml produces, but it is written in one
+        pass without building of a document tree. Items of top level sets
+        are rendered lazily, so a long response is never kept in memory
+        as a whole if it is consumed chunk by chunk.
+        """
+        if response_data is True:
+            response_data = {'return': 'true'}
+        out = ['<%sResponse xmlns="http://ec2.amazonaws.com/doc/%s/">\n'
+               % (self.action, self.version)]
+        self._render_data(out, 'requestId', request_id, '  ')
+        try:
+            for key in response_data.keys():
+                data = response_data[key]
+                if not isinstance(data, list) or not data:
+                    self._render_data(out, key, data, '  ')
+                    continue
+                el_name = _get_xml_name(key)
+                out.append('  <%s>\n' % el_name)
+                for item in data:
+                    self._render_data(out, 'item', item, '    ')
+                    if len(out) >= RESPONSE_CHUNK_PIECES:
+                        yield self._encode_chunk(out)
+                        out = []
+                out.append('  </%s>\n' % el_name)
+        except Exception:
+            LOG.debug(response_data)
+            raise
+        out.append('</%sResponse>\n' % self.action)
+        yield self._encode_chunk(out)
+
+    def _encode_chunk(self, out):
+        # NOTE(ft): join the rendered text once and encode it as ascii with
+        # character references to keep it readable for any client
+        return u''.join(out).encode('ascii', 'xmlcharrefreplace')
+
+    def _render_dict(self, out, data, indent):
         try:
             for key in data.keys():
-                val = data[key]
-                el.appendChild(self._render_data(xml, key, val))
+                self._render_data(out, key, data[key], indent)
         except Exception:
             LOG.debug(data)
             raise
 
-    def _render_data(self, xml, el_name, data):
-        el_name = _underscore_to_xmlcase(el_name)
-        data_el = xml.createElement(el_name)
+    def _render_data(self, out, el_name, data, indent):
+        el_name = _get_xml_name(el_name)
 
         if isinstance(data, list):
+            if not data:
+                out.append('%s<%s/>\n' % (indent, el_name))
+                return
+            out.append('%s<%s>\n' % (indent, el_name))
+            item_indent = indent + '  '
             for item in data:
-                data_el.appendChild(self._render_data(xml, 'item', item))
-        elif isinstance(data, dict):
-            self._render_dict(xml, data_el, data)
-        elif hasattr(data, '__dict__'):
-            self._render_dict(xml, data_el, data.__dict__)
-        elif isinstance(data, bool):
-            data_el.appendChild(xml.createTextNode(str(data).lower()))
-        elif isinstance(data, datetime.datetime):
-            data_el.appendChild(
-                xml.createTextNode(_database_to_isoformat(data)))
-        elif data is not None:
-            data_el.appendChild(xml.createTextNode(
-                encodeutils.safe_encode(six.text_type(data))))
-
-        return data_el
+                self._render_data(out, 'item', item, item_indent)
+        elif isinstance(data, dict) or hasattr(data, '__dict__'):
+            if not isinstance(data, dict):
+                data = data.__dict__
+            if not data:
+                out.append('%s<%s/>\n' % (indent, el_name))
+                return
+            out.append('%s<%s>\n' % (indent, el_name))
+            self._render_dict(out, data, indent + '  ')
+        else:
+            if isinstance(data, bool):
+                text = str(data).lower()
+            elif isinstance(data, datetime.datetime):
+                text = _database_to_isoformat(data)
+            elif data is not None:
+                text = _escape_xml_text(six.text_type(data))
+            else:
+                text = None
+            if not text:
+                out.append('%s<%s/>\n' % (indent, el_name))
+            else:
+                out.append('%s<%s>%s</%s>\n' % (indent, el_name, text,
+                                                 el_name))
+            return
+        out.append('%s</%s>\n' % (indent, el_name))
@@ -12,19 +12,31 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 
 from keystoneclient.v2_0 import client as kc
 from novaclient import client as novaclient
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
+import six
 
 from ec2api import context as ec2_context
-from ec2api.i18n import _
+from ec2api.i18n import _, _LW
 
 logger = logging.getLogger(__name__)
 
+clients_opts = [
+    cfg.StrOpt('os_region_name',
+               help='Region name of OpenStack services to use'),
+    cfg.IntOpt('endpoint_cache_time',
+               default=600,
+               help='Time in seconds to reuse OpenStack service endpoints '
+                    'found in a service catalog'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(clients_opts)
 
 
 try:
@@ -44,63 +56,92 @@ except ImportError:
     logger.info(_('glanceclient not available'))
 
 
+def _get_client(context, client_name, create_client):
+    """Return a client registered in the context or create it.
+
+    Clients are reused while one request is processed, so they reuse
+    their authentication data and connections.
+    """
+    registry = getattr(context, 'clients', None)
+    if not isinstance(registry, dict):
+        return create_client()
+    # NOTE(ft): metadata server substitutes project_id of its context
+    key = (client_name, context.project_id, context.auth_token)
+    client = registry.get(key)
+    if client is None:
+        client = registry[key] = create_client()
+    return client
+
+
 def nova(context, microversion=None):
-    args = {
-        'project_id': context.project_id,
-        'auth_url': CONF.keystone_url,
-        'username': None,
-        'api_key': None,
-        'auth_token': context.auth_token,
-        'bypass_url': _url_for(context, service_type='computev21'),
-    }
-    return novaclient.Client(microversion or 2, **args)
+    def create_client():
+        args = {
+            'project_id': context.project_id,
+            'auth_url': CONF.keystone_url,
+            'username': None,
+            'api_key': None,
+            'auth_token': context.auth_token,
+            'bypass_url': _url_for(context, service_type='computev21'),
+            # NOTE(ft): share keep-alive connections to the same endpoint
+            # between clients
+            'connection_pool': True,
+        }
+        return novaclient.Client(microversion or 2, **args)
+
+    return _get_client(context, ('nova', microversion), create_client)
 
 
 def neutron(context):
     if neutronclient is None:
         return None
 
-    args = {
-        'auth_url': CONF.keystone_url,
-        'service_type': 'network',
-        'token': context.auth_token,
-        'endpoint_url': _url_for(context, service_type='network'),
-    }
+    def create_client():
+        args = {
+            'auth_url': CONF.keystone_url,
+            'service_type': 'network',
+            'token': context.auth_token,
+            'endpoint_url': _url_for(context, service_type='network'),
+        }
+        return neutronclient.Client(**args)
 
-    return neutronclient.Client(**args)
+    return _get_client(context, 'neutron', create_client)
 
 
 def glance(context):
     if glanceclient is None:
         return None
 
-    args = {
-        'auth_url': CONF.keystone_url,
-        'service_type': 'image',
-        'token': context.auth_token,
-    }
+    def create_client():
+        args = {
+            'auth_url': CONF.keystone_url,
+            'service_type': 'image',
+            'token': context.auth_token,
+        }
+        return glanceclient.Client(
+            "1", endpoint=_url_for(context, service_type='image'), **args)
 
-    return glanceclient.Client(
-        "1", endpoint=_url_for(context, service_type='image'), **args)
+    return _get_client(context, 'glance', create_client)
 
 
 def cinder(context):
     if cinderclient is None:
         return nova(context, 'volume')
 
-    args = {
-        'service_type': 'volume',
-        'auth_url': CONF.keystone_url,
-        'username': None,
-        'api_key': None,
-    }
+    def create_client():
+        args = {
+            'service_type': 'volume',
+            'auth_url': CONF.keystone_url,
+            'username': None,
+            'api_key': None,
+        }
 
-    _cinder = cinderclient.Client('1', **args)
-    management_url = _url_for(context, service_type='volume')
-    _cinder.client.auth_token = context.auth_token
-    _cinder.client.management_url = management_url
+        _cinder = cinderclient.Client('1', **args)
+        management_url = _url_for(context, service_type='volume')
+        _cinder.client.auth_token = context.auth_token
+        _cinder.client.management_url = management_url
+        return _cinder
 
-    return _cinder
+    return _get_client(context, 'cinder', create_client)
 
 
 def keystone(context):
@@ -117,26 +158,93 @@ def nova_cert(context):
     return _cert_api
 
 
+# NOTE(ft): endpoints by (region, service type, interface). An endpoint is
+# stored as a template where the project id is a parameter, because some
+# services (e.g. Cinder) have project specific endpoints
+_endpoints = {}
+
+
 def _url_for(context, **kwargs):
+    service_type = kwargs["service_type"]
+    interface = kwargs.get("interface", "publicURL")
+    key = (CONF.os_region_name, service_type, interface)
+
+    cached = _endpoints.get(key)
+    if cached and cached[1] > time.time():
+        return _expand_endpoint(context, cached[0])
+
     service_catalog = context.service_catalog
     if not service_catalog:
-        catalog = keystone(context).service_catalog.catalog
+        try:
+            catalog = keystone(context).service_catalog.catalog
+        except Exception:
+            if not cached:
+                raise
+            logger.warning(_LW('Failed to refresh %s endpoint, the cached '
+                               'one is used'), service_type, exc_info=True)
+            return _expand_endpoint(context, cached[0])
         service_catalog = catalog["serviceCatalog"]
         context.service_catalog = service_catalog
 
-    service_type = kwargs["service_type"]
+    _cache_endpoints(context, service_catalog)
+    return _find_endpoint(service_catalog, service_type, interface)
+
+
+def reset_endpoints():
+    """Forget cached endpoints to find them in a service catalog again.
+
+    It's called when a call to OpenStack fails, because the failure can be
+    caused by a moved service.
+    """
+    _endpoints.clear()
+
+
+def _cache_endpoints(context, service_catalog):
+    """Cache all endpoints of the catalog to not scan it for next clients."""
+    urls = {}
+    for service in service_catalog:
+        for endpoint in service.get("endpoints", []):
+            if (CONF.os_region_name and
+                    endpoint.get("region") != CONF.os_region_name):
+                continue
+            for interface, url in endpoint.items():
+                if interface.endswith('URL'):
+                    urls.setdefault(
+                        (CONF.os_region_name, service["type"], interface),
+                        url)
+    expires_at = time.time() + CONF.endpoint_cache_time
+    for key, url in urls.items():
+        _endpoints[key] = (_make_endpoint_template(context, url), expires_at)
+
+
+def _find_endpoint(service_catalog, service_type, interface):
     for service in service_catalog:
         if service["type"] != service_type:
             continue
         for endpoint in service["endpoints"]:
-            if "publicURL" in endpoint:
-                return endpoint["publicURL"]
+            if (CONF.os_region_name and
+                    endpoint.get("region") != CONF.os_region_name):
+                continue
+            if interface in endpoint:
+                return endpoint[interface]
         else:
             return None
 
     return None
 
 
+def _make_endpoint_template(context, url):
+    template = url.replace('%', '%%')
+    if (isinstance(context.project_id, six.string_types) and
+            context.project_id):
+        template = template.replace(context.project_id, '%(project_id)s')
+    return template
+
+
+def _expand_endpoint(context, template):
+    return template % {'project_id': context.project_id}
+
+
 class _rpcapi_CertAPI(object):
     '''Client side of the cert rpc API.'''
 
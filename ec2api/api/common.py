@@ -12,28 +12,51 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import base64
 import collections
 import fnmatch
+import hashlib
+import hmac
 import inspect
+import json
+import re
+import sys
+import time
 
+from eventlet import greenpool
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import excutils
+import six
 
 from ec2api.api import ec2utils
 from ec2api.api import validator
 from ec2api.db import api as db_api
 from ec2api import exception
-from ec2api.i18n import _LW
+from ec2api.i18n import _, _LE, _LW
+from ec2api import utils
 
 
 ec2_opts = [
     cfg.BoolOpt('full_vpc_support',
                 default=True,
                 help='True if server supports Neutron for full VPC access'),
+    cfg.StrOpt('pagination_token_key',
+               default='',
+               secret=True,
+               help='Key to sign NextToken values of paginated describe '
+                    'operations. It must be the same for all API workers '
+                    'and hosts. If not set, a key derived from '
+                    'admin_password is used'),
+    cfg.IntOpt('os_request_concurrency',
+               default=10,
+               help='Maximum number of concurrent requests to OpenStack '
+                    'which are sent to process a batch of resources'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(ec2_opts)
+CONF.import_opt('admin_password', 'ec2api.context')
 LOG = logging.getLogger(__name__)
 
 
@@ -92,6 +115,31 @@ class OnCrashCleaner(object):
                 pass
 
 
+def call_concurrently(func, args_list, on_success=None):
+    """Call func with every args of args_list by a bounded green pool.
+
+    on_success is called with args of every succeeded call, e.g. to register
+    a cleanup. The first raised exception is reraised after all calls are
+    finished. Returns results in order of args_list.
+    """
+    pool = greenpool.GreenPool(max(CONF.os_request_concurrency, 1))
+    threads = [pool.spawn(func, *args) for args in args_list]
+    results = []
+    exc_info = None
+    for args, thread in zip(args_list, threads):
+        try:
+            results.append(thread.wait())
+        except Exception:
+            if exc_info is None:
+                exc_info = sys.exc_info()
+            continue
+        if on_success:
+            on_success(*args)
+    if exc_info:
+        six.reraise(*exc_info)
+    return results
+
+
 class Validator(object):
 
     def __init__(self, param_name="", action="", params=[]):
@@ -255,12 +303,71 @@ class Validator(object):
 
 VPC_KINDS = ['vpc', 'igw', 'subnet', 'eni', 'dopt', 'eipalloc', 'sg', 'rtb']
 
+_wildcard_chars = re.compile('[*?[]')
+
+
+def _get_pagination_token_key():
+    if CONF.pagination_token_key:
+        return CONF.pagination_token_key
+    # NOTE(ft): the project id alone is known to every caller, so a token
+    # signed by it can be forged. The admin password is secret and the same
+    # for all workers and hosts, so a key derived from it is accepted by
+    # any of them
+    if CONF.admin_password:
+        return hmac.new(str(CONF.admin_password), 'pagination_token_key',
+                        hashlib.sha256).hexdigest()
+    LOG.error(_LE('Neither pagination_token_key nor admin_password is set '
+                  'to sign pagination tokens'))
+    raise exception.Unsupported(reason=_('Pagination is not configured'))
+
+
+def _sign_next_token(key, context, body):
+    key = str('%s:%s' % (key, context.project_id))
+    return hmac.new(key, body, hashlib.sha256).hexdigest()
+
+
+def make_next_token(context, kind, marker):
+    """Build an opaque continuation token of a paginated describe."""
+    body = base64.urlsafe_b64encode(json.dumps([kind, marker]))
+    signature = _sign_next_token(_get_pagination_token_key(), context, body)
+    return '%s.%s' % (body, signature)
+
+
+def parse_next_token(context, kind, next_token):
+    """Return a marker from a token built by make_next_token."""
+    key = _get_pagination_token_key()
+    try:
+        body, signature = str(next_token).split('.')
+        if not utils.constant_time_compare(
+                signature, _sign_next_token(key, context, body)):
+            raise ValueError()
+        token_kind, marker = json.loads(base64.urlsafe_b64decode(body))
+    except Exception:
+        token_kind = marker = None
+    if token_kind != kind:
+        raise exception.InvalidParameterValue(
+            value=next_token, parameter='NextToken',
+            reason=_('The token is invalid'))
+    return marker
+
 
 class UniversalDescriber(object):
     """Abstract Describer class for various Describe implementations."""
 
     KIND = ''
     FILTER_MAP = {}
+    # NOTE(ft): describers which OpenStack list call supports pagination
+    # set this to True and make get_os_items to return items which follow
+    # self.marker in a stable order, and self.limit items at most if
+    # self.limit is set. OS items of other describers are sorted by their ids
+    # and paged here.
+    OS_PAGINATION = False
+
+    marker = None
+    limit = None
+    next_token = None
+    os_filters = {}
+    _filters = None
 
     def format(self, item=None, os_item=None):
         pass
@@ -274,6 +381,15 @@ class UniversalDescriber(object):
     def get_os_items(self):
         return []
 
+    def get_dependencies(self):
+        """Return functions to get data needed to format items.
+
+        The result is a dict of describer attribute names and functions.
+        The functions are called concurrently with getting DB and OS items,
+        and the attributes are set to their results before formatting.
+        """
+        return {}
+
     def auto_update_db(self, item, os_item):
         if item is None and self.KIND not in VPC_KINDS:
             item = ec2utils.auto_create_db_item(self.context, self.KIND,
@@ -293,15 +409,58 @@ class UniversalDescriber(object):
         if fnmatch.fnmatch(value, filter_value):
             return True
 
-    def filtered_out(self, item, filters):
+    def compile_filter_values(self, filter_values):
+        """Return a function to check a value against filter values.
+
+        Exact values are looked up in a set, wildcards are translated to
+        regexps once, other values are checked by is_filtering_value_found.
+        """
+        exact_values = set()
+        patterns = []
+        other_values = []
+        for filter_value in filter_values:
+            if not isinstance(filter_value, six.string_types):
+                other_values.append(filter_value)
+            elif _wildcard_chars.search(filter_value):
+                patterns.append(
+                    re.compile(fnmatch.translate(filter_value)).match)
+            else:
+                exact_values.add(filter_value)
+
+        def is_found(value):
+            if isinstance(value, six.string_types):
+                if value in exact_values:
+                    return True
+                if any(match(value) for match in patterns):
+                    return True
+            return any(self.is_filtering_value_found(filter_value, value)
+                       for filter_value in other_values)
+
+        return is_found
+
+    def compile_filter(self, filters):
         if filters is None:
-            return False
+            return None
+        compiled_filter = []
         for filter in filters:
             filter_name = self.FILTER_MAP.get(filter['name'])
             if filter_name is None:
                 raise exception.InvalidParameterValue(
                     value=filter['name'], parameter='filter',
                     reason='invalid filter')
+            compiled_filter.append(
+                (filter_name, self.compile_filter_values(filter['value'])))
+        return compiled_filter
+
+    def filtered_out(self, item, filters):
+        if filters is None:
+            return False
+        # NOTE(ft): describe checks all items against the same filters,
+        # so compile them once
+        if filters is not self._filters:
+            self._compiled_filter = self.compile_filter(filters)
+            self._filters = filters
+        for filter_name, is_found in self._compiled_filter:
             if isinstance(filter_name, list):
                 value_set = item.get(filter_name[0], [])
                 values = []
@@ -312,24 +471,113 @@ class UniversalDescriber(object):
             else:
                 value = item.get(filter_name)
                 values = [value] if value else []
-            if not values:
-                return True
-            filter_values = filter['value']
-            for filter_value in filter_values:
-                if any(self.is_filtering_value_found(filter_value, value)
-                       for value in values):
-                    break
-            else:
+            if not any(is_found(value) for value in values):
                 return True
         return False
 
-    def describe(self, context, ids=None, names=None, filter=None):
+    def get_exact_filter_values(self, filters, filter_name):
+        """Return a set of values of filters which have no wildcards.
+
+        Return None if there is no such filter or if it can't be matched
+        exactly.
+        """
+        exact_values = None
+        for filter in filters or []:
+            if filter['name'] != filter_name:
+                continue
+            filter_values = filter['value']
+            if any(not isinstance(v, six.string_types) or
+                   _wildcard_chars.search(v)
+                   for v in filter_values):
+                return None
+            exact_values = (set(filter_values) if exact_values is None else
+                            exact_values & set(filter_values))
+        return exact_values
+
+    def get_os_filters(self, filters):
+        """Return filters to pass to OpenStack list call.
+
+        Describers override this to let OpenStack skip objects which
+        don't match the request's filters. The filters must not be
+        stricter than the request's ones because all described objects are
+        filtered anyway.
+        """
+        return {}
+
+    def start_pagination(self, selective_describe, max_results, next_token):
+        if max_results is None and next_token is None:
+            return False
+        if selective_describe:
+            msg = _('The parameter maxResults cannot be used with '
+                    'specified ids')
+            raise exception.InvalidParameterCombination(msg)
+        if max_results is not None and max_results < 1:
+            raise exception.InvalidParameterValue(
+                value=max_results, parameter='MaxResults',
+                reason=_('The value must be greater than zero'))
+        self.limit = max_results
+        if next_token is not None:
+            self.marker = parse_next_token(self.context, self.KIND,
+                                           next_token)
+        return True
+
+    def get_page(self, items, get_key):
+        if self.OS_PAGINATION:
+            # NOTE(ft): OpenStack may silently cut a page by its own limit,
+            # so a full page is considered as not last one
+            is_last_page = self.limit is None or len(items) < self.limit
+        else:
+            items = sorted(items, key=get_key)
+            if self.marker is not None:
+                items = [i for i in items if get_key(i) > self.marker]
+            is_last_page = self.limit is None or len(items) <= self.limit
+        if not is_last_page:
+            items = items[:self.limit]
+            self.next_token = make_next_token(self.context, self.KIND,
+                                              get_key(items[-1]))
+        return items
+
+    def _spawn_dependencies(self):
+        dependencies = self.get_dependencies()
+        pile = greenpool.GreenPile(max(len(dependencies), 1))
+        for name, get_dependency in six.iteritems(dependencies):
+            pile.spawn(self._get_dependency, name, get_dependency)
+        return pile
+
+    def _get_dependency(self, name, get_dependency):
+        start_time = time.time()
+        result = get_dependency()
+        LOG.debug('%(describer)s got %(name)s in %(time).3f seconds',
+                  {'describer': self.__class__.__name__,
+                   'name': name,
+                   'time': time.time() - start_time})
+        return name, result
+
+    def describe(self, context, ids=None, names=None, filter=None,
+                 max_results=None, next_token=None):
         self.context = context
         selective_describe = ids is not None or names is not None
+        paginated_describe = self.start_pagination(
+            selective_describe, max_results, next_token)
         self.ids = set(ids or [])
         self.names = set(names or [])
-        self.items = self.get_db_items()
-        self.os_items = self.get_os_items()
+        # NOTE(ft): data which doesn't depend on DB and OS items is got
+        # in parallel with them
+        dependencies = self._spawn_dependencies()
+        try:
+            self.items = self.get_db_items()
+            self.os_filters = self.get_os_filters(filter)
+            self.os_items = self.get_os_items()
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                # NOTE(ft): don't leave them being got after the request
+                dependencies.pool.waitall()
+        # NOTE(ft): an unused GreenPile blocks on iteration forever
+        if dependencies.used:
+            for name, result in dependencies:
+                setattr(self, name, result)
+        if paginated_describe:
+            self.os_items = self.get_page(self.os_items, self.get_id)
         formatted_items = []
 
         self.items_dict = dict((i['os_id'], i) for i in (self.items or []))
@@ -357,9 +605,12 @@ class UniversalDescriber(object):
                     not self.filtered_out(formatted_item, filter)):
                 formatted_items.append(formatted_item)
         # NOTE(Alex): delete obsolete items
-        for item in self.items:
-            if item['id'] not in paired_items_ids:
-                self.delete_obsolete_item(item)
+        # NOTE(ft): a page or filtered OS items don't contain all OS items,
+        # so obsolete items can't be detected
+        if not paginated_describe and not self.os_filters:
+            for item in self.items:
+                if item['id'] not in paired_items_ids:
+                    self.delete_obsolete_item(item)
         # NOTE(Alex): some requested items are not found
         if self.ids or self.names:
             params = {'id': next(iter(self.ids or self.names))}
@@ -399,7 +650,8 @@ class TaggableItemsDescriber(UniversalDescriber):
             # errors in AWS docs)
             formatted_item['tagSet'] = formatted_tags
 
-    def describe(self, context, ids=None, names=None, filter=None):
+    def describe(self, context, ids=None, names=None, filter=None,
+                 max_results=None, next_token=None):
         if filter:
             for f in filter:
                 if f['name'].startswith('tag:'):
@@ -409,7 +661,8 @@ class TaggableItemsDescriber(UniversalDescriber):
                     f['value'] = [{'key': tag_key,
                                    'value': tag_values}]
         return super(TaggableItemsDescriber, self).describe(
-            context, ids, names, filter)
+            context, ids, names, filter,
+            max_results=max_results, next_token=next_token)
 
     def is_filtering_value_found(self, filter_value, value):
         if isinstance(filter_value, dict):
@@ -431,10 +684,18 @@ class TaggableItemsDescriber(UniversalDescriber):
 class NonOpenstackItemsDescriber(UniversalDescriber):
     """Describer class for non-Openstack items Describe implementations."""
 
-    def describe(self, context, ids=None, names=None, filter=None):
+    def get_paging_key(self, item):
+        return item['id']
+
+    def describe(self, context, ids=None, names=None, filter=None,
+                 max_results=None, next_token=None):
         self.context = context
         self.ids = ids
+        paginated_describe = self.start_pagination(
+            ids is not None, max_results, next_token)
         self.items = self.get_db_items()
+        if paginated_describe:
+            self.items = self.get_page(self.items, self.get_paging_key)
         formatted_items = []
 
         for item in self.items:
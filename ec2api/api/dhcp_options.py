@@ -134,7 +134,8 @@ def associate_dhcp_options(context, dhcp_options_id, vpc_id):
         dhcp_options_id = dhcp_options['id']
     neutron = clients.neutron(context)
     os_ports = neutron.list_ports()['ports']
-    network_interfaces = db_api.get_items(context, 'eni')
+    network_interfaces = [eni for eni in db_api.get_items(context, 'eni')
+                          if eni['vpc_id'] == vpc['id']]
     rollback_dhcp_options_object = (
             db_api.get_item_by_id(context, rollback_dhcp_options_id)
             if dhcp_options_id is not None else
@@ -143,16 +144,20 @@ def associate_dhcp_options(context, dhcp_options_id, vpc_id):
         _associate_vpc_item(context, vpc, dhcp_options_id)
         cleaner.addCleanup(_associate_vpc_item, context, vpc,
                            rollback_dhcp_options_id)
-        for network_interface in network_interfaces:
-            os_port = next((p for p in os_ports
-                            if p['id'] == network_interface['os_id']), None)
-            if not os_port:
-                continue
-            _add_dhcp_opts_to_port(context, dhcp_options,
-                                   network_interface, os_port, neutron)
+        os_ports = dict((os_port['id'], os_port) for os_port in os_ports)
+        ports_args = [(context, dhcp_options, network_interface,
+                       os_ports[network_interface['os_id']], neutron)
+                      for network_interface in network_interfaces
+                      if network_interface['os_id'] in os_ports]
+
+        def add_rollback(context, dhcp_options, network_interface, os_port,
+                         neutron):
             cleaner.addCleanup(_add_dhcp_opts_to_port, context,
                                rollback_dhcp_options_object, network_interface,
                                os_port, neutron)
+
+        common.call_concurrently(_add_dhcp_opts_to_port, ports_args,
+                                 on_success=add_rollback)
     return True
 
 
@@ -294,7 +294,7 @@ def os_id_to_ec2_id(context, kind, os_id, items_by_os_id=None,
 
 def get_os_image(context, ec2_image_id):
     kind = get_ec2_id_kind(ec2_image_id)
-    images = db_api.get_public_items(context, kind, (ec2_image_id,))
+    images = db_api.get_public_items(context, (kind,), (ec2_image_id,))
     image = (images[0] if len(images) else
              get_db_item(context, ec2_image_id))
     glance = clients.glance(context)
@@ -14,21 +14,27 @@
 
 import base64
 import binascii
+import collections
+import contextlib
+import functools
 import itertools
 import json
 import os
 import re
-import shutil
 import tarfile
-import tempfile
 import time
 
 import boto.s3.connection
-import eventlet
+from cryptography.hazmat import backends
+from cryptography.hazmat.primitives import ciphers
+from cryptography.hazmat.primitives.ciphers import algorithms
+from cryptography.hazmat.primitives.ciphers import modes
+from cryptography.hazmat.primitives import padding
+from eventlet import greenpool
 from glanceclient.common import exceptions as glance_exception
 from lxml import etree
-from oslo_concurrency import processutils
 from oslo_config import cfg
+from oslo_log import log as logging
 from oslo_utils import timeutils
 
 from ec2api.api import clients
@@ -38,13 +44,10 @@ from ec2api.api import instance as instance_api
 from ec2api import context as ec2_context
 from ec2api.db import api as db_api
 from ec2api import exception
-from ec2api.i18n import _
+from ec2api.i18n import _, _LE, _LI, _LW
 
 
 s3_opts = [
-    cfg.StrOpt('image_decryption_dir',
-               default='/tmp',
-               help='Parent directory for tempdir used for image decryption'),
     cfg.StrOpt('s3_host',
                default='$my_ip',
                help='Hostname or IP for OpenStack to use when accessing '
@@ -59,10 +62,24 @@ s3_opts = [
                 default=False,
                 help='Whether to affix the tenant id to the access key '
                      'when downloading from S3'),
+    cfg.IntOpt('s3_download_workers',
+               default=4,
+               help='Number of image parts which are downloaded from S3 '
+                    'concurrently when an image is registered'),
+    cfg.IntOpt('s3_download_retries',
+               default=2,
+               help='Number of times to retry downloading of an image part '
+                    'from S3 after a failure'),
+    cfg.FloatOpt('s3_download_retry_interval',
+                 default=1.0,
+                 help='Seconds to wait before the first retry of an image '
+                      'part download, the interval doubles for every next '
+                      'retry'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(s3_opts)
+LOG = logging.getLogger(__name__)
 
 rpcapi_opts = [
     cfg.StrOpt('cert_topic',
@@ -252,10 +269,10 @@ class ImageDescriber(common.TaggableItemsDescriber):
             local_images = list(itertools.chain(
                 *(db_api.get_items(self.context, kind)
                   for kind in ('ami', 'ari', 'aki'))))
-        public_images = [db_api.get_public_items(self.context, kind, self.ids)
-                         for kind in ('ami', 'ari', 'aki')]
+        public_images = db_api.get_public_items(
+            self.context, ('ami', 'ari', 'aki'), self.ids)
 
-        images = list(itertools.chain(local_images, *public_images))
+        images = list(itertools.chain(local_images, public_images))
         if self.ids:
             # NOTE(ft): public images, owned by a current user, appear in both
             # local and public lists of images. Therefore it's not enough to
@@ -586,71 +603,97 @@ def _s3_create(context, metadata):
 
     glance = clients.glance(context)
     image = glance.images.create(**metadata)
+    # NOTE(ft): the image is imported by an image importer service to keep
+    # heavy I/O out of API workers
+    db_api.add_image_import_job(context, image.id,
+                                {'bucket': bucket_name,
+                                 'image_parts': image_parts,
+                                 'encrypted_key': encrypted_key,
+                                 'encrypted_iv': encrypted_iv})
+    return image
 
-    def _update_image_state(image_state):
-        image.update(properties={'image_state': image_state})
-
-    def delayed_create():
-        """This handles the fetching and decrypting of the part files."""
-        context.update_store()
-        try:
-            image_path = tempfile.mkdtemp(dir=CONF.image_decryption_dir)
-
-            _update_image_state('downloading')
-            try:
-                parts = []
-                for part_name in image_parts:
-                    part = _s3_download_file(bucket, part_name, image_path)
-                    parts.append(part)
-
-                # NOTE(vish): this may be suboptimal, should we use cat?
-                enc_filename = os.path.join(image_path, 'image.encrypted')
-                with open(enc_filename, 'w') as combined:
-                    for filename in parts:
-                        with open(filename) as part:
-                            shutil.copyfileobj(part, combined)
 
-            except Exception:
-                _update_image_state('failed_download')
-                return
+def _s3_import(context, job, checkpoint):
+    """Download, decrypt and upload to Glance an image of an import job.
 
-            _update_image_state('decrypting')
-            try:
-                dec_filename = os.path.join(image_path, 'image.tar.gz')
-                _s3_decrypt_image(context, enc_filename, encrypted_key,
-                                  encrypted_iv, dec_filename)
-            except Exception:
-                _update_image_state('failed_decrypt')
-                return
-
-            _update_image_state('untarring')
-            try:
-                unz_filename = _s3_untarzip_image(image_path, dec_filename)
-            except Exception:
-                _update_image_state('failed_untar')
-                return
+    checkpoint is called with a stage of the import and a number of image
+    parts read at the stage.
+    """
+    job_data = job['data']
+    try:
+        image = clients.glance(context).images.get(job['id'])
 
-            _update_image_state('uploading')
-            try:
-                with open(unz_filename) as image_file:
-                    image.update(data=image_file)
-            except Exception:
-                _update_image_state('failed_upload')
-                return
+        def _update_image_state(image_state):
+            # NOTE(ft): checkpoint raises if the job is claimed by another
+            # importer, which must not be disturbed by a failure state
+            checkpoint(image_state, 0)
+            image.update(properties={'image_state': image_state})
 
+        if image.status == 'active':
+            # NOTE(ft): the job is resumed after a previous importer had
+            # uploaded the image, but had not removed the job
             _update_image_state('available')
+            return
+
+        _update_image_state('decrypting')
+        try:
+            key, iv = _s3_decrypt_key(context, job_data['encrypted_key'],
+                                      job_data['encrypted_iv'])
+        except Exception:
+            LOG.exception(_LE('Failed to decrypt image %s'), job['id'])
+            _update_image_state('failed_decrypt')
+            return
 
-            shutil.rmtree(image_path)
-        except glance_exception.HTTPNotFound:
-            # TODO(ft): the image was deleted underneath us, add logging
+        # NOTE(ft): parts are downloaded, decrypted, unpacked and uploaded
+        # to Glance on the fly, a stage which failed is detected by the
+        # stream it raised in
+        _update_image_state('downloading')
+        try:
+            bucket = _s3_conn(context).get_bucket(job_data['bucket'])
+        except Exception:
+            LOG.exception(_LE('Failed to import image %s'), job['id'])
+            _update_image_state('failed_download')
             return
+        parts_stream = _S3PartsStream(
+            bucket, job_data['image_parts'],
+            progress=functools.partial(checkpoint, 'downloading'))
+        decrypted_stream = _S3DecryptingStream(parts_stream, key, iv)
+        image_stream = None
+        try:
+            with contextlib.closing(tarfile.open(
+                    fileobj=decrypted_stream, mode='r|gz')) as tar_file:
+                image_stream = _S3Stream(_s3_untarzip_image(tar_file))
+                image.update(data=image_stream)
         except Exception:
-            # TODO(ft): add logging
+            LOG.exception(_LE('Failed to import image %s'), job['id'])
+            if parts_stream.failed:
+                _update_image_state('failed_download')
+            elif decrypted_stream.failed:
+                _update_image_state('failed_decrypt')
+            elif image_stream is None or image_stream.failed:
+                _update_image_state('failed_untar')
+            else:
+                _update_image_state('failed_upload')
             return
 
-    eventlet.spawn_n(delayed_create)
+        _update_image_state('available')
+    except glance_exception.HTTPNotFound:
+        LOG.info(_LI('Image %s was deleted while it was imported'), job['id'])
 
-    return image
+
+def _s3_abandon_import(context, job):
+    """Set a failure state to an image of an import job."""
+    try:
+        image = clients.glance(context).images.get(job['id'])
+    except glance_exception.HTTPNotFound:
+        return
+    if image.status == 'active':
+        image_state = 'available'
+    elif job['stage'] in ('pending', 'decrypting'):
+        image_state = 'failed_decrypt'
+    else:
+        image_state = 'failed_download'
+    image.update(properties={'image_state': image_state})
 
 
 def _s3_parse_manifest(context, manifest):
@@ -707,15 +750,122 @@ def _s3_parse_manifest(context, manifest):
     return metadata, image_parts, encrypted_key, encrypted_iv
 
 
-def _s3_download_file(bucket, filename, local_dir):
-    key = bucket.get_key(filename)
-    local_filename = os.path.join(local_dir, os.path.basename(filename))
-    key.get_contents_to_filename(local_filename)
-    return local_filename
+_S3_CHUNK_SIZE = 64 * 1024
 
 
-def _s3_decrypt_image(context, encrypted_filename, encrypted_key,
-                      encrypted_iv, decrypted_filename):
+class _S3Stream(object):
+    """File-like object of the streamed S3 image import.
+
+    It remembers if reading failed to report the failed import stage.
+    """
+
+    failed = False
+
+    def __init__(self, fileobj=None):
+        self._fileobj = fileobj
+
+    def read(self, size=-1):
+        try:
+            if size is None or size < 0:
+                return ''.join(iter(lambda: self._read(_S3_CHUNK_SIZE), ''))
+            return self._read(size)
+        except Exception:
+            self.failed = True
+            raise
+
+    def _read(self, size):
+        return self._fileobj.read(size)
+
+
+class _S3PartsStream(_S3Stream):
+    """Concatenation of image parts downloaded from S3.
+
+    Up to s3_download_workers parts are downloaded ahead concurrently,
+    while earlier parts are being read in their order.
+    """
+
+    def __init__(self, bucket, part_names, progress=None):
+        super(_S3PartsStream, self).__init__()
+        self._bucket = bucket
+        self._part_names = iter(part_names)
+        self._pool = greenpool.GreenPool(max(CONF.s3_download_workers, 1))
+        self._downloads = collections.deque()
+        self._data = ''
+        self._offset = 0
+        self._progress = progress
+        self._parts_read = 0
+
+    def _read(self, size):
+        self._spawn_downloads()
+        while self._offset >= len(self._data) and self._downloads:
+            self._data = self._downloads.popleft().wait()
+            self._offset = 0
+            self._parts_read += 1
+            if self._progress:
+                self._progress(self._parts_read)
+            self._spawn_downloads()
+        # NOTE(ft): the rest of the part is not copied on every read
+        data = self._data[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
+
+    def _spawn_downloads(self):
+        # NOTE(ft): the number of downloaded parts waiting to be read is
+        # limited by the pool size as well to bound memory consumption
+        while len(self._downloads) < self._pool.size:
+            part_name = next(self._part_names, None)
+            if part_name is None:
+                break
+            self._downloads.append(
+                self._pool.spawn(self._download_part, part_name))
+
+    def _download_part(self, part_name):
+        attempt = 0
+        while True:
+            try:
+                return (self._bucket.get_key(part_name).
+                        get_contents_as_string())
+            except Exception:
+                if attempt >= CONF.s3_download_retries:
+                    raise
+                interval = CONF.s3_download_retry_interval * 2 ** attempt
+                attempt += 1
+                LOG.warning(_LW('Failed to download image part %(part)s, '
+                                'retry %(attempt)s in %(interval)s seconds'),
+                            {'part': part_name, 'attempt': attempt,
+                             'interval': interval})
+                time.sleep(interval)
+
+
+class _S3DecryptingStream(_S3Stream):
+    """Decryption of an AES-128-CBC encrypted stream."""
+
+    def __init__(self, fileobj, key, iv):
+        super(_S3DecryptingStream, self).__init__(fileobj)
+        cipher = ciphers.Cipher(algorithms.AES(key), modes.CBC(iv),
+                                backend=backends.default_backend())
+        self._decryptor = cipher.decryptor()
+        self._unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+        self._buffer = ''
+        self._eof = False
+
+    def _read(self, size):
+        while len(self._buffer) < size and not self._eof:
+            data = self._fileobj.read(_S3_CHUNK_SIZE)
+            if data:
+                self._buffer += self._unpadder.update(
+                    self._decryptor.update(data))
+            else:
+                self._buffer += (
+                    self._unpadder.update(self._decryptor.finalize()) +
+                    self._unpadder.finalize())
+                self._eof = True
+        data = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return data
+
+
+def _s3_decrypt_key(context, encrypted_key, encrypted_iv):
     encrypted_key = binascii.a2b_hex(encrypted_key)
     encrypted_iv = binascii.a2b_hex(encrypted_iv)
     cert_client = clients.nova_cert(context)
@@ -729,38 +879,23 @@ def _s3_decrypt_image(context, encrypted_filename, encrypted_key,
     except Exception as exc:
         msg = _('Failed to decrypt initialization vector: %s') % exc
         raise exception.EC2Exception(msg)
+    return binascii.a2b_hex(key), binascii.a2b_hex(iv)
 
-    try:
-        processutils.execute('openssl', 'enc',
-                             '-d', '-aes-128-cbc',
-                             '-in', '%s' % (encrypted_filename,),
-                             '-K', '%s' % (key,),
-                             '-iv', '%s' % (iv,),
-                             '-out', '%s' % (decrypted_filename,))
-    except processutils.ProcessExecutionError as exc:
-        raise exception.EC2Exception(_('Failed to decrypt image file '
-                                       '%(image_file)s: %(err)s') %
-                                     {'image_file': encrypted_filename,
-                                      'err': exc.stdout})
-
-
-def _s3_untarzip_image(path, filename):
-    _s3_test_for_malicious_tarball(path, filename)
-    tar_file = tarfile.open(filename, 'r|gz')
-    tar_file.extractall(path)
-    image_file = tar_file.getnames()[0]
-    tar_file.close()
-    return os.path.join(path, image_file)
-
-
-def _s3_test_for_malicious_tarball(path, filename):
+
+def _s3_untarzip_image(tar_file):
+    """Return the image file of a tarball which is read as a stream."""
+    for member in tar_file:
+        _s3_test_for_malicious_tarball(member.name)
+        if member.isfile():
+            return tar_file.extractfile(member)
+    raise exception.Invalid(_('No image file in the tarball'))
+
+
+def _s3_test_for_malicious_tarball(name):
     """Raises exception if extracting tarball would escape extract path."""
-    tar_file = tarfile.open(filename, 'r|gz')
-    for n in tar_file.getnames():
-        if not os.path.abspath(os.path.join(path, n)).startswith(path):
-            tar_file.close()
-            raise exception.Invalid(_('Unsafe filenames in image'))
-    tar_file.close()
+    name = os.path.normpath(name)
+    if os.path.isabs(name) or name.split(os.sep)[0] == os.pardir:
+        raise exception.Invalid(_('Unsafe filenames in image'))
 
 
 def _s3_conn(context):
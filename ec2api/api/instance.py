@@ -15,6 +15,7 @@
 import base64
 import collections
 import copy
+import functools
 import itertools
 import random
 import re
@@ -125,6 +126,7 @@ def terminate_instances(context, instance_id):
 class InstanceDescriber(common.TaggableItemsDescriber):
 
     KIND = 'i'
+    OS_PAGINATION = True
     FILTER_MAP = {
         'block-device-mapping.device-name': ['blockDeviceMapping',
                                              'deviceName'],
@@ -173,7 +175,8 @@ class InstanceDescriber(common.TaggableItemsDescriber):
         formatted_instance = _format_instance(
                 self.context, instance, os_instance, novadb_instance,
                 self.ec2_network_interfaces.get(instance['id']),
-                self.image_ids, self.volumes)
+                self.image_ids, self.volumes, self.os_volumes,
+                self.novadb_bdms.get(os_instance.id))
 
         reservation_id = instance['reservation_id']
         if reservation_id in self.reservations:
@@ -192,33 +195,79 @@ class InstanceDescriber(common.TaggableItemsDescriber):
 
         return formatted_instance
 
-    def get_db_items(self):
-        instances = super(InstanceDescriber, self).get_db_items()
-        self.ec2_network_interfaces = (
-            instance_engine.get_ec2_network_interfaces(
-                self.context, self.ids))
-        self.volumes = dict((v['os_id'], v)
-                            for v in db_api.get_items(self.context, 'vol'))
-        self.image_ids = dict((i['os_id'], i['id'])
-                              for i in itertools.chain(
-                                  db_api.get_items(self.context, 'ami'),
-                                  db_api.get_public_items(self.context,
-                                                          'ami')))
-        return instances
+    def get_dependencies(self):
+        return {
+            'ec2_network_interfaces': functools.partial(
+                instance_engine.get_ec2_network_interfaces,
+                self.context, set(self.ids)),
+            'volumes': self._get_volumes,
+            'image_ids': self._get_image_ids,
+        }
+
+    def _get_volumes(self):
+        return dict((v['os_id'], v)
+                    for v in db_api.get_items(self.context, 'vol'))
+
+    def _get_image_ids(self):
+        return dict((i['os_id'], i['id'])
+                    for i in itertools.chain(
+                        db_api.get_items(self.context, 'ami'),
+                        db_api.get_public_items(self.context, ('ami',))))
+
+    def get_os_filters(self, filters):
+        # NOTE(ft): Nova supports one value of a search option only, and
+        # ignores uuid and availability_zone options for non admin users.
+        # Ignored options would disable deletion of obsolete items
+        # without reducing the list of instances.
+        os_filters = {}
+        if not self.context.is_os_admin:
+            return os_filters
+        instance_ids = self.get_exact_filter_values(filters, 'instance-id')
+        if instance_ids and len(instance_ids) == 1:
+            instance = next((i for i in self.items
+                             if i['id'] in instance_ids), None)
+            if instance:
+                os_filters['uuid'] = instance['os_id']
+        zones = self.get_exact_filter_values(filters, 'availability-zone')
+        if zones and len(zones) == 1:
+            os_filters['availability_zone'] = next(iter(zones))
+        return os_filters
 
     def get_os_items(self):
-        self.novadb_instances = {}
-        return clients.nova(self.context).servers.list(
-                # NOTE(ft): these filters are needed for metadata server
-                # which calls describe_instances with an admin account
-                # (but project_id is substituted to an instance's one).
-                search_opts={'all_tenants': self.context.is_os_admin,
-                             'project_id': self.context.project_id})
+        paging_kwargs = {}
+        if self.limit is not None:
+            paging_kwargs['limit'] = self.limit
+        if self.marker is not None:
+            paging_kwargs['marker'] = self.marker
+        # NOTE(ft): these filters are needed for metadata server
+        # which calls describe_instances with an admin account
+        # (but project_id is substituted to an instance's one).
+        search_opts = {'all_tenants': self.context.is_os_admin,
+                       'project_id': self.context.project_id}
+        search_opts.update(self.os_filters)
+        os_instances = clients.nova(self.context).servers.list(
+                search_opts=search_opts, **paging_kwargs)
+        os_instance_ids = [i.id for i in os_instances]
+        self.novadb_instances = novadb.instance_get_all_by_uuids(
+                self.context, os_instance_ids)
+        self.novadb_bdms = novadb.block_device_mapping_get_all_by_instances(
+                self.context, os_instance_ids)
+        # NOTE(ft): get all volumes by one call instead of getting attached
+        # volumes one by one for each instance
+        self.os_volumes = (
+            dict((v.id, v)
+                 for v in clients.cinder(self.context).volumes.list())
+            if os_instances else {})
+        return os_instances
 
     def auto_update_db(self, instance, os_instance):
-        novadb_instance = novadb.instance_get_by_uuid(self.context,
-                                                      os_instance.id)
-        self.novadb_instances[os_instance.id] = novadb_instance
+        novadb_instance = self.novadb_instances.get(os_instance.id)
+        if novadb_instance is None:
+            # NOTE(ft): the instance is created after nova DB is queried,
+            # or it's deleted, then the call raises an error as before
+            novadb_instance = novadb.instance_get_by_uuid(self.context,
+                                                          os_instance.id)
+            self.novadb_instances[os_instance.id] = novadb_instance
         if not instance:
             instance = ec2utils.get_db_item_by_os_id(
                     self.context, 'i', os_instance.id,
@@ -252,7 +301,8 @@ class ReservationDescriber(common.NonOpenstackItemsDescriber):
     def get_db_items(self):
         return self.reservations
 
-    def describe(self, context, ids=None, names=None, filter=None):
+    def describe(self, context, ids=None, names=None, filter=None,
+                 max_results=None, next_token=None):
         reservation_filters = []
         instance_filters = []
         for f in filter or []:
@@ -269,7 +319,10 @@ class ReservationDescriber(common.NonOpenstackItemsDescriber):
 
         instance_describer = InstanceDescriber()
         formatted_instances = instance_describer.describe(
-                context, ids=ids, filter=instance_filters)
+                context, ids=ids, filter=instance_filters,
+                max_results=max_results, next_token=next_token)
+        # NOTE(ft): instances are paginated, not reservations
+        self.next_token = instance_describer.next_token
 
         # NOTE(ft): remove obsolete instances' DB items only, because
         # network interfaces and addresses are cleaned during appropriate
@@ -289,9 +342,44 @@ class ReservationDescriber(common.NonOpenstackItemsDescriber):
 
 def describe_instances(context, instance_id=None, filter=None,
                        max_results=None, next_token=None):
-    formatted_reservations = ReservationDescriber().describe(
-            context, ids=instance_id, filter=filter)
-    return {'reservationSet': formatted_reservations}
+    reservation_describer = ReservationDescriber()
+    formatted_reservations = reservation_describer.describe(
+            context, ids=instance_id, filter=filter,
+            max_results=max_results, next_token=next_token)
+    result = {'reservationSet': formatted_reservations}
+    if reservation_describer.next_token:
+        result['nextToken'] = reservation_describer.next_token
+    return result
+
+
+def describe_os_instance(context, os_instance_id):
+    """Describe one instance by its OpenStack id.
+
+    Returns the instance reservation. Unlike describe_instances only the
+    instance and its ports are requested from OpenStack, so the cost
+    doesn't depend on the project size. It's used by the metadata server.
+    """
+    try:
+        os_instance = clients.nova(context).servers.get(os_instance_id)
+    except nova_exception.NotFound:
+        os_instance = None
+    # NOTE(ft): metadata server uses an admin account, but project_id is
+    # substituted to an instance's one
+    if os_instance is None or os_instance.tenant_id != context.project_id:
+        raise exception.InvalidInstanceIDNotFound(id=os_instance_id)
+    novadb_instance = novadb.instance_get_by_uuid(context, os_instance.id)
+    instance_ids = db_api.get_item_ids(context, 'i', (os_instance.id,))
+    instance = (db_api.get_item_by_id(context, instance_ids[0][0])
+                if instance_ids else None)
+    if not instance:
+        instance = ec2utils.auto_create_db_item(
+                context, 'i', os_instance.id, novadb_instance=novadb_instance)
+    ec2_network_interfaces = {
+        instance['id']: instance_engine.get_os_instance_ec2_network_interfaces(
+                context, os_instance.id)}
+    return _format_reservation(context, instance['reservation_id'],
+                               [(instance, os_instance, novadb_instance)],
+                               ec2_network_interfaces, image_ids={})
 
 
 def reboot_instances(context, instance_id):
@@ -460,7 +548,8 @@ def _format_reservation(context, reservation_id, instances_info,
 
 
 def _format_instance(context, instance, os_instance, novadb_instance,
-                     ec2_network_interfaces, image_ids, volumes=None):
+                     ec2_network_interfaces, image_ids, volumes=None,
+                     os_volumes=None, bdms=None):
     ec2_instance = {
         'amiLaunchIndex': instance['launch_index'],
         'imageId': (ec2utils.os_id_to_ec2_id(context, 'ami',
@@ -482,7 +571,7 @@ def _format_instance(context, instance, os_instance, novadb_instance,
     }
     _cloud_format_instance_bdm(context, instance['os_id'],
                                ec2_instance['rootDeviceName'], ec2_instance,
-                               volumes)
+                               volumes, os_volumes, bdms)
     kernel_id = _cloud_format_kernel_id(context, novadb_instance, image_ids)
     if kernel_id:
         ec2_instance['kernelId'] = kernel_id
@@ -559,6 +648,113 @@ def _format_state_change(instance, os_instance):
     }
 
 
+def _add_launched_instances(context, cleaner, launches, instances_info,
+                            novadb_instances=None):
+    """Store launched instances and their network interfaces by one DB call.
+
+    launches is a list of (instance data, os_instance, network_data) tuples,
+    info of stored instances is appended to instances_info.
+    """
+    if not launches:
+        return
+    nova = clients.nova(context)
+    instances = db_api.add_items(context, 'i',
+                                 [data for data, _os_i, _n_d in launches])
+    cleaner.addCleanup(db_api.delete_items, context,
+                       [instance['id'] for instance in instances])
+
+    # NOTE(ft): Nova has no bulk update, so rename instances concurrently
+    common.call_concurrently(
+        lambda os_instance, name: nova.servers.update(os_instance, name=name),
+        [(os_instance, instance['id'])
+         for instance, (_data, os_instance, _n_d) in zip(instances,
+                                                         launches)])
+
+    network_interfaces = []
+    for instance, (_data, _os_instance, network_data) in zip(instances,
+                                                             launches):
+        for data in network_data:
+            network_interface_api._set_network_interface_attachment(
+                data['network_interface'], instance['id'],
+                data['device_index'],
+                delete_on_termination=data['delete_on_termination'])
+            network_interfaces.append(data['network_interface'])
+    if network_interfaces:
+        db_api.update_items(context, network_interfaces)
+        for network_interface in network_interfaces:
+            cleaner.addCleanup(
+                network_interface_api._detach_network_interface_item,
+                context, network_interface)
+
+    if novadb_instances is None:
+        novadb_instances = novadb.instance_get_all_by_uuids(
+            context, [os_instance.id for _d, os_instance, _n_d in launches])
+    for instance, (_data, os_instance, _network_data) in zip(instances,
+                                                             launches):
+        instances_info.append((instance, os_instance,
+                               novadb_instances[os_instance.id]))
+
+
+def _launch_instances_in_bulk(context, cleaner, ec2_reservation_id,
+                              min_count, max_count, instance_data,
+                              os_image_id, os_flavor, **kwargs):
+    """Launch instances by one Nova multiple create request.
+
+    Nova launches from min_count to max_count instances depending on quota.
+    instance_data is added to DB items of all instances.
+    Returns info of launched instances.
+    """
+    nova = clients.nova(context)
+    os_instance = nova.servers.create(
+        ec2_reservation_id, os_image_id, os_flavor,
+        min_count=min_count, max_count=max_count, **kwargs)
+    os_instance_ids = set([os_instance.id])
+
+    def delete_os_instances():
+        # NOTE(ft): instances which are not found yet are found by their
+        # names, which Nova builds from the unique name of the request
+        try:
+            os_instance_ids.update(
+                os_i.id for os_i in nova.servers.list(
+                    search_opts={'name': '^%s' % ec2_reservation_id}))
+        finally:
+            common.call_concurrently(
+                nova.servers.delete,
+                [(os_instance_id,) for os_instance_id in os_instance_ids])
+
+    cleaner.addCleanup(delete_os_instances)
+    os_instances = [os_instance]
+    if max_count > 1:
+        # NOTE(ft): Nova returns the first instance only, others are found
+        # by Nova's reservation id of the request
+        novadb_instance = novadb.instance_get_by_uuid(context,
+                                                      os_instance.id)
+        os_instances.extend(
+            os_i for os_i in nova.servers.list(
+                search_opts={
+                    'reservation_id': novadb_instance['reservation_id']})
+            if os_i.id != os_instance.id)
+        os_instance_ids.update(os_i.id for os_i in os_instances)
+
+    novadb_instances = novadb.instance_get_all_by_uuids(
+        context, [os_i.id for os_i in os_instances])
+    os_instances.sort(
+        key=lambda os_i: novadb_instances[os_i.id]['launch_index'])
+    launches = []
+    for os_instance in os_instances:
+        instance = {'os_id': os_instance.id,
+                    'reservation_id': ec2_reservation_id,
+                    'launch_index': (
+                        novadb_instances[os_instance.id]['launch_index'])}
+        instance.update(instance_data)
+        launches.append((instance, os_instance, []))
+
+    instances_info = []
+    _add_launched_instances(context, cleaner, launches, instances_info,
+                            novadb_instances=novadb_instances)
+    return instances_info
+
+
 def _remove_instances(context, instances, purge_linked_items=True):
     if not instances:
         return
@@ -571,17 +767,22 @@ def _remove_instances(context, instances, purge_linked_items=True):
         addresses = db_api.get_items(context, 'eipalloc')
         addresses = dict((a['network_interface_id'], a) for a in addresses
                          if 'network_interface_id' in a)
+    item_ids_to_delete = []
+    network_interfaces_to_detach = []
     for instance in instances:
         for eni in network_interfaces[instance['id']]:
             if eni['delete_on_termination']:
                 address = addresses.get(eni['id'])
                 if address:
                     address_api._disassociate_address_item(context, address)
-                db_api.delete_item(context, eni['id'])
+                item_ids_to_delete.append(eni['id'])
             else:
-                network_interface_api._detach_network_interface_item(context,
-                                                                     eni)
-        db_api.delete_item(context, instance['id'])
+                network_interface_api._clear_network_interface_attachment(eni)
+                network_interfaces_to_detach.append(eni)
+        item_ids_to_delete.append(instance['id'])
+    if network_interfaces_to_detach:
+        db_api.update_items(context, network_interfaces_to_detach)
+    db_api.delete_items(context, item_ids_to_delete)
 
 
 def _check_min_max_count(min_count, max_count):
@@ -752,18 +953,37 @@ class InstanceEngineNeutron(object):
                     context, vpc_id)
 
         neutron = clients.neutron(context)
+        instances_info = []
+        ec2_reservation_id = _generate_reservation_id()
+
         if not vpc_id:
+            # NOTE(ft): EC2 Classic instances have no individual network
+            # interface options, so Nova launches all of them at once
             ec2_classic_nics = [
                 {'net-id': self.get_ec2_classic_os_network(context,
                                                            neutron)['id']}]
-
-        instance_ids = []
-        instances_info = []
-        ec2_reservation_id = _generate_reservation_id()
+            instance_data = {'vpc_id': None}
+            if client_token:
+                instance_data['client_token'] = client_token
+            with common.OnCrashCleaner() as cleaner:
+                instances_info = _launch_instances_in_bulk(
+                    context, cleaner, ec2_reservation_id,
+                    min_count, max_count, instance_data,
+                    os_image.id, os_flavor,
+                    kernel_id=os_kernel_id, ramdisk_id=os_ramdisk_id,
+                    availability_zone=(
+                        (placement or {}).get('availability_zone')),
+                    block_device_mapping=bdm,
+                    security_groups=security_groups_names,
+                    nics=ec2_classic_nics,
+                    key_name=key_name, userdata=user_data)
+            return _format_reservation(context, ec2_reservation_id,
+                                       instances_info, {},
+                                       image_ids={os_image.id: image_id})
 
         with common.OnCrashCleaner() as cleaner:
-            # NOTE(ft): create Neutron's ports manually and run instances one
-            # by one to have a chance to:
+            # NOTE(ft): create Neutron's ports manually and run instances
+            # separately to have a chance to:
             # process individual network interface options like security_group
             # or private_ip_addresses (Nova's create_instances receives only
             # one fixed_ip for subnet)
@@ -774,16 +994,7 @@ class InstanceEngineNeutron(object):
 
             # TODO(ft): do correct error messages on create failures. For
             # example, overlimit, ip lack, ip overlapping, etc
-            for launch_index in range(max_count):
-                if launch_index >= min_count:
-                    cleaner.approveChanges()
-
-                self.create_network_interfaces(context, cleaner, network_data)
-                nics = ([{'port-id': data['network_interface']['os_id']}
-                         for data in network_data]
-                        if vpc_id else
-                        ec2_classic_nics)
-
+            def launch(launch_index, launch_network_data):
                 os_instance = nova.servers.create(
                     '%s-%s' % (ec2_reservation_id, launch_index),
                     os_image.id, os_flavor,
@@ -793,11 +1004,12 @@ class InstanceEngineNeutron(object):
                         (placement or {}).get('availability_zone')),
                     block_device_mapping=bdm,
                     security_groups=security_groups_names,
-                    nics=nics,
+                    nics=[{'port-id': data['network_interface']['os_id']}
+                          for data in launch_network_data],
                     key_name=key_name, userdata=user_data)
                 cleaner.addCleanup(nova.servers.delete, os_instance.id)
 
-                for data in network_data:
+                for data in launch_network_data:
                     if data.get('detach_on_crash'):
                         cleaner.addCleanup(neutron.update_port,
                                            data['network_interface']['os_id'],
@@ -810,29 +1022,31 @@ class InstanceEngineNeutron(object):
                             'launch_index': launch_index}
                 if client_token:
                     instance['client_token'] = client_token
-                instance = db_api.add_item(context, 'i', instance)
-                cleaner.addCleanup(db_api.delete_item, context, instance['id'])
-                instance_ids.append(instance['id'])
-
-                nova.servers.update(os_instance, name=instance['id'])
-
-                for data in network_data:
-                    # TODO(ft): implement update items in DB layer to prevent
-                    # record by record modification
-                    # Alternatively a create_network_interface sub-function can
-                    # set attach_time  at once
-                    network_interface_api._attach_network_interface_item(
-                        context, data['network_interface'], instance['id'],
-                        data['device_index'],
-                        delete_on_termination=data['delete_on_termination'])
-                    cleaner.addCleanup(
-                        network_interface_api._detach_network_interface_item,
-                        context, data['network_interface'])
-
-                novadb_instance = novadb.instance_get_by_uuid(context,
-                                                              os_instance.id)
-                instances_info.append((instance, os_instance, novadb_instance))
-
+                return (instance, os_instance, launch_network_data)
+
+            # NOTE(ft): network interfaces of instances which must be
+            # launched are created in bulk, and the instances are launched
+            # concurrently. Others are launched one by one to not leave
+            # unused network interfaces if a launch fails
+            launches_network_data = self.create_network_interfaces(
+                context, cleaner, network_data, min_count)
+            launches = common.call_concurrently(
+                launch, list(enumerate(launches_network_data)))
+            _add_launched_instances(context, cleaner, launches,
+                                    instances_info)
+
+            for launch_index in range(min_count, max_count):
+                cleaner.approveChanges()
+                launch_network_data = self.create_network_interfaces(
+                    context, cleaner, network_data, 1)[0]
+                _add_launched_instances(
+                    context, cleaner,
+                    [launch(launch_index, launch_network_data)],
+                    instances_info)
+
+        instance_ids = [instance['id']
+                        for instance, _os_instance, _novadb_instance
+                        in instances_info]
         # NOTE(ft): we don't reuse network interface objects received from
         # create_network_interfaces because they don't contain attachment info
         ec2_network_interfaces = (self.get_ec2_network_interfaces(
@@ -863,6 +1077,10 @@ class InstanceEngineNeutron(object):
                     eni['attachment']['instanceId']].append(eni)
         return ec2_network_interfaces
 
+    def get_os_instance_ec2_network_interfaces(self, context, os_instance_id):
+        return network_interface_api._describe_os_instance_network_interfaces(
+                context, os_instance_id)
+
     def merge_network_interface_parameters(self,
                                            security_group_names,
                                            subnet_id,
@@ -1011,24 +1229,27 @@ class InstanceEngineNeutron(object):
         network_data.sort(key=lambda data: data['device_index'])
         return (next(iter(vpc_ids), None), network_data)
 
-    def create_network_interfaces(self, context, cleaner, network_data):
-        for data in network_data:
+    def create_network_interfaces(self, context, cleaner, network_data,
+                                  count):
+        """Create network interfaces for count launches.
+
+        Returns a copy of network_data with created network interfaces for
+        every launch.
+        """
+        launches_network_data = [[dict(data) for data in network_data]
+                                 for _i in range(count)]
+        for index, data in enumerate(network_data):
             if 'create_args' not in data:
                 continue
             (subnet_id, args) = data['create_args']
-            ec2_network_interface = (
-                network_interface_api.create_network_interface(
-                    context, subnet_id, **args)['networkInterface'])
-            ec2_network_interface_id = (
-                ec2_network_interface['networkInterfaceId'])
-            cleaner.addCleanup(network_interface_api.delete_network_interface,
-                               context,
-                               network_interface_id=ec2_network_interface_id)
-            # TODO(ft): receive network_interface from a
-            # create_network_interface sub-function
-            network_interface = db_api.get_item_by_id(context,
-                                                      ec2_network_interface_id)
-            data['network_interface'] = network_interface
+            network_interfaces = (
+                network_interface_api._create_network_interfaces(
+                    context, cleaner, count, subnet_id, **args))
+            for launch_network_data, (network_interface, _os_port) in zip(
+                    launches_network_data, network_interfaces):
+                launch_network_data[index]['network_interface'] = (
+                    network_interface)
+        return launches_network_data
 
     def get_vpc_default_security_group_id(self, context, vpc_id):
         default_groups = security_group_api.describe_security_groups(
@@ -1091,41 +1312,24 @@ class InstanceEngineNova(object):
 
         # TODO(ft): support auto_assign_floating_ip
 
-        instances_info = []
         ec2_reservation_id = _generate_reservation_id()
+        instance_data = {}
+        if client_token:
+            instance_data['client_token'] = client_token
 
         # TODO(ft): do correct error messages on create failures. For
         # example, overlimit, ip lack, ip overlapping, etc
         with common.OnCrashCleaner() as cleaner:
-            for index in range(max_count):
-                if index >= min_count:
-                    cleaner.approveChanges()
-
-                os_instance = nova.servers.create(
-                    '%s-%s' % (ec2_reservation_id, index),
-                    os_image.id, os_flavor,
-                    min_count=min_count, max_count=max_count,
-                    kernel_id=os_kernel_id, ramdisk_id=os_ramdisk_id,
-                    availability_zone=(
-                        placement or {}).get('availability_zone'),
-                    block_device_mapping=bdm,
-                    security_groups=security_group,
-                    key_name=key_name, userdata=user_data)
-                cleaner.addCleanup(nova.servers.delete, os_instance.id)
-
-                instance = {'os_id': os_instance.id,
-                            'reservation_id': ec2_reservation_id,
-                            'launch_index': index}
-                if client_token:
-                    instance['client_token'] = client_token
-                instance = db_api.add_item(context, 'i', instance)
-                cleaner.addCleanup(db_api.delete_item, context, instance['id'])
-
-                nova.servers.update(os_instance, name=instance['id'])
-
-                novadb_instance = novadb.instance_get_by_uuid(context,
-                                                              os_instance.id)
-                instances_info.append((instance, os_instance, novadb_instance))
+            instances_info = _launch_instances_in_bulk(
+                context, cleaner, ec2_reservation_id,
+                min_count, max_count, instance_data,
+                os_image.id, os_flavor,
+                kernel_id=os_kernel_id, ramdisk_id=os_ramdisk_id,
+                availability_zone=(
+                    placement or {}).get('availability_zone'),
+                block_device_mapping=bdm,
+                security_groups=security_group,
+                key_name=key_name, userdata=user_data)
 
         return _format_reservation(context, ec2_reservation_id, instances_info,
                                    {}, image_ids={os_image.id: image_id})
@@ -1133,6 +1337,9 @@ class InstanceEngineNova(object):
     def get_ec2_network_interfaces(self, context, instance_ids=None):
         return {}
 
+    def get_os_instance_ec2_network_interfaces(self, context, os_instance_id):
+        return []
+
 
 instance_engine = get_instance_engine()
 
@@ -1225,16 +1432,19 @@ def _cloud_state_description(vm_state):
 
 
 def _cloud_format_instance_bdm(context, instance_uuid, root_device_name,
-                               result, volumes=None):
+                               result, volumes=None, os_volumes=None,
+                               bdms=None):
     """Format InstanceBlockDeviceMappingResponseItemType."""
     root_device_type = 'instance-store'
     root_device_short_name = _block_device_strip_dev(root_device_name)
     if root_device_name == root_device_short_name:
         root_device_name = _block_device_prepend_dev(root_device_name)
-    cinder = clients.cinder(context)
+    if bdms is None:
+        bdms = novadb.block_device_mapping_get_all_by_instance(context,
+                                                               instance_uuid)
+    cinder = None
     mapping = []
-    for bdm in novadb.block_device_mapping_get_all_by_instance(context,
-                                                               instance_uuid):
+    for bdm in bdms:
         volume_id = bdm['volume_id']
         if (volume_id is None or bdm['no_device']):
             continue
@@ -1244,7 +1454,13 @@ def _cloud_format_instance_bdm(context, instance_uuid, root_device_name,
                  bdm['device_name'] == root_device_short_name)):
             root_device_type = 'ebs'
 
-        vol = cinder.volumes.get(volume_id)
+        vol = os_volumes.get(volume_id) if os_volumes else None
+        # NOTE(ft): a volume can be absent in prefetched ones if it's just
+        # created or belongs to another project (metadata server case)
+        if vol is None:
+            if cinder is None:
+                cinder = clients.cinder(context)
+            vol = cinder.volumes.get(volume_id)
         volume = ec2utils.get_db_item_by_os_id(context, 'vol', volume_id,
                                                volumes)
         # TODO(yamahata): volume attach time
@@ -14,6 +14,9 @@
 
 
 import collections
+import copy
+import functools
+import itertools
 
 import netaddr
 from neutronclient.common import exceptions as neutron_exception
@@ -49,6 +52,35 @@ def create_network_interface(context, subnet_id,
                              secondary_private_ip_address_count=None,
                              description=None,
                              security_group_id=None):
+    with common.OnCrashCleaner() as cleaner:
+        ((network_interface, os_port),) = _create_network_interfaces(
+            context, cleaner, 1, subnet_id,
+            private_ip_address=private_ip_address,
+            private_ip_addresses=private_ip_addresses,
+            secondary_private_ip_address_count=(
+                secondary_private_ip_address_count),
+            description=description,
+            security_group_id=security_group_id)
+    security_groups = security_group_api._format_security_groups_ids_names(
+        context)
+    return {'networkInterface':
+            _format_network_interface(context,
+                                      network_interface,
+                                      os_port,
+                                      security_groups=security_groups)}
+
+
+def _create_network_interfaces(context, cleaner, count, subnet_id,
+                               private_ip_address=None,
+                               private_ip_addresses=None,
+                               secondary_private_ip_address_count=None,
+                               description=None,
+                               security_group_id=None):
+    """Create count network interfaces with the same parameters.
+
+    Ports are created by one Neutron request. Returns a list of
+    (network_interface, os_port) pairs.
+    """
     subnet = ec2utils.get_db_item(context, subnet_id)
     if subnet is None:
         raise exception.InvalidSubnetIDNotFound(id=subnet_id)
@@ -108,53 +140,64 @@ def create_network_interface(context, subnet_id,
                 'different networks.')
         raise exception.InvalidGroupNotFound(msg)
     os_groups = [security_group['os_id'] for security_group in security_groups]
-    with common.OnCrashCleaner() as cleaner:
-        os_port_body = {'port': {'network_id': os_subnet['network_id'],
-                                 'security_groups': os_groups}}
-        os_port_body['port']['fixed_ips'] = fixed_ips
-        try:
-            os_port = neutron.create_port(os_port_body)['port']
-        except (neutron_exception.IpAddressGenerationFailureClient,
-                neutron_exception.OverQuotaClient):
-            raise exception.NetworkInterfaceLimitExceeded(
-                        subnet_id=subnet_id)
-        except (neutron_exception.IpAddressInUseClient,
-                neutron_exception.BadRequest) as ex:
-            # NOTE(ft): AWS returns InvalidIPAddress.InUse for a primary IP
-            # address, but InvalidParameterValue for secondary one.
-            # AWS returns PrivateIpAddressLimitExceeded, but Neutron does
-            # general InvalidInput (converted to BadRequest) in the same case.
-            msg = _('Specified network interface parameters are invalid. '
-                    'Reason: %(reason)s') % {'reason': ex.message}
-            raise exception.InvalidParameterValue(msg)
+    os_port_body = {'network_id': os_subnet['network_id'],
+                    'security_groups': os_groups,
+                    'fixed_ips': fixed_ips}
+    try:
+        if count == 1:
+            os_ports = [neutron.create_port({'port': os_port_body})['port']]
+        else:
+            os_ports = neutron.create_port(
+                {'ports': [copy.deepcopy(os_port_body)
+                           for _i in range(count)]})['ports']
+    except (neutron_exception.IpAddressGenerationFailureClient,
+            neutron_exception.OverQuotaClient):
+        raise exception.NetworkInterfaceLimitExceeded(
+                    subnet_id=subnet_id)
+    except (neutron_exception.IpAddressInUseClient,
+            neutron_exception.BadRequest) as ex:
+        # NOTE(ft): AWS returns InvalidIPAddress.InUse for a primary IP
+        # address, but InvalidParameterValue for secondary one.
+        # AWS returns PrivateIpAddressLimitExceeded, but Neutron does
+        # general InvalidInput (converted to BadRequest) in the same case.
+        msg = _('Specified network interface parameters are invalid. '
+                'Reason: %(reason)s') % {'reason': ex.message}
+        raise exception.InvalidParameterValue(msg)
+    for os_port in os_ports:
         cleaner.addCleanup(neutron.delete_port, os_port['id'])
-        if primary_ip is None:
-            primary_ip = os_port['fixed_ips'][0]['ip_address']
-        network_interface = db_api.add_item(context, 'eni',
-                                            {'os_id': os_port['id'],
-                                             'vpc_id': subnet['vpc_id'],
-                                             'subnet_id': subnet['id'],
-                                             'description': description,
-                                             'private_ip_address': primary_ip})
+    network_interfaces_data = [
+        {'os_id': os_port['id'],
+         'vpc_id': subnet['vpc_id'],
+         'subnet_id': subnet['id'],
+         'description': description,
+         'private_ip_address': (primary_ip if primary_ip is not None else
+                                os_port['fixed_ips'][0]['ip_address'])}
+        for os_port in os_ports]
+    if count == 1:
+        network_interfaces = [db_api.add_item(context, 'eni',
+                                              network_interfaces_data[0])]
+    else:
+        network_interfaces = db_api.add_items(context, 'eni',
+                                              network_interfaces_data)
+    for network_interface in network_interfaces:
         cleaner.addCleanup(db_api.delete_item,
                            context, network_interface['id'])
 
-        network_interface_id = network_interface['id']
+    dhcp_options_object = (db_api.get_item_by_id(context, dhcp_options_id)
+                           if dhcp_options_id else None)
+
+    def update_port(network_interface, os_port):
         neutron.update_port(os_port['id'],
-                            {'port': {'name': network_interface_id}})
-        if dhcp_options_id:
+                            {'port': {'name': network_interface['id']}})
+        if dhcp_options_object:
             dhcp_options._add_dhcp_opts_to_port(
-                context,
-                db_api.get_item_by_id(context, dhcp_options_id),
-                network_interface,
-                os_port)
-    security_groups = security_group_api._format_security_groups_ids_names(
-        context)
-    return {'networkInterface':
-            _format_network_interface(context,
-                                      network_interface,
-                                      os_port,
-                                      security_groups=security_groups)}
+                context, dhcp_options_object, network_interface, os_port,
+                neutron)
+
+    # NOTE(ft): Neutron has no bulk update, so ports are updated in parallel
+    network_interfaces = list(zip(network_interfaces, os_ports))
+    common.call_concurrently(update_port, network_interfaces)
+    return network_interfaces
 
 
 def delete_network_interface(context, network_interface_id):
@@ -207,17 +250,46 @@ class NetworkInterfaceDescriber(common.TaggableItemsDescriber):
                 self.ec2_addresses[network_interface['id']],
                 self.security_groups)
 
-    def get_os_items(self):
+    def get_dependencies(self):
+        return {
+            'ec2_addresses': self._get_ec2_addresses,
+            'security_groups': functools.partial(
+                security_group_api._format_security_groups_ids_names,
+                self.context),
+        }
+
+    def _get_ec2_addresses(self):
         addresses = address_api.describe_addresses(self.context)
-        self.ec2_addresses = collections.defaultdict(list)
+        ec2_addresses = collections.defaultdict(list)
         for address in addresses['addressesSet']:
             if 'networkInterfaceId' in address:
-                self.ec2_addresses[
-                        address['networkInterfaceId']].append(address)
-        self.security_groups = (
-            security_group_api._format_security_groups_ids_names(self.context))
+                ec2_addresses[address['networkInterfaceId']].append(address)
+        return ec2_addresses
+
+    def get_os_items(self):
         neutron = clients.neutron(self.context)
-        return neutron.list_ports()['ports']
+        return neutron.list_ports(**self.os_filters)['ports']
+
+    def get_os_filters(self, filters):
+        os_filters = {}
+        eni_ids = self.get_exact_filter_values(filters,
+                                               'network-interface-id')
+        if eni_ids:
+            os_filters['id'] = [eni['os_id'] for eni in self.items
+                                if eni['id'] in eni_ids]
+        subnet_ids = self.get_exact_filter_values(filters, 'subnet-id')
+        vpc_ids = self.get_exact_filter_values(filters, 'vpc-id')
+        if subnet_ids or vpc_ids:
+            subnets = db_api.get_items(self.context, 'subnet')
+            os_filters['fixed_ips'] = [
+                'subnet_id=%s' % subnet['os_id'] for subnet in subnets
+                if ((not subnet_ids or subnet['id'] in subnet_ids) and
+                    (not vpc_ids or subnet['vpc_id'] in vpc_ids))]
+        # NOTE(ft): Neutron ignores an empty list filter, so it is not pushed
+        # down, and found ports are filtered out later
+        if any(not values for values in os_filters.values()):
+            return {}
+        return os_filters
 
     def get_name(self, os_item):
         return ''
@@ -480,9 +552,74 @@ def _format_network_interface(context, network_interface, os_port,
     return ec2_network_interface
 
 
+def _describe_os_instance_network_interfaces(context, os_instance_id):
+    # NOTE(ft): describe_network_interfaces gets all ports, floating IPs and
+    # security groups of the project. Here only ones of the instance are got.
+    neutron = clients.neutron(context)
+    os_ports = neutron.list_ports(device_id=os_instance_id)['ports']
+    network_interfaces = [
+        eni for eni in _get_items_by_os_ids(context, 'eni',
+                                            [p['id'] for p in os_ports])
+        if 'instance_id' in eni]
+    if not network_interfaces:
+        return []
+    os_ports = dict((p['id'], p) for p in os_ports)
+
+    os_floating_ips = neutron.list_floatingips(
+        port_id=[eni['os_id'] for eni in network_interfaces])['floatingips']
+    addresses = dict((a['os_id'], a) for a in _get_items_by_os_ids(
+        context, 'eipalloc', [fip['id'] for fip in os_floating_ips]))
+    ec2_addresses = collections.defaultdict(list)
+    for os_floating_ip in os_floating_ips:
+        ec2_address = address_api._format_address(
+            context, addresses.get(os_floating_ip['id']), os_floating_ip,
+            os_ports.values())
+        if 'networkInterfaceId' in ec2_address:
+            ec2_addresses[ec2_address['networkInterfaceId']].append(
+                ec2_address)
+
+    os_security_group_ids = set(itertools.chain(
+        *(p['security_groups'] for p in os_ports.itervalues())))
+    security_groups = (
+        security_group_api._format_security_groups_ids_names(
+            context, os_security_group_ids)
+        if os_security_group_ids else {})
+
+    return [_format_network_interface(context, eni, os_ports[eni['os_id']],
+                                      ec2_addresses[eni['id']],
+                                      security_groups)
+            for eni in network_interfaces]
+
+
+def _get_items_by_os_ids(context, kind, os_ids):
+    # NOTE(ft): get_item_ids returns all items of the kind for empty os_ids
+    if not os_ids:
+        return []
+    return db_api.get_items_by_ids(
+        context, [item_id for item_id, _os_id
+                  in db_api.get_item_ids(context, kind, os_ids)])
+
+
 def _attach_network_interface_item(context, network_interface, instance_id,
                                    device_index, attach_time=None,
                                    delete_on_termination=False):
+    _set_network_interface_attachment(
+        network_interface, instance_id, device_index,
+        attach_time=attach_time, delete_on_termination=delete_on_termination)
+    db_api.update_item(context, network_interface)
+
+
+def _detach_network_interface_item(context, network_interface):
+    _clear_network_interface_attachment(network_interface)
+    db_api.update_item(context, network_interface)
+
+
+# NOTE(ft): following functions change network interface items in memory only
+# to allow callers to store a number of changed items by one DB call
+
+def _set_network_interface_attachment(network_interface, instance_id,
+                                      device_index, attach_time=None,
+                                      delete_on_termination=False):
     if not attach_time:
         attach_time = timeutils.isotime(None, True)
     network_interface.update({
@@ -490,12 +627,10 @@ def _attach_network_interface_item(context, network_interface, instance_id,
         'device_index': device_index,
         'attach_time': attach_time,
         'delete_on_termination': delete_on_termination})
-    db_api.update_item(context, network_interface)
 
 
-def _detach_network_interface_item(context, network_interface):
+def _clear_network_interface_attachment(network_interface):
     network_interface.pop('instance_id', None)
     network_interface.pop('device_index', None)
     network_interface.pop('attach_time', None)
     network_interface.pop('delete_on_termination', None)
-    db_api.update_item(context, network_interface)
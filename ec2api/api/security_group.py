@@ -296,9 +296,12 @@ def _translate_group_name(context, os_group, db_groups):
     return os_group['name']
 
 
-def _format_security_groups_ids_names(context):
+def _format_security_groups_ids_names(context, os_ids=None):
     neutron = clients.neutron(context)
-    os_security_groups = neutron.list_security_groups()['security_groups']
+    # NOTE(ft): Neutron ignores an empty list filter
+    search_opts = {'id': list(os_ids)} if os_ids else {}
+    os_security_groups = neutron.list_security_groups(
+        **search_opts)['security_groups']
     security_groups = db_api.get_items(context, 'sg')
     ec2_security_groups = {}
     for os_security_group in os_security_groups:
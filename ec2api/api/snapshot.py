@@ -95,10 +95,16 @@ class SnapshotDescriber(common.TaggableItemsDescriber):
 
 
 def describe_snapshots(context, snapshot_id=None, owner=None,
-                       restorable_by=None, filter=None):
-    formatted_snapshots = SnapshotDescriber().describe(
-        context, ids=snapshot_id, filter=filter)
-    return {'snapshotSet': formatted_snapshots}
+                       restorable_by=None, filter=None,
+                       max_results=None, next_token=None):
+    snapshot_describer = SnapshotDescriber()
+    formatted_snapshots = snapshot_describer.describe(
+        context, ids=snapshot_id, filter=filter,
+        max_results=max_results, next_token=next_token)
+    result = {'snapshotSet': formatted_snapshots}
+    if snapshot_describer.next_token:
+        result['nextToken'] = snapshot_describer.next_token
+    return result
 
 
 def _format_snapshot(context, snapshot, os_snapshot, volumes={},
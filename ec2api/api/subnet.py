@@ -157,7 +157,18 @@ class SubnetDescriber(common.TaggableItemsDescriber):
         neutron = clients.neutron(self.context)
         self.os_networks = neutron.list_networks()['networks']
         self.os_ports = neutron.list_ports()['ports']
-        return neutron.list_subnets()['subnets']
+        return neutron.list_subnets(**self.os_filters)['subnets']
+
+    def get_os_filters(self, filters):
+        subnet_ids = self.get_exact_filter_values(filters, 'subnet-id')
+        vpc_ids = self.get_exact_filter_values(filters, 'vpc-id')
+        if not subnet_ids and not vpc_ids:
+            return {}
+        os_ids = [subnet['os_id'] for subnet in self.items
+                  if ((not subnet_ids or subnet['id'] in subnet_ids) and
+                      (not vpc_ids or subnet['vpc_id'] in vpc_ids))]
+        # NOTE(ft): Neutron ignores an empty list filter
+        return {'id': os_ids} if os_ids else {}
 
 
 def describe_subnets(context, subnet_id=None, filter=None):
@@ -99,10 +99,19 @@ class TagDescriber(common.NonOpenstackItemsDescriber):
     def format(self, item):
         return _format_tag(item)
 
+    def get_paging_key(self, item):
+        return [item['item_id'], item['key']]
+
 
 def describe_tags(context, filter=None, max_results=None, next_token=None):
-    formatted_tags = TagDescriber().describe(context, filter=filter)
-    return {'tagSet': formatted_tags}
+    tag_describer = TagDescriber()
+    formatted_tags = tag_describer.describe(
+        context, filter=filter,
+        max_results=max_results, next_token=next_token)
+    result = {'tagSet': formatted_tags}
+    if tag_describer.next_token:
+        result['nextToken'] = tag_describer.next_token
+    return result
 
 
 def _format_tag(tag):
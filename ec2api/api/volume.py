@@ -128,7 +128,20 @@ class VolumeDescriber(common.TaggableItemsDescriber):
         return super(VolumeDescriber, self).get_db_items()
 
     def get_os_items(self):
-        return clients.cinder(self.context).volumes.list()
+        return clients.cinder(self.context).volumes.list(
+            search_opts=self.os_filters or None)
+
+    def get_os_filters(self, filters):
+        os_filters = {}
+        # NOTE(ft): 'in-use' status of EC2 volume combines several Cinder
+        # statuses
+        statuses = self.get_exact_filter_values(filters, 'status')
+        if statuses and len(statuses) == 1 and 'in-use' not in statuses:
+            os_filters['status'] = next(iter(statuses))
+        zones = self.get_exact_filter_values(filters, 'availability-zone')
+        if zones and len(zones) == 1:
+            os_filters['availability_zone'] = next(iter(zones))
+        return os_filters
 
     def get_name(self, os_item):
         return ''
@@ -136,9 +149,14 @@ class VolumeDescriber(common.TaggableItemsDescriber):
 
 def describe_volumes(context, volume_id=None, filter=None,
                      max_results=None, next_token=None):
-    formatted_volumes = VolumeDescriber().describe(
-        context, ids=volume_id, filter=filter)
-    return {'volumeSet': formatted_volumes}
+    volume_describer = VolumeDescriber()
+    formatted_volumes = volume_describer.describe(
+        context, ids=volume_id, filter=filter,
+        max_results=max_results, next_token=next_token)
+    result = {'volumeSet': formatted_volumes}
+    if volume_describer.next_token:
+        result['nextToken'] = volume_describer.next_token
+    return result
 
 
 def _format_volume(context, volume, os_volume, instances={},
@@ -83,10 +83,14 @@ def delete_vpc(context, vpc_id):
 
     neutron = clients.neutron(context)
     with common.OnCrashCleaner() as cleaner:
-        db_api.delete_item(context, vpc['id'])
+        # NOTE(ft): the main route table has no associated subnets since
+        # the vpc has no subnets, so delete both items at once
+        route_table = db_api.get_item_by_id(context, vpc['route_table_id'])
+        db_api.delete_items(context, [vpc['id'], vpc['route_table_id']])
         cleaner.addCleanup(db_api.restore_item, context, 'vpc', vpc)
-        route_table_api._delete_route_table(context, vpc['route_table_id'],
-                                            cleaner=cleaner)
+        if route_table:
+            cleaner.addCleanup(db_api.restore_item, context, 'rtb',
+                               route_table)
         # TODO(Alex): Check that only the default security group is left
         # in this VPC, otherwise DependencyViolation.
         security_groups = security_group_api.describe_security_groups(
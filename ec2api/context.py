@@ -14,6 +14,7 @@
 
 """RequestContext: context for requests that persist through all of ec2."""
 
+import copy
 import uuid
 
 from keystoneclient.v2_0 import client as keystone_client
@@ -22,6 +23,7 @@ from oslo_log import log as logging
 from oslo_utils import timeutils
 import six
 
+from ec2api.db import api as db_api
 from ec2api import exception
 from ec2api.i18n import _
 from ec2api.openstack.common import local
@@ -95,9 +97,22 @@ class RequestContext(object):
         # TODO(ft): call policy.check_is_admin if is_admin is None
         self.is_os_admin = is_os_admin
         self.api_version = api_version
+        self.db_identity_map = db_api.ItemsIdentityMap()
+        # NOTE(ft): OpenStack clients created while the request is processed
+        self.clients = {}
         if overwrite or not hasattr(local.store, 'context'):
             self.update_store()
 
+    def __deepcopy__(self, memo):
+        # NOTE(ft): OpenStack clients can not be copied, so a copy of the
+        # context shares them
+        result = copy.copy(self)
+        memo[id(self)] = result
+        for name, value in six.iteritems(self.__dict__):
+            if name != 'clients':
+                setattr(result, name, copy.deepcopy(value, memo))
+        return result
+
     def update_store(self):
         local.store.context = self
 
@@ -156,15 +171,23 @@ def is_user_context(context):
     return True
 
 
+_os_admin_keystone = None
+
+
 def get_os_admin_context():
     """Create a context to interact with OpenStack as an administrator."""
-    # TODO(ft): make an authentification token reusable
-    keystone = keystone_client.Client(
-        username=CONF.admin_user,
-        password=CONF.admin_password,
-        tenant_name=CONF.admin_tenant_name,
-        auth_url=CONF.keystone_url,
-    )
+    global _os_admin_keystone
+    keystone = _os_admin_keystone
+    # NOTE(ft): the admin token and the service catalog are reused until
+    # the token expires, so metadata requests don't wait for Keystone
+    if keystone is None or keystone.auth_ref.will_expire_soon():
+        keystone = keystone_client.Client(
+            username=CONF.admin_user,
+            password=CONF.admin_password,
+            tenant_name=CONF.admin_tenant_name,
+            auth_url=CONF.keystone_url,
+        )
+        _os_admin_keystone = keystone
     service_catalog = keystone.service_catalog.get_data()
     return RequestContext(
             keystone.auth_user_id,
@@ -174,6 +197,12 @@ def get_os_admin_context():
             is_os_admin=True)
 
 
+def reset_os_admin_context():
+    """Forget the reused admin token, e.g. if OpenStack rejected it."""
+    global _os_admin_keystone
+    _os_admin_keystone = None
+
+
 def require_context(ctxt):
     """Raise exception.Forbidden()
 
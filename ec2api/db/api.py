@@ -27,6 +27,8 @@ functions from ec2api.db namespace, not the ec2api.db.api namespace.
 
 """
 
+import copy
+
 from eventlet import tpool
 from oslo_config import cfg
 from oslo_db import api as db_api
@@ -79,8 +81,116 @@ IMPL = EC2DBAPI()
 LOG = logging.getLogger(__name__)
 
 
+class ItemsIdentityMap(object):
+    """Request scoped map of DB items which are already loaded.
+
+    An instance is hung off RequestContext, so DB API functions of this
+    module return items loaded earlier by the same request without additional
+    DB queries. Items are stored and returned as copies, because callers
+    modify received items.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.project_id = None
+        self._items = {}
+        self._kind_item_ids = {}
+
+    def reset(self, project_id):
+        self.project_id = project_id
+        self._items.clear()
+        self._kind_item_ids.clear()
+
+    def get_item(self, item_id):
+        item = self._items.get(item_id)
+        self._count(item is not None)
+        return copy.deepcopy(item)
+
+    def get_items(self, kind):
+        item_ids = self._kind_item_ids.get(kind)
+        self._count(item_ids is not None)
+        if item_ids is None:
+            return None
+        return [copy.deepcopy(self._items[item_id]) for item_id in item_ids]
+
+    def get_items_by_ids(self, item_ids):
+        items = []
+        missed_ids = []
+        for item_id in item_ids:
+            item = self._items.get(item_id)
+            if item is not None:
+                items.append(copy.deepcopy(item))
+            else:
+                missed_ids.append(item_id)
+        self._count(not missed_ids)
+        return items, missed_ids
+
+    def get_item_ids(self, kind, os_ids):
+        item_ids = self._kind_item_ids.get(kind)
+        if item_ids is not None:
+            os_ids = set(os_ids)
+            ids = [(item_id, self._items[item_id]['os_id'])
+                   for item_id in item_ids
+                   if self._items[item_id]['os_id'] in os_ids]
+            if len(ids) == len(os_ids):
+                self._count(True)
+                return ids
+        self._count(False)
+        return None
+
+    def put_item(self, item):
+        if item is not None:
+            self._items[item['id']] = copy.deepcopy(item)
+
+    def put_items(self, kind, items):
+        for item in items:
+            self.put_item(item)
+        if kind is not None:
+            self._kind_item_ids[kind] = [item['id'] for item in items]
+
+    def invalidate_item(self, item_id):
+        self._items.pop(item_id, None)
+        self._kind_item_ids.pop(_get_item_kind(item_id), None)
+
+    def _count(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+
+def _get_identity_map(context):
+    identity_map = getattr(context, 'db_identity_map', None)
+    if not isinstance(identity_map, ItemsIdentityMap):
+        return None
+    # NOTE(ft): metadata server substitutes project_id of its context
+    if identity_map.project_id != context.project_id:
+        identity_map.reset(context.project_id)
+    return identity_map
+
+
+def _get_item_kind(item_id):
+    return item_id.split('-')[0]
+
+
 def add_item(context, kind, data):
-    return IMPL.add_item(context, kind, data)
+    item = IMPL.add_item(context, kind, data)
+    identity_map = _get_identity_map(context)
+    if identity_map:
+        identity_map.invalidate_item(item['id'])
+        identity_map.put_item(item)
+    return item
+
+
+def add_items(context, kind, data_list):
+    items = IMPL.add_items(context, kind, data_list)
+    identity_map = _get_identity_map(context)
+    if identity_map:
+        for item in items:
+            identity_map.invalidate_item(item['id'])
+            identity_map.put_item(item)
+    return items
 
 
 def add_item_id(context, kind, os_id):
@@ -88,34 +198,93 @@ def add_item_id(context, kind, os_id):
 
 
 def update_item(context, item):
+    identity_map = _get_identity_map(context)
+    if identity_map:
+        identity_map.invalidate_item(item['id'])
     IMPL.update_item(context, item)
 
 
+def update_items(context, items):
+    identity_map = _get_identity_map(context)
+    if identity_map:
+        for item in items:
+            identity_map.invalidate_item(item['id'])
+    IMPL.update_items(context, items)
+
+
 def delete_item(context, item_id):
+    identity_map = _get_identity_map(context)
+    if identity_map:
+        identity_map.invalidate_item(item_id)
     IMPL.delete_item(context, item_id)
 
 
+def delete_items(context, item_ids):
+    identity_map = _get_identity_map(context)
+    if identity_map:
+        for item_id in item_ids:
+            identity_map.invalidate_item(item_id)
+    IMPL.delete_items(context, item_ids)
+
+
 def restore_item(context, kind, data):
-    return IMPL.restore_item(context, kind, data)
+    item = IMPL.restore_item(context, kind, data)
+    identity_map = _get_identity_map(context)
+    if identity_map:
+        identity_map.invalidate_item(item['id'])
+        identity_map.put_item(item)
+    return item
 
 
 def get_items(context, kind):
-    return IMPL.get_items(context, kind)
+    identity_map = _get_identity_map(context)
+    if identity_map:
+        items = identity_map.get_items(kind)
+        if items is not None:
+            return items
+    items = IMPL.get_items(context, kind)
+    if identity_map:
+        identity_map.put_items(kind, items)
+    return items
 
 
 def get_item_by_id(context, item_id):
-    return IMPL.get_item_by_id(context, item_id)
+    identity_map = _get_identity_map(context)
+    if identity_map:
+        item = identity_map.get_item(item_id)
+        if item is not None:
+            return item
+    item = IMPL.get_item_by_id(context, item_id)
+    if identity_map:
+        identity_map.put_item(item)
+    return item
 
 
 def get_items_by_ids(context, item_ids):
-    return IMPL.get_items_by_ids(context, item_ids)
+    identity_map = _get_identity_map(context)
+    if not identity_map or not item_ids:
+        return IMPL.get_items_by_ids(context, item_ids)
+    items, missed_ids = identity_map.get_items_by_ids(item_ids)
+    if missed_ids:
+        # NOTE(ft): pass missed ids in the same collection type as the caller
+        # did to keep the backend call unchanged when nothing is cached
+        missed_items = IMPL.get_items_by_ids(context,
+                                             type(item_ids)(missed_ids))
+        identity_map.put_items(None, missed_items)
+        items.extend(missed_items)
+    return items
 
 
-def get_public_items(context, kind, item_ids=None):
-    return IMPL.get_public_items(context, kind, item_ids)
+def get_public_items(context, kinds, item_ids=None):
+    return IMPL.get_public_items(context, kinds, item_ids)
 
 
 def get_item_ids(context, kind, os_ids):
+    identity_map = _get_identity_map(context)
+    if identity_map and os_ids:
+        ids = identity_map.get_item_ids(kind, os_ids)
+        if ids is not None:
+            return ids
     return IMPL.get_item_ids(context, kind, os_ids)
 
 
@@ -129,3 +298,19 @@ def delete_tags(context, item_ids, tag_pairs=None):
 
 def get_tags(context, kinds=None, item_ids=None):
     return IMPL.get_tags(context, kinds, item_ids)
+
+
+def add_image_import_job(context, job_id, data):
+    return IMPL.add_image_import_job(context, job_id, data)
+
+
+def claim_image_import_jobs(context, host, limit, timeout):
+    return IMPL.claim_image_import_jobs(context, host, limit, timeout)
+
+
+def update_image_import_job(context, job_id, host, values=None):
+    return IMPL.update_image_import_job(context, job_id, host, values)
+
+
+def delete_image_import_job(context, job_id):
+    return IMPL.delete_image_import_job(context, job_id)
@@ -15,6 +15,7 @@
 """Implementation of SQLAlchemy backend."""
 
 import copy
+import datetime
 import functools
 import json
 import random
@@ -23,6 +24,7 @@ import sys
 from oslo_config import cfg
 from oslo_db import exception as db_exception
 from oslo_db.sqlalchemy import session as db_session
+from oslo_utils import timeutils
 from sqlalchemy import and_
 from sqlalchemy import or_
 from sqlalchemy.sql import bindparam
@@ -95,6 +97,7 @@ def add_item(context, kind, data):
     item_ref.update({
         "project_id": context.project_id,
         "id": _new_id(kind, data.get("os_id")),
+        "kind": kind,
     })
     item_ref.update(_pack_item_data(data))
     try:
@@ -107,7 +110,7 @@ def add_item(context, kind, data):
                     filter_by(os_id=data["os_id"]).
                     filter(or_(models.Item.project_id == context.project_id,
                                models.Item.project_id.is_(None))).
-                    filter(models.Item.id.like('%s-%%' % kind)).
+                    filter_by(kind=kind).
                     one())
         item_data = _unpack_item_data(item_ref)
         item_data.update(data)
@@ -117,11 +120,35 @@ def add_item(context, kind, data):
     return _unpack_item_data(item_ref)
 
 
+@require_context
+def add_items(context, kind, data_list):
+    rows = []
+    for data in data_list:
+        row = _pack_item_data(data)
+        row.update({
+            "project_id": context.project_id,
+            "id": _new_id(kind, data.get("os_id")),
+            "kind": kind,
+        })
+        rows.append(row)
+    if rows:
+        session = get_session()
+        try:
+            with session.begin():
+                session.execute(models.Item.__table__.insert(), rows)
+        except db_exception.DBDuplicateEntry:
+            # NOTE(ft): some OS ids are already registered, so add items one
+            # by one to merge them with existing ones
+            return [add_item(context, kind, data) for data in data_list]
+    return [_unpack_item_data(models.Item(**item_row)) for item_row in rows]
+
+
 @require_context
 def add_item_id(context, kind, os_id):
     item_ref = models.Item()
     item_ref.update({
         "id": _new_id(kind, os_id),
+        "kind": kind,
         "os_id": os_id,
     })
     try:
@@ -147,6 +174,23 @@ def update_item(context, item):
     return _unpack_item_data(item_ref)
 
 
+@require_context
+def update_items(context, items):
+    if not items:
+        return
+    items_table = models.Item.__table__
+    session = get_session()
+    with session.begin():
+        session.execute(
+            items_table.update().
+            where(and_(items_table.c.project_id == bindparam('b_project_id'),
+                       items_table.c.id == bindparam('b_id'))),
+            [dict(_pack_item_data(item),
+                  b_project_id=context.project_id,
+                  b_id=item['id'])
+             for item in items])
+
+
 @require_context
 def delete_item(context, item_id):
     session = get_session()
@@ -167,11 +211,28 @@ def delete_item(context, item_id):
         pass
 
 
+@require_context
+def delete_items(context, item_ids):
+    if not item_ids:
+        return
+    session = get_session()
+    with session.begin():
+        (model_query(context, models.Item, session=session).
+         filter_by(project_id=context.project_id).
+         filter(models.Item.id.in_(item_ids)).
+         delete(synchronize_session=False))
+        (model_query(context, models.Tag, session=session).
+         filter_by(project_id=context.project_id).
+         filter(models.Tag.item_id.in_(item_ids)).
+         delete(synchronize_session=False))
+
+
 @require_context
 def restore_item(context, kind, data):
     item_ref = models.Item()
     item_ref.update({
         "project_id": context.project_id,
+        "kind": kind,
     })
     item_ref.id = data['id']
     item_ref.update(_pack_item_data(data))
@@ -183,8 +244,8 @@ def restore_item(context, kind, data):
 def get_items(context, kind):
     return [_unpack_item_data(item)
             for item in (model_query(context, models.Item).
-                         filter_by(project_id=context.project_id).
-                         filter(models.Item.id.like('%s-%%' % kind)).
+                         filter_by(project_id=context.project_id,
+                                   kind=kind).
                          all())]
 
 
@@ -208,10 +269,10 @@ def get_items_by_ids(context, item_ids):
 
 
 @require_context
-def get_public_items(context, kind, item_ids=None):
+def get_public_items(context, kinds, item_ids=None):
     query = (model_query(context, models.Item).
-             filter(models.Item.id.like('%s-%%' % kind)).
-             filter(models.Item.data.like('%"is_public": True%')))
+             filter(models.Item.is_public == True).
+             filter(models.Item.kind.in_(kinds)))
     if item_ids:
         query = query.filter(models.Item.id.in_(item_ids))
     return [_unpack_item_data(item)
@@ -221,9 +282,9 @@ def get_public_items(context, kind, item_ids=None):
 @require_context
 def get_item_ids(context, kind, os_ids):
     query = (model_query(context, models.Item).
-             filter(models.Item.id.like('%s-%%' % kind)))
+             filter_by(kind=kind))
     if os_ids:
-        query = query.filter(models.Item.id.in_(os_ids))
+        query = query.filter(models.Item.os_id.in_(os_ids))
     return [(item['id'], item['os_id'])
             for item in query.all()]
 
@@ -241,6 +302,7 @@ def add_tags(context, tags):
         for tag in tags:
             tag_ref = models.Tag(project_id=context.project_id,
                                  item_id=tag['item_id'],
+                                 kind=_get_item_kind(tag['item_id']),
                                  key=tag['key'],
                                  value=tag['value'])
             try:
@@ -287,11 +349,7 @@ def get_tags(context, kinds=None, item_ids=None):
     query = (model_query(context, models.Tag).
              filter_by(project_id=context.project_id))
     if kinds:
-        fltr = None
-        for kind in kinds:
-            expr = models.Tag.item_id.like('%s-%%' % kind)
-            fltr = expr if fltr is None else or_(fltr, expr)
-        query = query.filter(fltr)
+        query = query.filter(models.Tag.kind.in_(kinds))
     if item_ids:
         query = query.filter(models.Tag.item_id.in_(item_ids))
     return [dict(item_id=tag.item_id,
@@ -300,12 +358,80 @@ def get_tags(context, kinds=None, item_ids=None):
             for tag in query.all()]
 
 
+@require_context
+def add_image_import_job(context, job_id, data):
+    job_ref = models.ImageImportJob()
+    job_ref.update({
+        "id": job_id,
+        "project_id": context.project_id,
+        "user_id": context.user_id,
+        "stage": "pending",
+        "parts_done": 0,
+        "attempts": 0,
+        "updated_at": timeutils.utcnow(),
+        "data": json.dumps(data),
+    })
+    job_ref.save()
+    return _unpack_image_import_job(job_ref)
+
+
+@require_context
+def claim_image_import_jobs(context, host, limit, timeout):
+    now = timeutils.utcnow()
+    expired_at = now - datetime.timedelta(seconds=timeout)
+    job_refs = (model_query(context, models.ImageImportJob).
+                filter(or_(models.ImageImportJob.host.is_(None),
+                           models.ImageImportJob.updated_at < expired_at)).
+                order_by(models.ImageImportJob.updated_at).
+                limit(limit).
+                all())
+    jobs = []
+    for job_ref in job_refs:
+        # NOTE(ft): a job is claimed only if it is not changed since it was
+        # read, so concurrent importer hosts never claim the same job
+        claimed_count = (model_query(context, models.ImageImportJob).
+                         filter_by(id=job_ref.id,
+                                   host=job_ref.host,
+                                   updated_at=job_ref.updated_at).
+                         update({'host': host, 'updated_at': now,
+                                 'attempts': (
+                                     models.ImageImportJob.attempts + 1)},
+                                synchronize_session=False))
+        if claimed_count:
+            job_ref.host = host
+            job_ref.updated_at = now
+            job_ref.attempts += 1
+            jobs.append(_unpack_image_import_job(job_ref))
+    return jobs
+
+
+@require_context
+def update_image_import_job(context, job_id, host, values=None):
+    values = dict(values or {}, updated_at=timeutils.utcnow())
+    return bool(model_query(context, models.ImageImportJob).
+                filter_by(id=job_id, host=host).
+                update(values, synchronize_session=False))
+
+
+@require_context
+def delete_image_import_job(context, job_id):
+    (model_query(context, models.ImageImportJob).
+     filter_by(id=job_id).
+     delete(synchronize_session=False))
+
+
+def _get_item_kind(item_id):
+    return item_id.split('-')[0]
+
+
 def _pack_item_data(item_data):
     data = copy.deepcopy(item_data)
     data.pop("id", None)
     return {
         "os_id": data.pop("os_id", None),
         "vpc_id": data.pop("vpc_id", None),
+        # NOTE(ft): is_public is kept in data as well to be unpacked as is
+        "is_public": bool(data.get("is_public")),
         "data": json.dumps(data),
     }
 
@@ -319,3 +445,17 @@ def _unpack_item_data(item_ref):
     data["os_id"] = item_ref.os_id
     data["vpc_id"] = item_ref.vpc_id
     return data
+
+
+def _unpack_image_import_job(job_ref):
+    return {
+        "id": job_ref.id,
+        "project_id": job_ref.project_id,
+        "user_id": job_ref.user_id,
+        "host": job_ref.host,
+        "stage": job_ref.stage,
+        "parts_done": job_ref.parts_done,
+        "attempts": job_ref.attempts,
+        "updated_at": job_ref.updated_at,
+        "data": json.loads(job_ref.data),
+    }
@@ -0,0 +1,56 @@
+#    Copyright 2014 Cloudscaling Group, Inc
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Column, Index, MetaData, String, Table
+from sqlalchemy import select
+
+
+def _add_kind(migrate_engine, table, id_column_name, index_name):
+    id_column = table.c[id_column_name]
+    table.create_column(Column('kind', String(length=20)))
+
+    # NOTE(ft): there are a few kinds only, so update rows kind by kind to
+    # avoid a DB specific string manipulation in SQL
+    kinds = set(row[0].split('-')[0]
+                for row in migrate_engine.execute(
+                    select([id_column]).distinct()))
+    for kind in kinds:
+        migrate_engine.execute(
+            table.update().
+            where(id_column.like('%s-%%' % kind)).
+            values(kind=kind))
+
+    Index(index_name, table.c.project_id, table.c.kind).create(migrate_engine)
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    items = Table('items', meta, autoload=True)
+    _add_kind(migrate_engine, items, 'id', 'items_project_id_kind_idx')
+
+    tags = Table('tags', meta, autoload=True)
+    _add_kind(migrate_engine, tags, 'item_id', 'tags_project_id_kind_idx')
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name in ('items', 'tags'):
+        table = Table(table_name, meta, autoload=True)
+        Index('%s_project_id_kind_idx' % table_name,
+              table.c.project_id, table.c.kind).drop(migrate_engine)
+        table.drop_column('kind')
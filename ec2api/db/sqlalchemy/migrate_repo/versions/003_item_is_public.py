@@ -0,0 +1,52 @@
+#    Copyright 2014 Cloudscaling Group, Inc
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+
+from sqlalchemy import Boolean, Column, Index, MetaData, Table
+from sqlalchemy import select
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    items = Table('items', meta, autoload=True)
+    items.create_column(Column('is_public', Boolean, default=False))
+    migrate_engine.execute(items.update().values(is_public=False))
+
+    public_item_ids = [
+        row['id']
+        for row in migrate_engine.execute(
+            select([items.c.id, items.c.data]).
+            where(items.c.data.like('%is_public%')))
+        if json.loads(row['data']).get('is_public')]
+    if public_item_ids:
+        migrate_engine.execute(
+            items.update().
+            where(items.c.id.in_(public_item_ids)).
+            values(is_public=True))
+
+    Index('items_is_public_kind_idx',
+          items.c.is_public, items.c.kind).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    items = Table('items', meta, autoload=True)
+    Index('items_is_public_kind_idx',
+          items.c.is_public, items.c.kind).drop(migrate_engine)
+    items.drop_column('is_public')
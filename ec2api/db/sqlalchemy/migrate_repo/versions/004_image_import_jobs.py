@@ -0,0 +1,49 @@
+#    Copyright 2014 Cloudscaling Group, Inc
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData
+from sqlalchemy import PrimaryKeyConstraint, String, Table, Text
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    image_import_jobs = Table('image_import_jobs', meta,
+        Column("id", String(length=36)),
+        Column("project_id", String(length=64)),
+        Column("user_id", String(length=64)),
+        Column("host", String(length=255)),
+        Column("stage", String(length=20)),
+        Column("parts_done", Integer, default=0),
+        Column("attempts", Integer, default=0),
+        Column("updated_at", DateTime),
+        Column("data", Text()),
+        PrimaryKeyConstraint('id'),
+        mysql_engine="InnoDB",
+        mysql_charset="utf8"
+    )
+    image_import_jobs.create()
+
+    Index('image_import_jobs_host_idx',
+          image_import_jobs.c.host).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    image_import_jobs = Table('image_import_jobs', meta, autoload=True)
+    image_import_jobs.drop()
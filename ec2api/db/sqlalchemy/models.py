@@ -18,7 +18,8 @@ SQLAlchemy models for ec2api data.
 
 from oslo_db.sqlalchemy import models
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, PrimaryKeyConstraint, String, Text
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer
+from sqlalchemy import PrimaryKeyConstraint, String, Text
 from sqlalchemy import UniqueConstraint
 
 BASE = declarative_base()
@@ -43,11 +44,15 @@ class Item(BASE, EC2Base):
     __table_args__ = (
         PrimaryKeyConstraint('id'),
         UniqueConstraint('os_id', name=ITEMS_OS_ID_INDEX_NAME),
+        Index('items_project_id_kind_idx', 'project_id', 'kind'),
+        Index('items_is_public_kind_idx', 'is_public', 'kind'),
     )
     id = Column(String(length=30))
     project_id = Column(String(length=64))
+    kind = Column(String(length=20))
     vpc_id = Column(String(length=12))
     os_id = Column(String(length=36))
+    is_public = Column(Boolean, default=False)
     data = Column(Text())
 
 
@@ -55,8 +60,27 @@ class Tag(BASE, EC2Base):
     __tablename__ = 'tags'
     __table_args__ = (
         PrimaryKeyConstraint('project_id', 'item_id', 'key'),
+        Index('tags_project_id_kind_idx', 'project_id', 'kind'),
     )
     project_id = Column(String(length=64))
     item_id = Column(String(length=30))
+    kind = Column(String(length=20))
     key = Column(String(length=127))
     value = Column(String(length=255))
+
+
+class ImageImportJob(BASE, EC2Base):
+    __tablename__ = 'image_import_jobs'
+    __table_args__ = (
+        PrimaryKeyConstraint('id'),
+        Index('image_import_jobs_host_idx', 'host'),
+    )
+    id = Column(String(length=36))
+    project_id = Column(String(length=64))
+    user_id = Column(String(length=64))
+    host = Column(String(length=255))
+    stage = Column(String(length=20))
+    parts_done = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    updated_at = Column(DateTime)
+    data = Column(Text())
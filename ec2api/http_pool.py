@@ -0,0 +1,155 @@
+# Copyright 2014
+# The Cloudscaling Group, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Process wide pool of keep-alive HTTP connections."""
+
+import cookielib
+import time
+import urlparse
+
+from eventlet import semaphore
+from oslo_config import cfg
+from oslo_log import log as logging
+import requests
+from requests import adapters
+
+http_pool_opts = [
+    cfg.IntOpt('http_pool_connections',
+               default=10,
+               help='Number of hosts to keep HTTP connection pools for'),
+    cfg.IntOpt('http_pool_maxsize',
+               default=10,
+               help='Maximum number of kept alive HTTP connections to a '
+                    'host'),
+    cfg.IntOpt('http_pool_max_requests_per_host',
+               default=0,
+               help='Maximum number of concurrent HTTP requests to a host, '
+                    'other requests wait for a free slot. Zero means no '
+                    'limit'),
+    cfg.BoolOpt('http_keepalive',
+                default=True,
+                help='Keep HTTP connections alive between requests'),
+    cfg.IntOpt('http_pool_stats_interval',
+               default=300,
+               help='Interval in seconds to log usage stats of HTTP '
+                    'connection pools. Zero disables the logging'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(http_pool_opts)
+
+LOG = logging.getLogger(__name__)
+
+_session = None
+_hosts = {}
+_stats_logged_at = None
+
+
+class _HostStats(object):
+
+    def __init__(self):
+        self.limit = CONF.http_pool_max_requests_per_host
+        # NOTE(ft): eventlet semaphore switches green threads while waiting
+        # instead of blocking the whole process
+        self.semaphore = (semaphore.Semaphore(self.limit)
+                          if self.limit > 0 else None)
+        self.requests = 0
+        self.waits = 0
+        self.in_use = 0
+        self.max_in_use = 0
+
+    def to_dict(self):
+        return {'limit': self.limit,
+                'requests': self.requests,
+                'waits': self.waits,
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use}
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = adapters.HTTPAdapter(
+            pool_connections=CONF.http_pool_connections,
+            pool_maxsize=CONF.http_pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not CONF.http_keepalive:
+            session.headers['Connection'] = 'close'
+        # NOTE(ft): the session is shared by requests of all users, so
+        # cookies set by a response must not be sent with other requests
+        session.cookies.set_policy(
+            cookielib.DefaultCookiePolicy(allowed_domains=[]))
+        _session = session
+    return _session
+
+
+def request(method, url, **kwargs):
+    """Send an HTTP request by a pooled connection.
+
+    Accepts the same arguments as requests.request.
+    """
+    host = urlparse.urlsplit(url).netloc
+    stats = _hosts.get(host)
+    if stats is None:
+        stats = _hosts[host] = _HostStats()
+    if stats.semaphore is not None:
+        if stats.semaphore.locked():
+            stats.waits += 1
+            LOG.debug('HTTP connection pool to %(host)s is saturated, '
+                      '%(in_use)s requests are in progress',
+                      {'host': host, 'in_use': stats.in_use})
+        stats.semaphore.acquire()
+    stats.in_use += 1
+    stats.max_in_use = max(stats.max_in_use, stats.in_use)
+    try:
+        return _get_session().request(method, url, **kwargs)
+    finally:
+        stats.in_use -= 1
+        stats.requests += 1
+        if stats.semaphore is not None:
+            stats.semaphore.release()
+        _log_stats()
+
+
+def _log_stats():
+    global _stats_logged_at
+    if CONF.http_pool_stats_interval <= 0:
+        return
+    now = time.time()
+    if _stats_logged_at is None:
+        _stats_logged_at = now
+    elif now - _stats_logged_at >= CONF.http_pool_stats_interval:
+        _stats_logged_at = now
+        for host, stats in sorted(_hosts.items()):
+            LOG.info('HTTP connection pool to %(host)s: %(requests)s '
+                     'requests, %(waits)s waits for a free slot, '
+                     '%(in_use)s of %(limit)s slots in use, %(max_in_use)s '
+                     'at most', dict(stats.to_dict(), host=host))
+
+
+def get_stats():
+    """Return usage stats of connection pools by host."""
+    return dict((host, stats.to_dict()) for host, stats in _hosts.items())
+
+
+def reset():
+    """Drop all connections and stats."""
+    global _session, _stats_logged_at
+    if _session is not None:
+        _session.close()
+        _session = None
+    _hosts.clear()
+    _stats_logged_at = None
@@ -0,0 +1,141 @@
+# Copyright 2014
+# The Cloudscaling Group, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Service which imports images registered from S3 bundles."""
+
+import socket
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from ec2api.api import image as image_api
+from ec2api import context as ec2_context
+from ec2api.db import api as db_api
+from ec2api.i18n import _LE, _LW
+from ec2api.openstack.common import service
+
+image_importer_opts = [
+    cfg.StrOpt('image_importer_host',
+               default=socket.gethostname(),
+               help='Name of the image importer host which is recorded in '
+                    'import jobs claimed by the host'),
+    cfg.IntOpt('image_importer_max_imports',
+               default=2,
+               help='Maximum number of images imported concurrently by an '
+                    'image importer host'),
+    cfg.IntOpt('image_importer_poll_interval',
+               default=10,
+               help='Interval in seconds between polls for new import jobs'),
+    cfg.IntOpt('image_importer_job_timeout',
+               default=120,
+               help='Time in seconds after which an import job, which is '
+                    'not reported by its importer host, is resumed by '
+                    'another host'),
+    cfg.IntOpt('image_importer_max_attempts',
+               default=5,
+               help='Maximum number of attempts to import an image. The '
+                    'image of a job which fails all attempts is marked as '
+                    'failed'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(image_importer_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+class _JobLost(Exception):
+    """The import job is claimed by another host."""
+
+
+class ImageImporter(service.Service):
+    """Claims image import jobs and runs them.
+
+    Claimed jobs are reported at every poll to be not resumed by other
+    hosts. Jobs of a crashed host are resumed from the beginning, because
+    Glance accepts image data in one request only. A job which fails too
+    many attempts is abandoned.
+    """
+
+    def __init__(self):
+        super(ImageImporter, self).__init__()
+        self.host = CONF.image_importer_host
+        self._job_ids = set()
+
+    def start(self):
+        super(ImageImporter, self).start()
+        self.tg.add_timer(CONF.image_importer_poll_interval, self._poll_jobs)
+
+    def stop(self, graceful=False):
+        job_ids = list(self._job_ids)
+        super(ImageImporter, self).stop(graceful)
+        # NOTE(ft): release unfinished jobs to be resumed by other hosts
+        # without waiting for the job timeout
+        context = ec2_context.get_admin_context()
+        for job_id in job_ids:
+            db_api.update_image_import_job(context, job_id, self.host,
+                                           {'host': None})
+
+    def _poll_jobs(self):
+        # NOTE(ft): the timer stops on an unhandled exception
+        try:
+            context = ec2_context.get_admin_context()
+            for job_id in list(self._job_ids):
+                db_api.update_image_import_job(context, job_id, self.host)
+            limit = CONF.image_importer_max_imports - len(self._job_ids)
+            if limit <= 0:
+                return
+            jobs = db_api.claim_image_import_jobs(
+                context, self.host, limit, CONF.image_importer_job_timeout)
+        except Exception:
+            LOG.exception(_LE('Failed to poll image import jobs'))
+            return
+        for job in jobs:
+            self._job_ids.add(job['id'])
+            self.tg.add_thread(self._import_image, job)
+
+    def _import_image(self, job):
+        admin_context = ec2_context.get_admin_context()
+
+        def checkpoint(stage, parts_done):
+            if not db_api.update_image_import_job(
+                    admin_context, job['id'], self.host,
+                    {'stage': stage, 'parts_done': parts_done}):
+                raise _JobLost()
+
+        try:
+            context = ec2_context.get_os_admin_context()
+            # NOTE(ft): S3 credentials and the image decryption key belong
+            # to the user who registered the image
+            context.user_id = job['user_id']
+            context.project_id = job['project_id']
+            context.update_store()
+            if job['attempts'] > CONF.image_importer_max_attempts:
+                LOG.error(_LE('Import of image %(id)s is abandoned after '
+                              '%(attempts)s attempts'),
+                          {'id': job['id'],
+                           'attempts': job['attempts'] - 1})
+                image_api._s3_abandon_import(context, job)
+            else:
+                image_api._s3_import(context, job, checkpoint)
+            db_api.delete_image_import_job(admin_context, job['id'])
+        except _JobLost:
+            LOG.warning(_LW('Import job of image %s is claimed by another '
+                            'host, the import is aborted'), job['id'])
+        except Exception:
+            # NOTE(ft): the job is not reported anymore, so it is resumed
+            # after the job timeout until it runs out of attempts
+            LOG.exception(_LE('Failed to import image %s'), job['id'])
+        finally:
+            self._job_ids.discard(job['id'])
@@ -17,14 +17,15 @@ import hmac
 import posixpath
 import urlparse
 
-import httplib2
 from oslo_config import cfg
 from oslo_log import log as logging
 import six
 import webob
 
+from ec2api.api import clients
 from ec2api import context as ec2context
 from ec2api import exception
+from ec2api import http_pool
 from ec2api.i18n import _, _LE, _LW
 from ec2api.metadata import api
 from ec2api import utils
@@ -95,6 +96,10 @@ class MetadataRequestHandler(wsgi.Application):
             return webob.exc.HTTPNotFound()
         except Exception:
             LOG.exception(_LE("Unexpected error."))
+            # NOTE(ft): get the admin token and endpoints again in case
+            # the token is revoked or a service is moved
+            clients.reset_endpoints()
+            ec2context.reset_os_admin_context()
             msg = _('An unknown error has occurred. '
                     'Please try your request again.')
             return webob.exc.HTTPInternalServerError(explanation=unicode(msg))
@@ -110,44 +115,44 @@ class MetadataRequestHandler(wsgi.Application):
             req.query_string,
             ''))
 
-        h = httplib2.Http(
-            ca_certs=CONF.metadata.auth_ca_cert,
-            disable_ssl_certificate_validation=(
-                    CONF.metadata.nova_metadata_insecure)
-        )
+        if CONF.metadata.nova_metadata_insecure:
+            verify = False
+        else:
+            verify = CONF.metadata.auth_ca_cert or True
+        cert = None
         if (CONF.metadata.nova_client_cert and
                 CONF.metadata.nova_client_priv_key):
-            h.add_certificate(CONF.metadata.nova_client_priv_key,
-                              CONF.metadata.nova_client_cert,
-                              nova_ip_port)
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+            cert = (CONF.metadata.nova_client_cert,
+                    CONF.metadata.nova_client_priv_key)
+        resp = http_pool.request(req.method, url, headers=headers,
+                                 data=req.body, verify=verify, cert=cert)
 
-        if resp.status == 200:
+        if resp.status_code == 200:
             LOG.debug(str(resp))
-            req.response.content_type = resp['content-type']
-            req.response.body = content
+            req.response.content_type = resp.headers['content-type']
+            req.response.body = resp.content
             return req.response
-        elif resp.status == 403:
+        elif resp.status_code == 403:
             LOG.warn(_LW(
                 'The remote metadata server responded with Forbidden. This '
                 'response usually occurs when shared secrets do not match.'
             ))
             return webob.exc.HTTPForbidden()
-        elif resp.status == 400:
+        elif resp.status_code == 400:
             return webob.exc.HTTPBadRequest()
-        elif resp.status == 404:
+        elif resp.status_code == 404:
             return webob.exc.HTTPNotFound()
-        elif resp.status == 409:
+        elif resp.status_code == 409:
             return webob.exc.HTTPConflict()
-        elif resp.status == 500:
+        elif resp.status_code == 500:
             msg = _(
                 'Remote metadata server experienced an internal server error.'
             )
             LOG.warn(msg)
             return webob.exc.HTTPInternalServerError(explanation=unicode(msg))
         else:
-            raise Exception(_('Unexpected response code: %s') % resp.status)
+            raise Exception(_('Unexpected response code: %s') %
+                            resp.status_code)
 
     def _build_proxy_request_headers(self, req):
         if req.headers.get('X-Instance-ID'):
@@ -13,15 +13,19 @@
 # limitations under the License.
 
 import itertools
+import sys
 
+from eventlet import event
+from eventlet import greenpool
 from novaclient import exceptions as nova_exception
 from oslo_log import log as logging
+import six
 
 from ec2api.api import clients
-from ec2api.api import ec2utils
 from ec2api.api import instance as instance_api
 from ec2api import exception
 from ec2api.i18n import _
+from ec2api.metadata import cache
 from ec2api.novadb import api as novadb
 
 LOG = logging.getLogger(__name__)
@@ -62,26 +66,46 @@ VERSION_DATA = {
     '2009-04-04': [],
 }
 
+# NOTE(ft): metadata builds in progress in this worker by cache keys
+_builds = {}
+
 
 def get_version_list():
     return _format_metadata_item(VERSIONS + ["latest"])
 
 
 def get_os_instance_and_project_id(context, fixed_ip):
+    nova = clients.nova(context)
+    ids = cache.get('instance', fixed_ip)
+    if ids is not None:
+        # NOTE(ft): the IP could be released and given to another instance
+        # after it was cached, so the cached instance must still have it
+        try:
+            os_instance = nova.servers.get(ids[0])
+        except nova_exception.NotFound:
+            os_instance = None
+        if os_instance is not None and _has_fixed_ip(os_instance, fixed_ip):
+            return ids
+        cache.delete('instance', fixed_ip)
     try:
-        nova = clients.nova(context)
         os_address = nova.fixed_ips.get(fixed_ip)
         os_instances = nova.servers.list(
                 search_opts={'hostname': os_address.hostname,
                              'all_tenants': True})
-        return next((os_instance.id, os_instance.tenant_id)
-                    for os_instance in os_instances
-                    if any((addr['addr'] == fixed_ip and
-                                addr['OS-EXT-IPS:type'] == 'fixed')
-                           for addr in itertools.chain(
-                                *os_instance.addresses.itervalues())))
+        ids = next((os_instance.id, os_instance.tenant_id)
+                   for os_instance in os_instances
+                   if _has_fixed_ip(os_instance, fixed_ip))
     except (nova_exception.NotFound, StopIteration):
         raise exception.EC2MetadataNotFound()
+    cache.put('instance', fixed_ip, ids)
+    return ids
+
+
+def _has_fixed_ip(os_instance, fixed_ip):
+    return any((addr['addr'] == fixed_ip and
+                addr['OS-EXT-IPS:type'] == 'fixed')
+               for addr in itertools.chain(
+                    *os_instance.addresses.itervalues()))
 
 
 def get_metadata_item(context, path_tokens, os_instance_id, remote_ip):
@@ -91,41 +115,67 @@ def get_metadata_item(context, path_tokens, os_instance_id, remote_ip):
     elif version not in VERSIONS:
         raise exception.EC2MetadataNotFound()
 
-    ec2_instance, ec2_reservation = (
-        _get_ec2_instance_and_reservation(context, os_instance_id))
+    cached = _get_cached_metadata(context, os_instance_id, remote_ip)
     # NOTE(ft): check for case of Neutron metadata proxy.
     # It sends project_id as X-Tenant-ID HTTP header. We make sure it's correct
-    if context.project_id != ec2_reservation['ownerId']:
+    if context.project_id != cached['owner_id']:
         LOG.warning(_('Tenant_id %(tenant_id)s does not match tenant_id '
                       'of instance %(instance_id)s.'),
                     {'tenant_id': context.project_id,
                      'instance_id': os_instance_id})
         raise exception.EC2MetadataNotFound()
 
-    metadata = _build_metadata(context, ec2_instance, ec2_reservation,
-                               os_instance_id, remote_ip)
-    # TODO(ft): cache built metadata
-    metadata = _cut_down_to_version(metadata, version)
-    metadata_item = _find_path_in_tree(metadata, path_tokens[1:])
-    return _format_metadata_item(metadata_item)
+    try:
+        return cached['index'][(version,) + tuple(path_tokens[1:])]
+    except KeyError:
+        raise exception.EC2MetadataNotFound()
+
+
+def _get_cached_metadata(context, os_instance_id, remote_ip):
+    # NOTE(ft): local-ipv4 depends on the requester address, so it is a part
+    # of the key
+    cache_key = '%s-%s' % (os_instance_id, remote_ip)
+    cached = cache.get('metadata', cache_key)
+    if cached is not None:
+        return cached
+
+    # NOTE(ft): cloud-init sends many requests at once while an instance
+    # boots. They wait for the first one to build metadata instead of
+    # building the same metadata simultaneously.
+    build = _builds.get(cache_key)
+    if build is not None:
+        return build.wait()
+    build = _builds[cache_key] = event.Event()
+    try:
+        ec2_instance, ec2_reservation = (
+            _get_ec2_instance_and_reservation(context, os_instance_id))
+        metadata = _build_metadata(context, ec2_instance, ec2_reservation,
+                                   os_instance_id, remote_ip)
+        cached = {
+            'owner_id': ec2_reservation['ownerId'],
+            'index': _build_metadata_index(metadata),
+        }
+    except Exception:
+        exc_info = sys.exc_info()
+        build.send_exception(*exc_info)
+        six.reraise(*exc_info)
+    else:
+        cache.put('metadata', cache_key, cached)
+        build.send(cached)
+    finally:
+        del _builds[cache_key]
+    return cached
 
 
 def _get_ec2_instance_and_reservation(context, os_instance_id):
-    instance_id = ec2utils.os_id_to_ec2_id(context, 'i', os_instance_id)
     try:
-        ec2_reservations = instance_api.describe_instances(
-                context, [instance_id])
+        ec2_reservation = instance_api.describe_os_instance(context,
+                                                            os_instance_id)
     except exception.InvalidInstanceIDNotFound:
-        ec2_reservations = instance_api.describe_instances(
-                context, filter=[{'name': 'instance-id',
-                                  'value': [instance_id]}])
-    if (len(ec2_reservations['reservationSet']) != 1 or
-            len(ec2_reservations['reservationSet'][0]['instancesSet']) != 1):
         LOG.error(_('Failed to get metadata for instance id: %s'),
                   os_instance_id)
         raise exception.EC2MetadataNotFound()
 
-    ec2_reservation = ec2_reservations['reservationSet'][0]
     ec2_instance = ec2_reservation['instancesSet'][0]
 
     return ec2_instance, ec2_reservation
@@ -133,6 +183,17 @@ def _get_ec2_instance_and_reservation(context, os_instance_id):
 
 def _build_metadata(context, ec2_instance, ec2_reservation,
                              os_instance_id, remote_ip):
+    # NOTE(ft): user data, key data and block device mappings don't depend on
+    # each other, so they are got concurrently
+    pool = greenpool.GreenPool(3)
+    block_device_mappings = pool.spawn(_build_block_device_mappings,
+                                       context, ec2_instance, os_instance_id)
+    userdata = pool.spawn(instance_api.describe_instance_attribute,
+                          context, ec2_instance['instanceId'], 'userData')
+    novadb_instance = (pool.spawn(novadb.instance_get_by_uuid,
+                                  context, os_instance_id)
+                       if ec2_instance['keyName'] else None)
+
     metadata = {
         'ami-id': ec2_instance['imageId'],
         'ami-launch-index': ec2_instance['amiLaunchIndex'],
@@ -140,9 +201,7 @@ def _build_metadata(context, ec2_instance, ec2_reservation,
         'ami-manifest-path': 'FIXME',
         # NOTE (ft): empty value as it is in Nova EC2 metadata
         'ancestor-ami-ids': [],
-        'block-device-mapping': _build_block_device_mappings(context,
-                                                             ec2_instance,
-                                                             os_instance_id),
+        'block-device-mapping': block_device_mappings.wait(),
         # NOTE(ft): Nova EC2 metadata returns instance's hostname with
         # dhcp_domain suffix if it's set in config.
         # But i don't see any reason to return a hostname differs from EC2
@@ -180,15 +239,13 @@ def _build_metadata(context, ec2_instance, ec2_reservation,
     # meta-data/public-keys/0/ : 'openssh-key'
     # meta-data/public-keys/0/openssh-key : '%s' % publickey
     if ec2_instance['keyName']:
-        novadb_instance = novadb.instance_get_by_uuid(context, os_instance_id)
         metadata['public-keys'] = {
             '0': {'_name': "0=" + ec2_instance['keyName'],
-                  'openssh-key': novadb_instance['key_data']}}
+                  'openssh-key': novadb_instance.wait()['key_data']}}
 
     full_metadata = {'meta-data': metadata}
 
-    userdata = instance_api.describe_instance_attribute(
-                    context, ec2_instance['instanceId'], 'userData')
+    userdata = userdata.wait()
     if 'userData' in userdata:
         full_metadata['user-data'] = userdata['userData']['value']
 
@@ -228,6 +285,23 @@ def _build_block_device_mappings(context, ec2_instance, os_instance_id):
     return mappings
 
 
+def _build_metadata_index(metadata):
+    # NOTE(ft): all items of all versions are rendered at once, then a
+    # request is served by one lookup of its path
+    index = {}
+    for version in VERSIONS:
+        _index_metadata_item(index, (version,),
+                             _cut_down_to_version(metadata, version))
+    return index
+
+
+def _index_metadata_item(index, path, data):
+    index[path] = _format_metadata_item(data)
+    if isinstance(data, dict):
+        for key, value in data.iteritems():
+            _index_metadata_item(index, path + (key,), value)
+
+
 def _cut_down_to_version(metadata, version):
     version_number = VERSIONS.index(version) + 1
     if version_number == len(VERSIONS):
@@ -259,18 +333,3 @@ def _format_metadata_item(data):
         return '\n'.join(data)
     else:
         return str(data)
-
-
-def _find_path_in_tree(data, path_tokens):
-    # given a dict/list tree, and a path in that tree, return data found there.
-    for i in range(0, len(path_tokens)):
-        if isinstance(data, dict) or isinstance(data, list):
-            if path_tokens[i] in data:
-                data = data[path_tokens[i]]
-            else:
-                raise exception.EC2MetadataNotFound()
-        else:
-            if i != len(path_tokens) - 1:
-                raise exception.EC2MetadataNotFound()
-            data = data[path_tokens[i]]
-    return data
@@ -0,0 +1,126 @@
+# Copyright 2014
+# The Cloudscaling Group, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cache of data built for metadata requests."""
+
+import collections
+import time
+
+from oslo_config import cfg
+
+from ec2api.i18n import _
+
+try:
+    import memcache
+except ImportError:
+    memcache = None
+
+
+cache_opts = [
+    cfg.IntOpt('cache_expiration',
+               default=15,
+               help=_('Time in seconds to cache metadata of an instance and '
+                      'an instance found by its fixed IP. Zero disables '
+                      'the cache.')),
+    cfg.IntOpt('cache_size',
+               default=1000,
+               help=_('Maximum number of cached entries in the local '
+                      'cache')),
+    cfg.ListOpt('memcached_servers',
+                help=_('Memcached servers to share the cache between '
+                       'metadata workers. The local cache is used if not '
+                       'set.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(cache_opts, group='metadata')
+
+_cache = None
+
+
+class _LocalCache(object):
+
+    def __init__(self):
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None or entry[0] <= time.time():
+            return None
+        self._entries[key] = entry
+        return entry[1]
+
+    def set(self, key, value, expiration):
+        self._entries.pop(key, None)
+        while (self._entries and
+                len(self._entries) >= CONF.metadata.cache_size):
+            self._entries.popitem(last=False)
+        self._entries[key] = (time.time() + expiration, value)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+
+class _MemcachedCache(object):
+
+    def __init__(self, servers):
+        self._client = memcache.Client(servers)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, expiration):
+        self._client.set(key, value, time=expiration)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        if CONF.metadata.memcached_servers and memcache:
+            _cache = _MemcachedCache(CONF.metadata.memcached_servers)
+        else:
+            _cache = _LocalCache()
+    return _cache
+
+
+def _make_key(kind, key):
+    return str('ec2api-metadata-%s-%s' % (kind, key))
+
+
+def get(kind, key):
+    """Return a cached value or None."""
+    if CONF.metadata.cache_expiration <= 0:
+        return None
+    return _get_cache().get(_make_key(kind, key))
+
+
+def put(kind, key, value):
+    if CONF.metadata.cache_expiration <= 0:
+        return
+    _get_cache().set(_make_key(kind, key), value,
+                     CONF.metadata.cache_expiration)
+
+
+def delete(kind, key):
+    if CONF.metadata.cache_expiration <= 0:
+        return
+    _get_cache().delete(_make_key(kind, key))
+
+
+def reset():
+    global _cache
+    _cache = None
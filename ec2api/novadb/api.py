@@ -82,7 +82,18 @@ def instance_get_by_uuid(context, uuid, columns_to_join=None):
     return IMPL.instance_get_by_uuid(context, uuid, columns_to_join)
 
 
+def instance_get_all_by_uuids(context, uuids, columns_to_join=None):
+    """Get instances by uuids as a dict keyed by uuid."""
+    return IMPL.instance_get_all_by_uuids(context, uuids, columns_to_join)
+
+
 def block_device_mapping_get_all_by_instance(context, instance_uuid):
     """Get all block device mapping belonging to an instance."""
     return IMPL.block_device_mapping_get_all_by_instance(context,
                                                          instance_uuid)
+
+
+def block_device_mapping_get_all_by_instances(context, instance_uuids):
+    """Get block device mappings of instances as a dict keyed by uuid."""
+    return IMPL.block_device_mapping_get_all_by_instances(context,
+                                                          instance_uuids)
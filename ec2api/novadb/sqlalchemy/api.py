@@ -166,6 +166,17 @@ def _instance_get_by_uuid(context, uuid, session=None,
     return result
 
 
+@require_context
+def instance_get_all_by_uuids(context, uuids, columns_to_join=None):
+    if not uuids:
+        return {}
+    result = (_build_instance_get(context,
+                                  columns_to_join=columns_to_join).
+                filter(models.Instance.uuid.in_(uuids)).
+                all())
+    return dict((instance['uuid'], instance) for instance in result)
+
+
 def _build_instance_get(context, session=None,
                         columns_to_join=None):
     query = model_query(context, models.Instance, session=session,
@@ -189,3 +200,16 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid):
     return (_block_device_mapping_get_query(context).
                  filter_by(instance_uuid=instance_uuid).
                  all())
+
+
+@require_context
+def block_device_mapping_get_all_by_instances(context, instance_uuids):
+    bdms = dict((instance_uuid, []) for instance_uuid in instance_uuids)
+    if not instance_uuids:
+        return bdms
+    for bdm in (_block_device_mapping_get_query(context).
+                    filter(models.BlockDeviceMapping.instance_uuid.in_(
+                        instance_uuids)).
+                    all()):
+        bdms[bdm['instance_uuid']].append(bdm)
+    return bdms
@@ -68,6 +68,27 @@ class ApiInitTestCase(test_base.BaseTestCase):
         self.controller.fake_action.assert_called_once_with(self.fake_context,
                                                             param='fake_param')
 
+    @mock.patch.object(apirequest, 'RESPONSE_CHUNK_PIECES', 3)
+    def test_execute_streaming(self):
+        self.environ['ec2.request'].streaming = True
+        self.controller.fake_action.return_value = {
+            'fakeSet': [{'fakeTag': 'fake_data%s' % i} for i in range(3)]}
+
+        res = self.request.send(self.application)
+
+        self.assertEqual(200, res.status_code)
+        self.assertEqual('text/xml', res.content_type)
+        self.assertIsNone(res.content_length)
+        expected_xml = fakes.XML_RESULT_TEMPLATE % {
+            'action': 'FakeAction',
+            'api_version': 'fake_v1',
+            'request_id': self.fake_context.request_id,
+            'data': ('<fakeSet>' +
+                     ''.join('<item><fakeTag>fake_data%s</fakeTag></item>' % i
+                             for i in range(3)) +
+                     '</fakeSet>')}
+        self.assertThat(res.body, matchers.XMLMatches(expected_xml))
+
     def test_execute_error(self):
         @tools.screen_all_logs
         def do_check(ex, status, code, message):
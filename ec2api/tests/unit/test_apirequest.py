@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import datetime
 import uuid
 
 from lxml import etree
@@ -105,6 +107,63 @@ class EC2RequesterTestCase(test_base.BaseTestCase):
         data = req._render_response(resp, 'uuid')
         self.assertIn('<utf8>&#40960;abcd&#1972;</utf8>', data)
 
+    def test_render_response_format(self):
+        class FakeObject(object):
+            def __init__(self):
+                self.fake_attr = 'fake'
+
+        req = apirequest.APIRequest("FakeAction", "FakeVersion", {})
+        resp = collections.OrderedDict([
+            ('item_set', [{'bool_value': True}, {'none_value': None}]),
+            ('empty_set', []),
+            ('empty_dict', {}),
+            ('empty_string', ''),
+            ('fake_object', FakeObject()),
+            ('launch_time', datetime.datetime(2011, 2, 21, 20, 14, 10)),
+            ('escaped', '<a & b>\r'),
+        ])
+        data = req._render_response(resp, 'uuid')
+        self.assertEqual(
+            '<FakeActionResponse '
+            'xmlns="http://ec2.amazonaws.com/doc/FakeVersion/">\n'
+            '  <requestId>uuid</requestId>\n'
+            '  <itemSet>\n'
+            '    <item>\n'
+            '      <boolValue>true</boolValue>\n'
+            '    </item>\n'
+            '    <item>\n'
+            '      <noneValue/>\n'
+            '    </item>\n'
+            '  </itemSet>\n'
+            '  <emptySet/>\n'
+            '  <emptyDict/>\n'
+            '  <emptyString/>\n'
+            '  <fakeObject>\n'
+            '    <fakeAttr>fake</fakeAttr>\n'
+            '  </fakeObject>\n'
+            '  <launchTime>2011-02-21T20:14:10.000Z</launchTime>\n'
+            '  <escaped>&lt;a &amp; b&gt;&#13;</escaped>\n'
+            '</FakeActionResponse>\n',
+            data)
+        self.assertIsInstance(data, str)
+
+    @mock.patch.object(apirequest, 'RESPONSE_CHUNK_PIECES', 3)
+    def test_invoke_streaming(self):
+        self.controller.fake_action.return_value = {
+            'fake_set': [{'fake_tag': 'fake_data%s' % i} for i in range(3)]}
+
+        api_request = apirequest.APIRequest('FakeAction', 'fake_v1', {},
+                                            streaming=True)
+        chunks = api_request.invoke(self.fake_context)
+
+        chunks = list(chunks)
+        self.assertEqual(4, len(chunks))
+        self.assertEqual(
+            api_request._render_response(
+                self.controller.fake_action.return_value,
+                self.fake_context.request_id),
+            ''.join(chunks))
+
     # Tests for individual data element format functions
 
     def test_return_valid_isoformat(self):
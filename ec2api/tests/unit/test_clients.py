@@ -0,0 +1,120 @@
+# Copyright 2014
+# The Cloudscaling Group, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from keystoneclient import exceptions as keystone_exception
+import mock
+from oslo_config import fixture as config_fixture
+from oslotest import base as test_base
+
+from ec2api.api import clients
+from ec2api import context
+
+
+class ClientsTestCase(test_base.BaseTestCase):
+
+    def setUp(self):
+        super(ClientsTestCase, self).setUp()
+        self.addCleanup(clients._endpoints.clear)
+
+    @mock.patch('neutronclient.v2_0.client.Client')
+    @mock.patch('novaclient.client.Client')
+    def test_reuse_clients(self, nova, neutron):
+        ctx = context.RequestContext(
+            'fake_user', 'fake_project', auth_token='fake_token',
+            service_catalog=[{'type': 'network',
+                              'endpoints': [{'publicURL': 'fake_url'}]}])
+
+        self.assertEqual(clients.nova(ctx), clients.nova(ctx))
+        self.assertEqual(1, nova.call_count)
+        nova.assert_called_with(2, project_id='fake_project',
+                                auth_url=mock.ANY, username=None,
+                                api_key=None, auth_token='fake_token',
+                                bypass_url=None, connection_pool=True)
+        clients.nova(ctx, '2.3')
+        self.assertEqual(2, nova.call_count)
+
+        self.assertEqual(clients.neutron(ctx), clients.neutron(ctx))
+        neutron.assert_called_once_with(
+            auth_url=mock.ANY, service_type='network', token='fake_token',
+            endpoint_url='fake_url')
+
+        # NOTE(ft): metadata server substitutes project_id of its context
+        ctx.project_id = 'another_project'
+        clients.nova(ctx)
+        self.assertEqual(3, nova.call_count)
+
+        another_ctx = context.RequestContext(
+            'fake_user', 'fake_project', auth_token='fake_token',
+            service_catalog=[{'type': 'fake'}])
+        nova.reset_mock()
+        clients.nova(another_ctx)
+        self.assertEqual(1, nova.call_count)
+
+    @mock.patch.object(clients, 'time')
+    @mock.patch('keystoneclient.v2_0.client.Client')
+    def test_url_for(self, keystone, time):
+        conf = self.useFixture(config_fixture.Config())
+        conf.config(endpoint_cache_time=600)
+        time.time.return_value = 1000
+        keystone.return_value.service_catalog.catalog = {
+            'serviceCatalog': [
+                {'type': 'network',
+                 'endpoints': [{'publicURL': 'http://neutron:9696'}]},
+                {'type': 'volume',
+                 'endpoints': [{'publicURL': 'http://cinder/v1/project_1'}]}]}
+
+        def get_context(project_id):
+            return context.RequestContext('fake_user', project_id,
+                                          auth_token='fake_token')
+
+        self.assertEqual(
+            'http://cinder/v1/project_1',
+            clients._url_for(get_context('project_1'), service_type='volume'))
+        self.assertEqual(1, keystone.call_count)
+
+        # NOTE(ft): all endpoints of a fetched catalog are cached
+        self.assertEqual(
+            'http://cinder/v1/project_2',
+            clients._url_for(get_context('project_2'), service_type='volume'))
+        self.assertEqual(
+            'http://neutron:9696',
+            clients._url_for(get_context('project_3'),
+                             service_type='network'))
+        self.assertEqual(1, keystone.call_count)
+
+        # NOTE(ft): the cache is read before a catalog of a context
+        ctx = context.RequestContext(
+            'fake_user', 'project_4', auth_token='fake_token',
+            service_catalog=[{'type': 'network',
+                              'endpoints': [{'publicURL': 'other_url'}]}])
+        self.assertEqual('http://neutron:9696',
+                         clients._url_for(ctx, service_type='network'))
+
+        clients.reset_endpoints()
+        self.assertEqual('other_url',
+                         clients._url_for(ctx, service_type='network'))
+        clients.reset_endpoints()
+
+        clients._url_for(get_context('project_3'), service_type='network')
+        self.assertEqual(2, keystone.call_count)
+        time.time.return_value = 2000
+        keystone.side_effect = keystone_exception.ServiceUnavailable()
+        self.assertEqual(
+            'http://neutron:9696',
+            clients._url_for(get_context('project_3'),
+                             service_type='network'))
+        self.assertEqual(3, keystone.call_count)
+        self.assertRaises(
+            keystone_exception.ServiceUnavailable,
+            clients._url_for, get_context('project_3'), service_type='image')
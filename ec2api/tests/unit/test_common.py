@@ -12,10 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import hmac
+
+import eventlet
 import mock
+from oslo_config import fixture as config_fixture
 from oslotest import base as test_base
 
 from ec2api.api import common
+from ec2api import exception
 
 
 class OnCrashCleanerTestCase(test_base.BaseTestCase):
@@ -92,6 +98,82 @@ class OnCrashCleanerTestCase(test_base.BaseTestCase):
         self.assertFalse(obj.fake_clean_method.called)
         self.assertFalse(obj.fake_clean_method_25.called)
 
+    def test_call_concurrently(self):
+        conf = self.useFixture(config_fixture.Config())
+        conf.config(os_request_concurrency=2)
+        in_progress = set()
+        max_in_progress = []
+
+        def call(arg):
+            in_progress.add(arg)
+            max_in_progress.append(len(in_progress))
+            eventlet.sleep(0)
+            in_progress.remove(arg)
+            if arg == 3:
+                raise exception.EC2Exception()
+            return arg * 10
+
+        succeeded = []
+        self.assertEqual(
+            [10, 20], common.call_concurrently(
+                call, [(1,), (2,)], on_success=succeeded.append))
+        self.assertEqual([1, 2], succeeded)
+
+        del succeeded[:]
+        self.assertRaises(
+            exception.EC2Exception, common.call_concurrently,
+            call, [(1,), (3,), (4,), (5,)], on_success=succeeded.append)
+        self.assertEqual([1, 4, 5], succeeded)
+        self.assertEqual(2, max(max_in_progress))
+
+    def test_next_token(self):
+        conf = self.useFixture(config_fixture.Config())
+        conf.config(admin_password='fake_password')
+        context = mock.Mock(project_id='fake_project')
+
+        token = common.make_next_token(context, 'vpc', 'fake_marker')
+        self.assertEqual('fake_marker',
+                         common.parse_next_token(context, 'vpc', token))
+        self.assertRaises(exception.InvalidParameterValue,
+                          common.parse_next_token, context, 'subnet', token)
+        self.assertRaises(exception.InvalidParameterValue,
+                          common.parse_next_token,
+                          mock.Mock(project_id='other_project'), 'vpc',
+                          token)
+
+        # NOTE(ft): a token signed by the project id alone is forged
+        body = token.split('.')[0]
+        forged_token = '%s.%s' % (
+            body, hmac.new(str(':fake_project'), body,
+                           hashlib.sha256).hexdigest())
+        self.assertRaises(exception.InvalidParameterValue,
+                          common.parse_next_token, context, 'vpc',
+                          forged_token)
+
+        conf.config(pagination_token_key='fake_key')
+        self.assertRaises(exception.InvalidParameterValue,
+                          common.parse_next_token, context, 'vpc', token)
+        token = common.make_next_token(context, 'vpc', 'fake_marker')
+        self.assertEqual('fake_marker',
+                         common.parse_next_token(context, 'vpc', token))
+        conf.config(admin_password='other_password')
+        self.assertEqual('fake_marker',
+                         common.parse_next_token(context, 'vpc', token))
+
+    @mock.patch.object(common, 'LOG')
+    def test_next_token_not_configured(self, log):
+        conf = self.useFixture(config_fixture.Config())
+        conf.config(admin_password=None)
+        context = mock.Mock(project_id='fake_project')
+
+        self.assertRaises(exception.Unsupported,
+                          common.make_next_token, context, 'vpc',
+                          'fake_marker')
+        self.assertRaises(exception.Unsupported,
+                          common.parse_next_token, context, 'vpc',
+                          'fake_token')
+        self.assertTrue(log.error.called)
+
     def test_filter(self):
         obj = common.UniversalDescriber()
         obj.FILTER_MAP = {'prop1': 'prop-1', 'prop2': 'prop-2'}
@@ -134,6 +216,93 @@ class OnCrashCleanerTestCase(test_base.BaseTestCase):
              {'name': 'prop2', 'value': ['val-123']}])
         self.assertTrue(res)
 
+    def test_filter_wildcards(self):
+        obj = common.UniversalDescriber()
+        obj.FILTER_MAP = {'prop1': 'prop-1', 'prop2': ['prop-2', 'key']}
+        filters = [{'name': 'prop1', 'value': ['0-val', 'val-?']},
+                   {'name': 'prop2', 'value': ['*-12[34]']}]
+
+        self.assertFalse(obj.filtered_out(
+            {'prop-1': 'val-0', 'prop-2': [{'key': 'val-123'}]}, filters))
+        self.assertTrue(obj.filtered_out(
+            {'prop-1': 'val-01', 'prop-2': [{'key': 'val-123'}]}, filters))
+        self.assertTrue(obj.filtered_out(
+            {'prop-1': 'val-0', 'prop-2': [{'key': 'val-125'}]}, filters))
+        self.assertTrue(obj.filtered_out({'prop-1': 'val-0'}, filters))
+
+        self.assertRaises(
+            exception.InvalidParameterValue,
+            obj.filtered_out, {'prop-1': 'val-0'},
+            [{'name': 'prop3', 'value': ['val-0']}])
+
+    def test_get_exact_filter_values(self):
+        obj = common.UniversalDescriber()
+        filters = [{'name': 'prop1', 'value': ['val-0', 'val-1']},
+                   {'name': 'prop1', 'value': ['val-1', 'val-2']},
+                   {'name': 'prop2', 'value': ['val-*']}]
+
+        self.assertEqual(set(['val-1']),
+                         obj.get_exact_filter_values(filters, 'prop1'))
+        self.assertIsNone(obj.get_exact_filter_values(filters, 'prop2'))
+        self.assertIsNone(obj.get_exact_filter_values(filters, 'prop3'))
+        self.assertIsNone(obj.get_exact_filter_values(None, 'prop1'))
+
+    def test_describe_dependencies(self):
+        in_progress = set()
+        max_in_progress = []
+
+        def get(name):
+            in_progress.add(name)
+            max_in_progress.append(len(in_progress))
+            eventlet.sleep(0)
+            in_progress.remove(name)
+            return name + '_value'
+
+        class FakeDescriber(common.UniversalDescriber):
+
+            def get_dependencies(self):
+                return {'dep1': lambda: get('dep1'),
+                        'dep2': lambda: get('dep2')}
+
+            def get_db_items(self):
+                return []
+
+            def get_os_items(self):
+                return [{'id': get('os_items'), 'name': 'fake'}]
+
+            def auto_update_db(self, item, os_item):
+                return item
+
+            def format(self, item, os_item):
+                return {'id': os_item['id'],
+                        'deps': (self.dep1, self.dep2)}
+
+        self.assertEqual(
+            [{'id': 'os_items_value', 'deps': ('dep1_value', 'dep2_value')}],
+            FakeDescriber().describe(mock.Mock()))
+        self.assertEqual(3, max(max_in_progress))
+
+        class FailedDescriber(FakeDescriber):
+
+            def get_os_items(self):
+                raise exception.EC2Exception()
+
+        self.assertRaises(exception.EC2Exception,
+                          FailedDescriber().describe, mock.Mock())
+        self.assertEqual(set(), in_progress)
+
+        class NoDependenciesDescriber(FakeDescriber):
+
+            def get_dependencies(self):
+                return {}
+
+            def format(self, item, os_item):
+                return {'id': os_item['id']}
+
+        self.assertEqual(
+            [{'id': 'os_items_value'}],
+            NoDependenciesDescriber().describe(mock.Mock()))
+
 
 def fake_standalone_crashed_clean_method():
     raise Exception()
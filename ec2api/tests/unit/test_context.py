@@ -12,11 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+
 import mock
 from oslo_config import cfg
 from oslo_config import fixture as config_fixture
 from oslotest import base as test_base
 
+from ec2api.api import clients
 from ec2api import context as ec2context
 
 cfg.CONF.import_opt('keystone_url', 'ec2api.api')
@@ -51,3 +54,54 @@ class ContextTestCase(test_base.BaseTestCase):
                 password=conf.admin_password,
                 tenant_name=conf.admin_tenant_name,
                 auth_url=conf.keystone_url)
+
+    @mock.patch('keystoneclient.v2_0.client.Client')
+    def test_get_os_admin_context_reuses_token(self, keystone):
+        self.addCleanup(ec2context.reset_os_admin_context)
+        self.addCleanup(clients._endpoints.clear)
+        service_catalog = mock.MagicMock()
+        service_catalog.get_data.return_value = [
+            {'type': 'network',
+             'endpoints': [{'publicURL': 'http://neutron:9696'}]},
+            {'type': 'computev21',
+             'endpoints': [{'publicURL': 'http://nova:8774/v2.1'}]}]
+        keystone.return_value = mock.Mock(auth_user_id='fake_user_id',
+                                          auth_tenant_id='fake_project_id',
+                                          auth_token='fake_token',
+                                          service_catalog=service_catalog)
+        auth_ref = keystone.return_value.auth_ref
+        auth_ref.will_expire_soon.return_value = False
+
+        # NOTE(ft): metadata server builds an admin context per request
+        for _i in range(2):
+            context = ec2context.get_os_admin_context()
+            self.assertEqual('fake_token', context.auth_token)
+            self.assertEqual(
+                'http://neutron:9696',
+                clients._url_for(context, service_type='network'))
+            self.assertEqual(
+                'http://nova:8774/v2.1',
+                clients._url_for(context, service_type='computev21'))
+        self.assertEqual(1, keystone.call_count)
+
+        auth_ref.will_expire_soon.return_value = True
+        ec2context.get_os_admin_context()
+        self.assertEqual(2, keystone.call_count)
+
+        auth_ref.will_expire_soon.return_value = False
+        ec2context.reset_os_admin_context()
+        ec2context.get_os_admin_context()
+        self.assertEqual(3, keystone.call_count)
+
+    def test_deepcopy(self):
+        context = ec2context.RequestContext('fake_user', 'fake_project',
+                                            overwrite=False)
+        nova = mock.Mock()
+        context.clients['nova'] = nova
+
+        context_copy = copy.deepcopy(context)
+        self.assertIsNot(context, context_copy)
+        self.assertEqual('fake_user', context_copy.user_id)
+        self.assertIs(nova, context_copy.clients['nova'])
+        self.assertIsNot(context.db_identity_map,
+                         context_copy.db_identity_map)
@@ -13,7 +13,9 @@
 # limitations under the License.
 
 from oslo_config import cfg
+from oslo_utils import timeutils
 from oslotest import base as test_base
+import sqlalchemy
 from sqlalchemy.orm import exc as orm_exception
 
 from ec2api.api import validator
@@ -22,6 +24,7 @@ from ec2api import context as ec2_context
 from ec2api.db import api as db_api
 from ec2api.db import migration
 from ec2api.db.sqlalchemy import api as session
+from ec2api.db.sqlalchemy import models
 from ec2api.tests.unit import fakes
 from ec2api.tests.unit import matchers
 
@@ -184,6 +187,102 @@ class DbApiTestCase(test_base.BaseTestCase):
         item = db_api.get_item_by_id(self.context, item['id'])
         self.assertIsNotNone(item)
 
+    def test_restore_item(self):
+        item = db_api.add_item(self.context, 'fake', {'key': 'val'})
+        db_api.delete_item(self.context, item['id'])
+        db_api.restore_item(self.context, 'fake', item)
+        items = db_api.get_items(self.context, 'fake')
+        self.assertThat(items, matchers.ListMatches([item]))
+
+        # NOTE(ft): restored items and their tags are stored with the kind,
+        # and they are found by the kind column rather than by id prefix
+        db_api.add_tags(self.context, [{'item_id': item['id'],
+                                        'key': 'tag', 'value': 'val'}])
+        db_session = session.get_session()
+        item_ref = (db_session.query(models.Item).
+                    filter_by(id=item['id']).one())
+        self.assertEqual('fake', item_ref.kind)
+        tag_ref = (db_session.query(models.Tag).
+                   filter_by(item_id=item['id']).one())
+        self.assertEqual('fake', tag_ref.kind)
+
+        with db_session.begin():
+            for model in (models.Item, models.Tag):
+                (db_session.query(model).
+                 filter_by(kind='fake').
+                 update({'kind': 'fake1'}, synchronize_session=False))
+        context = ec2_context.RequestContext(fakes.ID_OS_USER,
+                                             fakes.ID_OS_PROJECT)
+        self.assertEqual([], db_api.get_items(context, 'fake'))
+        self.assertEqual([item['id']],
+                         [i['id'] for i in db_api.get_items(context,
+                                                            'fake1')])
+        self.assertEqual([], db_api.get_tags(context, ('fake',)))
+        self.assertEqual([item['id']],
+                         [t['item_id'] for t in db_api.get_tags(context,
+                                                                ('fake1',))])
+
+        inspector = sqlalchemy.inspect(session.get_engine())
+        for table, index in (('items', 'items_project_id_kind_idx'),
+                             ('tags', 'tags_project_id_kind_idx')):
+            self.assertIn({'name': index,
+                           'column_names': ['project_id', 'kind'],
+                           'unique': False},
+                          inspector.get_indexes(table))
+
+    def test_add_items(self):
+        new_items = [{'os_id': fakes.random_os_id(), 'key': 'val1'},
+                     {'os_id': fakes.random_os_id(), 'key': 'val2'},
+                     {'key': 'val3'}]
+        items = db_api.add_items(self.context, 'fake', new_items)
+        self.assertEqual(3, len(items))
+        for item, new_item in zip(items, new_items):
+            self.assertTrue(validator.validate_ec2_id(item['id'], '',
+                                                      ['fake']))
+            self.assertThat(item, matchers.DictMatches(
+                dict(new_item, id=item['id'], os_id=new_item.get('os_id'),
+                     vpc_id=None)))
+        self.assertThat(db_api.get_items(self.context, 'fake'),
+                        matchers.ListMatches(items))
+        self.assertEqual([], db_api.add_items(self.context, 'fake', []))
+
+        # NOTE(ft): check merge with existing items on the same os_id
+        item = db_api.add_items(self.context, 'fake',
+                                [{'os_id': new_items[0]['os_id'],
+                                  'key1': 'val'}])[0]
+        self.assertThat(item, matchers.DictMatches(
+            dict(items[0], key1='val')))
+
+    def test_update_items(self):
+        items = db_api.add_items(self.context, 'fake',
+                                 [{'key': 'val1'}, {'key': 'val2'}])
+        other_item = db_api.add_item(self.other_context, 'fake',
+                                     {'key': 'val'})
+        items[0]['key'] = 'new_val1'
+        items[1].pop('key')
+        items[1]['key2'] = 'val'
+        db_api.update_items(self.context,
+                            items + [dict(other_item, key='new_val')])
+        self.assertThat(db_api.get_items(self.context, 'fake'),
+                        matchers.ListMatches(items))
+        self.assertThat(db_api.get_items(self.other_context, 'fake'),
+                        matchers.ListMatches([other_item]))
+
+    def test_delete_items(self):
+        items = db_api.add_items(self.context, 'fake', [{}, {}, {}])
+        other_item = db_api.add_item(self.other_context, 'fake', {})
+        db_api.add_tags(self.context, [{'item_id': items[0]['id'],
+                                        'key': 'key',
+                                        'value': 'val'}])
+        db_api.delete_items(self.context,
+                            [items[0]['id'], items[1]['id'],
+                             other_item['id'], fakes.random_ec2_id('fake')])
+        self.assertThat(db_api.get_items(self.context, 'fake'),
+                        matchers.ListMatches([items[2]]))
+        self.assertEqual([], db_api.get_tags(self.context))
+        self.assertIsNotNone(db_api.get_item_by_id(self.other_context,
+                                                   other_item['id']))
+
     def _setup_items(self):
         db_api.add_item(self.context, 'fake', {})
         db_api.add_item(self.context, 'fake', {'is_public': True})
@@ -249,28 +348,74 @@ class DbApiTestCase(test_base.BaseTestCase):
                                         (item_id, fakes.random_ec2_id('fake')))
         self.assertEqual(1, len(items))
 
+    def test_get_item_ids(self):
+        item = db_api.add_item(self.context, 'fake',
+                               {'os_id': fakes.random_os_id()})
+        db_api.add_item(self.context, 'fake',
+                        {'os_id': fakes.random_os_id()})
+
+        context = ec2_context.RequestContext(fakes.ID_OS_USER,
+                                             fakes.ID_OS_PROJECT)
+        ids = db_api.get_item_ids(context, 'fake', (item['os_id'],))
+        self.assertEqual([(item['id'], item['os_id'])], ids)
+        ids = db_api.get_item_ids(context, 'fake1', (item['os_id'],))
+        self.assertEqual([], ids)
+        ids = db_api.get_item_ids(context, 'fake', (fakes.random_os_id(),))
+        self.assertEqual([], ids)
+
     def test_get_public_items(self):
         self._setup_items()
-        items = db_api.get_public_items(self.context, 'fake')
+        items = db_api.get_public_items(self.context, ('fake',))
         self.assertEqual(2, len(items))
         public_item_ids = [i['id'] for i in items]
 
-        items = db_api.get_public_items(self.context, 'fake', public_item_ids)
+        items = db_api.get_public_items(self.context, ('fake',),
+                                        public_item_ids)
         self.assertEqual(2, len(items))
-        items = db_api.get_public_items(self.context, 'fake',
+        items = db_api.get_public_items(self.context, ('fake',),
                                         [public_item_ids[0]])
         self.assertEqual(1, len(items))
-        items = db_api.get_public_items(self.context, 'fake',
+        items = db_api.get_public_items(self.context, ('fake',),
                                         (public_item_ids[1],))
         self.assertEqual(1, len(items))
-        items = db_api.get_public_items(self.context, 'fake1',
+        items = db_api.get_public_items(self.context, ('fake1',),
                                         [public_item_ids[0]])
         self.assertEqual(0, len(items))
-        items = db_api.get_public_items(self.context, 'fake',
+        items = db_api.get_public_items(self.context, ('fake',),
                                         fakes.random_ec2_id('fake'))
         self.assertEqual(0, len(items))
-        items = db_api.get_public_items(self.context, 'fake0', [])
+        items = db_api.get_public_items(self.context, ('fake0',), [])
         self.assertEqual(0, len(items))
+        items = db_api.get_public_items(self.context, ('fake', 'fake1'))
+        self.assertEqual(3, len(items))
+
+    def test_identity_map(self):
+        identity_map = self.context.db_identity_map
+        item = db_api.add_item(self.context, 'fake', {'key': 'val'})
+        db_api.add_item(self.context, 'fake1', {})
+
+        items = db_api.get_items(self.context, 'fake')
+        self.assertEqual(0, identity_map.hits)
+        self.assertThat(db_api.get_items(self.context, 'fake'),
+                        matchers.ListMatches(items))
+        self.assertEqual(1, identity_map.hits)
+        self.assertThat(db_api.get_item_by_id(self.context, item['id']),
+                        matchers.DictMatches(item))
+        self.assertEqual(2, identity_map.hits)
+
+        # NOTE(ft): returned items must not be affected by callers
+        items[0]['key'] = 'other_val'
+        self.assertEqual(
+            'val', db_api.get_item_by_id(self.context, item['id'])['key'])
+
+        item['key'] = 'val1'
+        db_api.update_item(self.context, item)
+        self.assertThat(db_api.get_items(self.context, 'fake'),
+                        matchers.ListMatches([item]))
+        db_api.delete_item(self.context, item['id'])
+        self.assertIsNone(db_api.get_item_by_id(self.context, item['id']))
+        self.assertEqual([], db_api.get_items(self.context, 'fake'))
+        self.assertEqual(1, len(db_api.get_items(self.context, 'fake1')))
 
     def test_add_tags(self):
         item1_id = fakes.random_ec2_id('fake')
@@ -430,3 +575,50 @@ class DbApiTestCase(test_base.BaseTestCase):
         db_api.delete_tags(self.context, item_id)
         self.assertThat(db_api.get_tags(self.other_context),
                         matchers.ListMatches([tag2]))
+
+    def test_image_import_jobs(self):
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        admin_context = ec2_context.get_admin_context()
+        image_id = fakes.random_os_id()
+        job = db_api.add_image_import_job(self.context, image_id,
+                                          {'image_parts': ['part']})
+        self.assertEqual({'id': image_id,
+                          'project_id': fakes.ID_OS_PROJECT,
+                          'user_id': fakes.ID_OS_USER,
+                          'host': None,
+                          'stage': 'pending',
+                          'parts_done': 0,
+                          'attempts': 0,
+                          'updated_at': timeutils.utcnow(),
+                          'data': {'image_parts': ['part']}},
+                         job)
+
+        timeutils.advance_time_seconds(1)
+        jobs = db_api.claim_image_import_jobs(admin_context, 'host1', 2, 60)
+        self.assertEqual([image_id], [j['id'] for j in jobs])
+        self.assertEqual('host1', jobs[0]['host'])
+        self.assertEqual(1, jobs[0]['attempts'])
+        self.assertEqual([], db_api.claim_image_import_jobs(
+            admin_context, 'host2', 2, 60))
+
+        self.assertTrue(db_api.update_image_import_job(
+            admin_context, image_id, 'host1',
+            {'stage': 'downloading', 'parts_done': 1}))
+        self.assertFalse(db_api.update_image_import_job(
+            admin_context, image_id, 'host2', {'parts_done': 2}))
+
+        # NOTE(ft): a job is resumed if its host stops reporting it
+        timeutils.advance_time_seconds(61)
+        jobs = db_api.claim_image_import_jobs(admin_context, 'host2', 2, 60)
+        self.assertEqual([image_id], [j['id'] for j in jobs])
+        self.assertEqual('downloading', jobs[0]['stage'])
+        self.assertEqual(1, jobs[0]['parts_done'])
+        self.assertEqual(2, jobs[0]['attempts'])
+        self.assertFalse(db_api.update_image_import_job(
+            admin_context, image_id, 'host1'))
+
+        db_api.delete_image_import_job(admin_context, image_id)
+        timeutils.advance_time_seconds(61)
+        self.assertEqual([], db_api.claim_image_import_jobs(
+            admin_context, 'host1', 2, 60))
@@ -116,8 +116,12 @@ class DhcpOptionsTestCase(base.ApiTestCase):
             fakes.ID_EC2_DHCP_OPTIONS_1, 'dhcpOptionsId')
 
     def test_associate_dhcp_options(self):
+        # NOTE(ft): a network interface of another VPC is not updated
         self.set_mock_db_items(fakes.DB_VPC_1, fakes.DB_DHCP_OPTIONS_1,
-                               fakes.DB_NETWORK_INTERFACE_1)
+                               fakes.DB_NETWORK_INTERFACE_1,
+                               tools.update_dict(
+                                   fakes.DB_NETWORK_INTERFACE_2,
+                                   {'vpc_id': fakes.ID_EC2_VPC_2}))
         self.neutron.list_ports.return_value = (
                 {'ports': [fakes.OS_PORT_1, fakes.OS_PORT_2]})
 
@@ -135,6 +139,8 @@ class DhcpOptionsTestCase(base.ApiTestCase):
                 self.neutron.update_port,
                 fakes.ID_OS_PORT_1,
                 {'port': self._effective_os_dhcp_options(os_dhcp_options)})
+            self.assertEqual(1, self.neutron.update_port.call_count)
+            self.neutron.reset_mock()
 
         check(fakes.ID_EC2_DHCP_OPTIONS_1, fakes.ID_EC2_DHCP_OPTIONS_1,
               fakes.OS_DHCP_OPTIONS_1)
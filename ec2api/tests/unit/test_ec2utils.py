@@ -174,7 +174,7 @@ class EC2UtilsTestCase(testtools.TestCase):
             os_image,
             ec2utils.get_os_image(fake_context, fakes.ID_EC2_IMAGE_1))
         db_api.get_public_items.assert_called_with(
-            mock.ANY, 'ami', (fakes.ID_EC2_IMAGE_1,))
+            mock.ANY, ('ami',), (fakes.ID_EC2_IMAGE_1,))
         glance.images.get.assert_called_with(fakes.ID_OS_IMAGE_1)
 
         # NOTE(ft): check case of absence of an image in OS
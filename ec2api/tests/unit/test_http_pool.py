@@ -0,0 +1,117 @@
+# Copyright 2014
+# The Cloudscaling Group, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import httplib
+import StringIO
+
+import eventlet
+import mock
+from oslo_config import fixture as config_fixture
+from oslotest import base as test_base
+import requests
+from requests import cookies
+
+from ec2api import http_pool
+
+
+class HttpPoolTestCase(test_base.BaseTestCase):
+
+    def setUp(self):
+        super(HttpPoolTestCase, self).setUp()
+        self.conf = self.useFixture(config_fixture.Config())
+        http_pool.reset()
+        self.addCleanup(http_pool.reset)
+        session_patcher = mock.patch('requests.Session')
+        self.session = session_patcher.start().return_value
+        self.addCleanup(session_patcher.stop)
+
+    def test_request(self):
+        self.session.request.return_value = 'fake_response'
+
+        self.assertEqual(
+            'fake_response',
+            http_pool.request('POST', 'http://fake_host:5000/v2.0/ec2tokens',
+                              data='fake_data'))
+        http_pool.request('GET', 'http://fake_host:5000/')
+        http_pool.request('GET', 'https://another_host/')
+
+        self.session.request.assert_any_call(
+            'POST', 'http://fake_host:5000/v2.0/ec2tokens', data='fake_data')
+        self.assertEqual(2, self.session.mount.call_count)
+        self.assertEqual(
+            {'fake_host:5000': {'limit': 0, 'requests': 2, 'waits': 0,
+                                'in_use': 0, 'max_in_use': 1},
+             'another_host': {'limit': 0, 'requests': 1, 'waits': 0,
+                              'in_use': 0, 'max_in_use': 1}},
+            http_pool.get_stats())
+
+    def test_request_per_host_limit(self):
+        self.conf.config(http_pool_max_requests_per_host=1)
+        in_progress = []
+
+        def fake_request(method, url):
+            in_progress.append(url)
+            self.assertEqual(1, len(in_progress))
+            eventlet.sleep(0)
+            in_progress.remove(url)
+
+        self.session.request.side_effect = fake_request
+
+        pool = eventlet.GreenPool()
+        for _i in range(3):
+            pool.spawn(http_pool.request, 'GET', 'http://fake_host/')
+        pool.waitall()
+
+        stats = http_pool.get_stats()['fake_host']
+        self.assertEqual(3, stats['requests'])
+        self.assertEqual(2, stats['waits'])
+        self.assertEqual(1, stats['max_in_use'])
+        self.assertEqual(0, stats['in_use'])
+
+    def test_session_rejects_cookies(self):
+        with mock.patch('requests.Session', requests.sessions.Session):
+            session = http_pool._get_session()
+        request = requests.Request('GET', 'http://fake_host/').prepare()
+        response = mock.Mock()
+        response._original_response.msg = httplib.HTTPMessage(
+            StringIO.StringIO('Set-Cookie: fake_cookie=fake_value\r\n\r\n'))
+
+        cookies.extract_cookies_to_jar(session.cookies, request, response)
+        self.assertEqual(0, len(session.cookies))
+
+    @mock.patch.object(http_pool, 'LOG')
+    @mock.patch.object(http_pool, 'time')
+    def test_log_stats(self, time, log):
+        self.conf.config(http_pool_stats_interval=60)
+        time.time.return_value = 1000
+
+        http_pool.request('GET', 'http://fake_host/')
+        http_pool.request('GET', 'http://fake_host/')
+        self.assertFalse(log.info.called)
+
+        time.time.return_value = 1060
+        http_pool.request('GET', 'http://fake_host/')
+        log.info.assert_called_once_with(
+            mock.ANY, {'host': 'fake_host', 'limit': 0, 'requests': 3,
+                       'waits': 0, 'in_use': 0, 'max_in_use': 1})
+
+        log.reset_mock()
+        time.time.return_value = 1100
+        http_pool.request('GET', 'http://fake_host/')
+        self.assertFalse(log.info.called)
+
+        self.conf.config(http_pool_stats_interval=0)
+        time.time.return_value = 2000
+        http_pool.request('GET', 'http://fake_host/')
+        self.assertFalse(log.info.called)
@@ -12,14 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import copy
 import json
 import os
-import tempfile
-
+import tarfile
+
+import boto.exception
+from cryptography.hazmat import backends
+from cryptography.hazmat.primitives import ciphers
+from cryptography.hazmat.primitives.ciphers import algorithms
+from cryptography.hazmat.primitives.ciphers import modes
+from cryptography.hazmat.primitives import padding
 import eventlet
 import mock
 from oslotest import base as test_base
+import six
 
 from ec2api.api import image as image_api
 from ec2api import exception
@@ -452,8 +460,7 @@ class ImagePrivateTestCase(test_base.BaseTestCase):
             tools.get_db_api_get_items())
         db_api.get_items_by_ids.side_effect = (
             tools.get_db_api_get_items_by_ids(fakes.DB_IMAGE_1))
-        db_api.get_public_items.side_effect = [
-            [fakes.DB_IMAGE_1], [], []]
+        db_api.get_public_items.return_value = [fakes.DB_IMAGE_1]
 
         describer.ids = set([fakes.ID_EC2_IMAGE_1, fakes.ID_EC2_IMAGE_2])
         self.assertRaises(exception.InvalidAMIIDNotFound,
@@ -517,33 +524,19 @@ class S3TestCase(base.ApiTestCase):
         self.assertEqual('foo', key)
         self.assertEqual('foo', iv)
         self.db_api.get_public_items.assert_any_call(
-            mock.ANY, 'aki', (fakes.ID_EC2_IMAGE_AKI_1,))
+            mock.ANY, ('aki',), (fakes.ID_EC2_IMAGE_AKI_1,))
         self.db_api.get_public_items.assert_any_call(
-            mock.ANY, 'ari', (fakes.ID_EC2_IMAGE_ARI_1,))
+            mock.ANY, ('ari',), (fakes.ID_EC2_IMAGE_ARI_1,))
 
-    @mock.patch.object(fakes.OSImage, 'update', autospec=True)
-    def test_s3_create_image_locations(self, osimage_update):
-        self.configure(image_decryption_dir=None)
-        _handle, tempf = tempfile.mkstemp()
+    def test_s3_create_image_locations(self):
         fake_context = self._create_context()
-        with mock.patch(
-                'ec2api.api.image._s3_conn') as s3_conn, mock.patch(
-                'ec2api.api.image._s3_download_file'
-                     ) as s3_download_file, mock.patch(
-                'ec2api.api.image._s3_decrypt_image'
-                     ) as s3_decrypt_image, mock.patch(
-                'ec2api.api.image._s3_untarzip_image'
-                     ) as s3_untarzip_image:
-
-            (s3_conn.return_value.
-             get_bucket.return_value.
-             get_key.return_value.
-             get_contents_as_string.return_value) = FILE_MANIFEST_XML
-            s3_download_file.return_value = tempf
-            s3_untarzip_image.return_value = tempf
-            (self.glance.images.create.return_value) = (
-                fakes.OSImage({'id': fakes.random_os_id(),
-                               'status': 'queued'}))
+        os_image = fakes.OSImage({'id': fakes.random_os_id(),
+                                  'status': 'queued'})
+        self.glance.images.create.return_value = os_image
+        with mock.patch('ec2api.api.image._s3_conn') as s3_conn:
+            s3_key = s3_conn.return_value.get_bucket.return_value.get_key
+            s3_key.return_value.get_contents_as_string.return_value = (
+                FILE_MANIFEST_XML)
 
             data = [
                 ({'properties': {
@@ -554,26 +547,133 @@ class S3TestCase(base.ApiTestCase):
                  'testbucket_2', 'test.img.manifest.xml')]
             for mdata, bucket, manifest in data:
                 image = image_api._s3_create(fake_context, mdata)
-                eventlet.sleep()
-                osimage_update.assert_called_with(
-                    image, properties={'image_state': 'available'})
-                osimage_update.assert_any_call(
-                    image, data=mock.ANY)
+                self.assertEqual(os_image, image)
                 s3_conn.return_value.get_bucket.assert_called_with(bucket)
-                (s3_conn.return_value.get_bucket.return_value.
-                 get_key.assert_called_with(manifest))
-                (s3_conn.return_value.get_bucket.return_value.
-                 get_key.return_value.
-                 get_contents_as_string.assert_called_with())
-                s3_download_file.assert_called_with(
-                    s3_conn.return_value.get_bucket.return_value,
-                    'foo', mock.ANY)
-                s3_decrypt_image.assert_called_with(
-                    fake_context, mock.ANY, 'foo', 'foo', mock.ANY)
-                s3_untarzip_image.assert_called_with(mock.ANY, mock.ANY)
-
-    @mock.patch('ec2api.api.image.eventlet.spawn_n')
-    def test_s3_create_bdm(self, spawn_n):
+                s3_key.assert_called_with(manifest)
+                self.db_api.add_image_import_job.assert_called_with(
+                    fake_context, os_image.id,
+                    {'bucket': bucket,
+                     'image_parts': ['foo'],
+                     'encrypted_key': 'foo',
+                     'encrypted_iv': 'foo'})
+
+    @mock.patch.object(fakes.OSImage, 'update', autospec=True)
+    def test_s3_import(self, osimage_update):
+        key = os.urandom(16)
+        iv = os.urandom(16)
+        encrypted_image = _make_encrypted_image('fake_image_data', key, iv)
+        uploaded_data = []
+
+        def fake_update(image, data=None, **kwargs):
+            if data is not None:
+                uploaded_data.append(data.read())
+
+        osimage_update.side_effect = fake_update
+        fake_context = self._create_context()
+        checkpoint = mock.Mock()
+        job = {'id': fakes.random_os_id(),
+               'data': {'bucket': 'testbucket',
+                        'image_parts': ['foo'],
+                        'encrypted_key': 'foo',
+                        'encrypted_iv': 'foo'}}
+        os_image = fakes.OSImage({'id': job['id'], 'status': 'queued'})
+        self.glance.images.get.return_value = os_image
+        with mock.patch(
+                'ec2api.api.image._s3_conn') as s3_conn, mock.patch(
+                'ec2api.api.image._s3_decrypt_key'
+                     ) as s3_decrypt_key:
+
+            s3_key = s3_conn.return_value.get_bucket.return_value.get_key
+            part_get = s3_key.return_value.get_contents_as_string
+            part_get.return_value = encrypted_image
+            s3_decrypt_key.return_value = (key, iv)
+
+            image_api._s3_import(fake_context, job, checkpoint)
+            osimage_update.assert_called_with(
+                os_image, properties={'image_state': 'available'})
+            self.assertEqual(['fake_image_data'], uploaded_data)
+            self.glance.images.get.assert_called_once_with(job['id'])
+            s3_conn.return_value.get_bucket.assert_called_with('testbucket')
+            s3_key.assert_called_with('foo')
+            s3_decrypt_key.assert_called_with(fake_context, 'foo', 'foo')
+            self.assertEqual([mock.call('decrypting', 0),
+                              mock.call('downloading', 0),
+                              mock.call('downloading', 1),
+                              mock.call('available', 0)],
+                             checkpoint.mock_calls)
+
+            # NOTE(ft): check a failed stage is reported
+            self.configure(s3_download_retries=0)
+            part_get.side_effect = Exception()
+            image_api._s3_import(fake_context, job, checkpoint)
+            osimage_update.assert_called_with(
+                os_image, properties={'image_state': 'failed_download'})
+            checkpoint.assert_called_with('failed_download', 0)
+
+            part_get.side_effect = None
+            part_get.return_value = encrypted_image[:-1]
+            image_api._s3_import(fake_context, job, checkpoint)
+            osimage_update.assert_called_with(
+                os_image, properties={'image_state': 'failed_decrypt'})
+
+            part_get.return_value = encrypted_image
+
+            def fail_upload(image, data=None, **kwargs):
+                if data is not None:
+                    raise Exception()
+
+            osimage_update.side_effect = fail_upload
+            image_api._s3_import(fake_context, job, checkpoint)
+            osimage_update.assert_called_with(
+                os_image, properties={'image_state': 'failed_upload'})
+
+            # NOTE(ft): check an import is aborted without a failure state
+            # if the job is claimed by another importer
+            osimage_update.side_effect = fake_update
+            osimage_update.reset_mock()
+
+            lost = []
+
+            def lose_job(stage, parts_done):
+                if lost or parts_done:
+                    lost.append(stage)
+                    raise ValueError()
+
+            checkpoint.side_effect = lose_job
+            self.assertRaises(ValueError, image_api._s3_import,
+                              fake_context, job, checkpoint)
+            self.assertEqual(
+                [mock.call(os_image, properties={'image_state': 'decrypting'}),
+                 mock.call(os_image,
+                           properties={'image_state': 'downloading'})],
+                osimage_update.mock_calls)
+            checkpoint.side_effect = None
+
+            # NOTE(ft): check a resumed job of an uploaded image
+            osimage_update.reset_mock()
+            os_image.status = 'active'
+            image_api._s3_import(fake_context, job, checkpoint)
+            osimage_update.assert_called_once_with(
+                os_image, properties={'image_state': 'available'})
+
+    @mock.patch.object(fakes.OSImage, 'update', autospec=True)
+    def test_s3_abandon_import(self, osimage_update):
+        fake_context = self._create_context()
+        job = {'id': fakes.random_os_id(), 'stage': 'downloading'}
+        os_image = fakes.OSImage({'id': job['id'], 'status': 'saving'})
+        self.glance.images.get.return_value = os_image
+
+        image_api._s3_abandon_import(fake_context, job)
+        osimage_update.assert_called_once_with(
+            os_image, properties={'image_state': 'failed_download'})
+
+        osimage_update.reset_mock()
+        job['stage'] = 'decrypting'
+        image_api._s3_abandon_import(fake_context, job)
+        osimage_update.assert_called_once_with(
+            os_image, properties={'image_state': 'failed_decrypt'})
+
+    def test_s3_create_bdm(self):
         metadata = {'properties': {
                         'image_location': 'fake_bucket/fake_manifest',
                         'root_device_name': '/dev/sda1',
@@ -612,11 +712,73 @@ class S3TestCase(base.ApiTestCase):
                             'image_location': 'fake_bucket/fake_manifest'})
 
     def test_s3_malicious_tarballs(self):
-        self.assertRaises(
-            exception.Invalid,
-            image_api._s3_test_for_malicious_tarball,
-            "/unused", os.path.join(os.path.dirname(__file__), 'abs.tar.gz'))
-        self.assertRaises(
-            exception.Invalid,
-            image_api._s3_test_for_malicious_tarball,
-            "/unused", os.path.join(os.path.dirname(__file__), 'rel.tar.gz'))
+        for name in ('abs.tar.gz', 'rel.tar.gz'):
+            with open(os.path.join(os.path.dirname(__file__), name)) as f:
+                tar_file = tarfile.open(fileobj=f, mode='r|gz')
+                self.assertRaises(exception.Invalid,
+                                  image_api._s3_untarzip_image, tar_file)
+
+    @mock.patch.object(image_api, 'time')
+    def test_s3_parts_stream(self, time):
+        self.configure(s3_download_workers=3, s3_download_retries=1,
+                       s3_download_retry_interval=0.5)
+        in_progress = []
+        max_in_progress = []
+        attempts = collections.Counter()
+
+        class FakeKey(object):
+
+            def __init__(self, name):
+                self.name = name
+
+            def get_contents_as_string(self):
+                attempts[self.name] += 1
+                in_progress.append(self.name)
+                max_in_progress.append(len(in_progress))
+                # NOTE(ft): later parts are downloaded faster
+                for _i in range(10 - int(self.name)):
+                    eventlet.sleep()
+                in_progress.remove(self.name)
+                if self.name == '2' and attempts[self.name] == 1:
+                    raise boto.exception.S3ResponseError(500, 'fake_reason')
+                return self.name * 3
+
+        bucket = mock.Mock()
+        bucket.get_key.side_effect = FakeKey
+        part_names = [str(i) for i in range(10)]
+        stream = image_api._S3PartsStream(bucket, part_names)
+        self.assertEqual('00', stream.read(2))
+        self.assertEqual('0', stream.read(2))
+        self.assertEqual(''.join(name * 3 for name in part_names[1:]),
+                         stream.read())
+        self.assertEqual('', stream.read(2))
+        self.assertFalse(stream.failed)
+        self.assertEqual(3, max(max_in_progress))
+        self.assertEqual(2, attempts['2'])
+        self.assertEqual(11, sum(attempts.values()))
+        time.sleep.assert_called_once_with(0.5)
+
+        self.configure(s3_download_retries=2)
+        time.reset_mock()
+        bucket = mock.Mock()
+        bucket.get_key.side_effect = boto.exception.S3ResponseError(
+            404, 'fake_reason')
+        stream = image_api._S3PartsStream(bucket, ['1'])
+        self.assertRaises(boto.exception.S3ResponseError, stream.read, 2)
+        self.assertTrue(stream.failed)
+        self.assertEqual(3, bucket.get_key.call_count)
+        self.assertEqual([mock.call(0.5), mock.call(1.0)],
+                         time.sleep.mock_calls)
+
+
+def _make_encrypted_image(image_data, key, iv):
+    tar_data = six.StringIO()
+    with tarfile.open(fileobj=tar_data, mode='w:gz') as tar_file:
+        tar_info = tarfile.TarInfo('image')
+        tar_info.size = len(image_data)
+        tar_file.addfile(tar_info, six.StringIO(image_data))
+    padder = padding.PKCS7(algorithms.AES.block_size).padder()
+    encryptor = ciphers.Cipher(algorithms.AES(key), modes.CBC(iv),
+                               backend=backends.default_backend()).encryptor()
+    padded_data = padder.update(tar_data.getvalue()) + padder.finalize()
+    return encryptor.update(padded_data) + encryptor.finalize()
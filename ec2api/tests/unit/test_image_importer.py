@@ -0,0 +1,126 @@
+# Copyright 2014
+# The Cloudscaling Group, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+from oslo_config import fixture as config_fixture
+from oslotest import base as test_base
+
+from ec2api import image_importer
+from ec2api.tests.unit import fakes
+
+
+class ImageImporterTestCase(test_base.BaseTestCase):
+
+    def setUp(self):
+        super(ImageImporterTestCase, self).setUp()
+        conf = self.useFixture(config_fixture.Config())
+        conf.config(image_importer_host='fake_host',
+                    image_importer_max_imports=2)
+        db_api_patcher = mock.patch('ec2api.image_importer.db_api')
+        self.db_api = db_api_patcher.start()
+        self.addCleanup(db_api_patcher.stop)
+        s3_import_patcher = mock.patch(
+            'ec2api.image_importer.image_api._s3_import')
+        self.s3_import = s3_import_patcher.start()
+        self.addCleanup(s3_import_patcher.stop)
+        os_context_patcher = mock.patch(
+            'ec2api.context.get_os_admin_context')
+        self.os_context = os_context_patcher.start().return_value
+        self.addCleanup(os_context_patcher.stop)
+
+        self.importer = image_importer.ImageImporter()
+        self.importer.tg = mock.Mock()
+        self.importer.tg.add_thread.side_effect = (
+            lambda func, *args: func(*args))
+
+    def test_poll_jobs(self):
+        job = {'id': fakes.random_os_id(),
+               'project_id': fakes.ID_OS_PROJECT,
+               'user_id': fakes.ID_OS_USER,
+               'attempts': 1,
+               'data': {}}
+        self.db_api.claim_image_import_jobs.return_value = [job]
+
+        def do_import(context, job, checkpoint):
+            self.assertEqual(fakes.ID_OS_USER, context.user_id)
+            self.assertEqual(fakes.ID_OS_PROJECT, context.project_id)
+            checkpoint('downloading', 1)
+
+        self.s3_import.side_effect = do_import
+        self.importer._job_ids.add('running_job')
+
+        self.importer._poll_jobs()
+        self.db_api.update_image_import_job.assert_any_call(
+            mock.ANY, 'running_job', 'fake_host')
+        self.db_api.claim_image_import_jobs.assert_called_once_with(
+            mock.ANY, 'fake_host', 1, 120)
+        self.s3_import.assert_called_once_with(self.os_context, job,
+                                               mock.ANY)
+        self.db_api.update_image_import_job.assert_any_call(
+            mock.ANY, job['id'], 'fake_host',
+            {'stage': 'downloading', 'parts_done': 1})
+        self.db_api.delete_image_import_job.assert_called_once_with(
+            mock.ANY, job['id'])
+        self.assertEqual(set(['running_job']), self.importer._job_ids)
+
+        # NOTE(ft): the job is kept to be resumed after a failure
+        self.db_api.reset_mock()
+        self.s3_import.side_effect = Exception()
+        self.importer._poll_jobs()
+        self.assertFalse(self.db_api.delete_image_import_job.called)
+        self.assertEqual(set(['running_job']), self.importer._job_ids)
+
+        # NOTE(ft): no jobs are claimed if the host is busy
+        self.db_api.reset_mock()
+        self.importer._job_ids.add('another_running_job')
+        self.importer._poll_jobs()
+        self.assertFalse(self.db_api.claim_image_import_jobs.called)
+        self.assertEqual(2, self.db_api.update_image_import_job.call_count)
+
+        self.importer.tg.reset_mock()
+        self.db_api.claim_image_import_jobs.side_effect = Exception()
+        self.importer._job_ids.clear()
+        self.importer._poll_jobs()
+        self.assertFalse(self.importer.tg.add_thread.called)
+
+    def test_stop(self):
+        self.importer._job_ids.add('running_job')
+        self.importer.stop()
+        self.db_api.update_image_import_job.assert_called_once_with(
+            mock.ANY, 'running_job', 'fake_host', {'host': None})
+
+    @mock.patch('ec2api.image_importer.image_api._s3_abandon_import')
+    def test_import_image(self, s3_abandon_import):
+        job = {'id': fakes.random_os_id(),
+               'project_id': fakes.ID_OS_PROJECT,
+               'user_id': fakes.ID_OS_USER,
+               'stage': 'downloading',
+               'attempts': 1,
+               'data': {}}
+
+        # NOTE(ft): the import is aborted if another host claimed the job
+        self.db_api.update_image_import_job.return_value = False
+        self.s3_import.side_effect = (
+            lambda context, job, checkpoint: checkpoint('downloading', 1))
+        self.importer._import_image(job)
+        self.assertFalse(self.db_api.delete_image_import_job.called)
+
+        # NOTE(ft): a job is abandoned after all attempts
+        self.s3_import.reset_mock()
+        job['attempts'] = 6
+        self.importer._import_image(job)
+        self.assertFalse(self.s3_import.called)
+        s3_abandon_import.assert_called_once_with(self.os_context, job)
+        self.db_api.delete_image_import_job.assert_called_once_with(
+            mock.ANY, job['id'])
@@ -50,6 +50,16 @@ class InstanceTestCase(base.ApiTestCase):
         novadb_patcher = (mock.patch('ec2api.api.instance.novadb'))
         self.novadb = novadb_patcher.start()
         self.addCleanup(novadb_patcher.stop)
+        # NOTE(ft): tests set up per instance novadb fakes,
+        # bulk accessors return them as well
+        self.novadb.instance_get_all_by_uuids.side_effect = (
+            lambda context, uuids: dict(
+                (uuid, self.novadb.instance_get_by_uuid(context, uuid))
+                for uuid in uuids))
+        bdm_getter = self.novadb.block_device_mapping_get_all_by_instance
+        self.novadb.block_device_mapping_get_all_by_instances.side_effect = (
+            lambda context, uuids: dict(
+                (uuid, bdm_getter(context, uuid)) for uuid in uuids))
 
         format_security_groups_ids_names = (
             self.security_group_api.format_security_groups_ids_names)
@@ -73,10 +83,10 @@ class InstanceTestCase(base.ApiTestCase):
             fakes.DB_SUBNET_1, fakes.DB_NETWORK_INTERFACE_1, fakes.DB_IMAGE_1,
             fakes.DB_IMAGE_ARI_1, fakes.DB_IMAGE_AKI_1)
         self.glance.images.get.return_value = fakes.OSImage(fakes.OS_IMAGE_1)
-        self.network_interface_api.create_network_interface.return_value = (
-            {'networkInterface': fakes.EC2_NETWORK_INTERFACE_1})
+        self.network_interface_api._create_network_interfaces.return_value = (
+            [(fakes.DB_NETWORK_INTERFACE_1, fakes.OS_PORT_1)])
 
-        self.db_api.add_item.return_value = fakes.DB_INSTANCE_1
+        self.db_api.add_items.return_value = [fakes.DB_INSTANCE_1]
         self.nova.servers.create.return_value = (
             fakes.OSInstance(
                 fakes.ID_OS_INSTANCE_1, {'id': 'fakeFlavorId'},
@@ -122,8 +132,8 @@ class InstanceTestCase(base.ApiTestCase):
             self.assertThat(resp, matchers.DictMatches(expected_reservation))
             if create_network_interface_kwargs is not None:
                 (self.network_interface_api.
-                 create_network_interface.assert_called_once_with(
-                     mock.ANY, fakes.ID_EC2_SUBNET_1,
+                 _create_network_interfaces.assert_called_once_with(
+                     mock.ANY, mock.ANY, 1, fakes.ID_EC2_SUBNET_1,
                      **create_network_interface_kwargs))
             self.nova.servers.create.assert_called_once_with(
                 '%s-%s' % (fakes.ID_EC2_RESERVATION_1, 0),
@@ -135,13 +145,16 @@ class InstanceTestCase(base.ApiTestCase):
                 security_groups=None,
                 nics=[{'port-id': fakes.ID_OS_PORT_1}],
                 key_name=None, userdata=None)
-            self.db_api.add_item.assert_called_once_with(
-                mock.ANY, 'i', tools.purge_dict(fakes.DB_INSTANCE_1, ('id',)))
+            self.db_api.add_items.assert_called_once_with(
+                mock.ANY, 'i',
+                [tools.purge_dict(fakes.DB_INSTANCE_1, ('id',))])
             (self.network_interface_api.
-             _attach_network_interface_item.assert_called_once_with(
-                 mock.ANY, fakes.DB_NETWORK_INTERFACE_1,
+             _set_network_interface_attachment.assert_called_once_with(
+                 fakes.DB_NETWORK_INTERFACE_1,
                  fakes.ID_EC2_INSTANCE_1, 0,
                  delete_on_termination=delete_port_on_termination))
+            self.db_api.update_items.assert_called_once_with(
+                mock.ANY, [fakes.DB_NETWORK_INTERFACE_1])
             self.novadb.instance_get_by_uuid.assert_called_once_with(
                 mock.ANY, fakes.ID_OS_INSTANCE_1)
             get_ec2_network_interfaces.assert_called_once_with(
@@ -232,15 +245,17 @@ class InstanceTestCase(base.ApiTestCase):
         self.set_mock_db_items(
             fakes.DB_IMAGE_1, fakes.DB_SUBNET_1, fakes.DB_SUBNET_2,
             *self.DB_DETACHED_ENIS)
-        self.network_interface_api.create_network_interface.side_effect = (
-            [{'networkInterface': eni}
-             for eni in self.EC2_DETACHED_ENIS])
+        # NOTE(ft): ports of a subnet are created by one call for both
+        # instances
+        self.network_interface_api._create_network_interfaces.side_effect = [
+            [(eni, None) for eni in self.DB_DETACHED_ENIS[subnet_index::2]]
+            for subnet_index in range(2)]
         self.nova.servers.create.side_effect = [
             fakes.OSInstance(os_instance_id, {'id': 'fakeFlavorId'})
             for os_instance_id in self.IDS_OS_INSTANCE]
         self.novadb.instance_get_by_uuid.side_effect = self.NOVADB_INSTANCES
         self.utils_generate_uid.return_value = fakes.ID_EC2_RESERVATION_1
-        self.db_api.add_item.side_effect = self.DB_INSTANCES
+        self.db_api.add_items.return_value = self.DB_INSTANCES
 
         resp = self.execute(
             'RunInstances',
@@ -257,9 +272,10 @@ class InstanceTestCase(base.ApiTestCase):
         self.assertThat(resp, matchers.DictMatches(ec2_reservation),
                         verbose=True)
 
-        self.network_interface_api.create_network_interface.assert_has_calls([
-            mock.call(mock.ANY, ec2_subnet_id)
-            for ec2_subnet_id in self.IDS_EC2_SUBNET_BY_PORT])
+        (self.network_interface_api._create_network_interfaces.
+         assert_has_calls([
+             mock.call(mock.ANY, mock.ANY, 2, ec2_subnet_id)
+             for ec2_subnet_id in self.IDS_EC2_SUBNET]))
         self.nova.servers.create.assert_has_calls([
             mock.call(
                 '%s-%s' % (fakes.ID_EC2_RESERVATION_1, launch_index),
@@ -275,8 +291,8 @@ class InstanceTestCase(base.ApiTestCase):
             for launch_index, port_ids in enumerate(
                                         zip(*[iter(self.IDS_OS_PORT)] * 2))])
         (self.network_interface_api.
-         _attach_network_interface_item.assert_has_calls([
-             mock.call(mock.ANY, eni, ec2_instance_id, dev_ind,
+         _set_network_interface_attachment.assert_has_calls([
+             mock.call(eni, ec2_instance_id, dev_ind,
                        delete_on_termination=dot)
              for eni, ec2_instance_id, dev_ind, dot in zip(
                  self.DB_DETACHED_ENIS,
@@ -284,9 +300,12 @@ class InstanceTestCase(base.ApiTestCase):
                                       self.IDS_EC2_INSTANCE)),
                  [0, 1] * 2,
                  [True, False, True, False])]))
-        self.db_api.add_item.assert_has_calls([
-            mock.call(mock.ANY, 'i', tools.purge_dict(db_instance, ['id']))
-            for db_instance in self.DB_INSTANCES])
+        self.db_api.add_items.assert_called_once_with(
+            mock.ANY, 'i',
+            [tools.purge_dict(db_instance, ['id'])
+             for db_instance in self.DB_INSTANCES])
+        self.db_api.update_items.assert_called_once_with(
+            mock.ANY, self.DB_DETACHED_ENIS)
 
     @mock.patch('ec2api.api.instance._parse_block_device_mapping')
     @mock.patch('ec2api.api.instance._format_reservation')
@@ -305,6 +324,7 @@ class InstanceTestCase(base.ApiTestCase):
         get_ec2_classic_os_network.return_value = {'id': fakes.random_os_id()}
         format_reservation.return_value = {}
         parse_block_device_mapping.return_value = 'fake_bdm'
+        self.novadb.instance_get_by_uuid.return_value = {'launch_index': 0}
 
         def do_check(engine, extra_kwargs={}, extra_db_instance={}):
             instance_api.instance_engine = engine
@@ -337,8 +357,8 @@ class InstanceTestCase(base.ApiTestCase):
                            'launch_index': 0,
                            'client_token': 'fake_client_token'}
             db_instance.update(extra_db_instance)
-            self.db_api.add_item.assert_called_once_with(
-                mock.ANY, 'i', db_instance)
+            self.db_api.add_items.assert_called_once_with(
+                mock.ANY, 'i', [db_instance])
             self.db_api.reset_mock()
             parse_block_device_mapping.assert_called_once_with(
                 mock.ANY,
@@ -460,9 +480,10 @@ class InstanceTestCase(base.ApiTestCase):
                                fakes.DB_NETWORK_INTERFACE_1)
         self.glance.images.get.return_value = fakes.OSImage(fakes.OS_IMAGE_1)
 
-        self.network_interface_api.create_network_interface.return_value = (
-            {'networkInterface': fakes.EC2_NETWORK_INTERFACE_1})
-        self.db_api.add_item.return_value = fakes.DB_INSTANCE_1
+        self.network_interface_api._create_network_interfaces.side_effect = (
+            self._fake_create_network_interfaces(
+                [fakes.DB_NETWORK_INTERFACE_1]))
+        self.db_api.add_items.return_value = [fakes.DB_INSTANCE_1]
         self.utils_generate_uid.return_value = fakes.ID_EC2_RESERVATION_1
         self.nova.servers.create.return_value = (
             fakes.OSInstance(fakes.ID_OS_INSTANCE_1, {'id': 'fakeFlavorId'},
@@ -497,12 +518,10 @@ class InstanceTestCase(base.ApiTestCase):
                 mock.call.nova_servers.delete(fakes.ID_OS_INSTANCE_1))
             if new_port:
                 calls.append(
-                    mock.call.network_interface_api.delete_network_interface(
-                        mock.ANY,
-                        network_interface_id=fakes.ID_EC2_NETWORK_INTERFACE_1))
+                    mock.call.neutron.delete_port(fakes.ID_OS_PORT_1))
             mock_manager.assert_has_calls(calls)
-            self.db_api.delete_item.assert_called_once_with(
-                mock.ANY, fakes.ID_EC2_INSTANCE_1)
+            self.db_api.delete_items.assert_called_once_with(
+                mock.ANY, [fakes.ID_EC2_INSTANCE_1])
 
             self.network_interface_api.reset_mock()
             self.neutron.reset_mock()
@@ -548,10 +567,11 @@ class InstanceTestCase(base.ApiTestCase):
         def do_check(engine):
             instance_api.instance_engine = engine
 
-            self.network_interface_api.create_network_interface.side_effect = [
-                {'networkInterface': {'networkInterfaceId': eni['id']}}
-                for eni in network_interfaces]
-            self.db_api.add_item.side_effect = instances
+            (self.network_interface_api._create_network_interfaces.
+             side_effect) = self._fake_create_network_interfaces(
+                network_interfaces)
+            self.db_api.add_items.side_effect = [instances[:2],
+                                                 instances[2:]]
             self.nova.servers.create.side_effect = os_instances
             self.novadb.instance_get_by_uuid.side_effect = [
                 {}, {}, Exception()]
@@ -576,8 +596,8 @@ class InstanceTestCase(base.ApiTestCase):
 
             self.nova.servers.delete.assert_called_once_with(
                 instances[2]['os_id'])
-            self.db_api.delete_item.assert_called_once_with(
-                mock.ANY, instances[2]['id'])
+            self.db_api.delete_items.assert_called_once_with(
+                mock.ANY, [instances[2]['id']])
 
             self.nova.servers.reset_mock()
             self.db_api.reset_mock()
@@ -586,12 +606,124 @@ class InstanceTestCase(base.ApiTestCase):
             do_check(instance_api.InstanceEngineNeutron())
             (self.network_interface_api._detach_network_interface_item.
              assert_called_once_with(mock.ANY, network_interfaces[2]))
-            (self.network_interface_api.delete_network_interface.
-             assert_called_once_with(
-                 mock.ANY, network_interface_id=network_interfaces[2]['id']))
+            self.neutron.delete_port.assert_called_once_with(
+                network_interfaces[2]['os_id'])
 
-        with tools.ScreeningLogger(log_name='ec2api.api'):
-            do_check(instance_api.InstanceEngineNova())
+    @mock.patch('ec2api.api.instance._format_reservation')
+    @mock.patch('ec2api.api.instance.InstanceEngineNeutron.'
+                'get_ec2_classic_os_network')
+    def test_run_instances_in_bulk(self, get_ec2_classic_os_network,
+                                   format_reservation):
+        instances = [{'id': fakes.random_ec2_id('i'),
+                      'os_id': fakes.random_os_id()}
+                     for dummy in range(3)]
+        os_instances = [fakes.OSInstance(inst['os_id'])
+                        for inst in instances]
+        novadb_instances = dict(
+            (os_instance.id, {'launch_index': launch_index,
+                              'reservation_id': 'fake_os_reservation'})
+            for launch_index, os_instance in enumerate(os_instances))
+
+        self.set_mock_db_items(fakes.DB_IMAGE_1)
+        self.glance.images.get.return_value = fakes.OSImage(fakes.OS_IMAGE_1)
+        self.utils_generate_uid.return_value = fakes.ID_EC2_RESERVATION_1
+        get_ec2_classic_os_network.return_value = {'id': fakes.random_os_id()}
+        get_novadb_instance = (
+            lambda context, uuid: novadb_instances[uuid])
+        self.novadb.instance_get_by_uuid.side_effect = get_novadb_instance
+        format_reservation.return_value = {}
+
+        def do_check(engine, extra_kwargs={}, extra_db_instance={}):
+            instance_api.instance_engine = engine
+            self.nova.servers.create.return_value = os_instances[0]
+            # NOTE(ft): Nova lists instances in an arbitrary order
+            self.nova.servers.list.return_value = [
+                os_instances[2], os_instances[0], os_instances[1]]
+            self.db_api.add_items.return_value = instances
+
+            self.execute('RunInstances',
+                         {'ImageId': fakes.ID_EC2_IMAGE_1,
+                          'InstanceType': 'fake_flavor',
+                          'MinCount': '2', 'MaxCount': '3',
+                          'ClientToken': 'fake_client_token'})
+
+            self.nova.servers.create.assert_called_once_with(
+                fakes.ID_EC2_RESERVATION_1, fakes.ID_OS_IMAGE_1,
+                self.fake_flavor, min_count=2, max_count=3,
+                kernel_id=None, ramdisk_id=None, availability_zone=None,
+                block_device_mapping={}, security_groups=None,
+                key_name=None, userdata=None, **extra_kwargs)
+            self.nova.servers.list.assert_called_once_with(
+                search_opts={'reservation_id': 'fake_os_reservation'})
+            db_instances = []
+            for launch_index, inst in enumerate(instances):
+                db_instance = {'os_id': inst['os_id'],
+                               'reservation_id': fakes.ID_EC2_RESERVATION_1,
+                               'launch_index': launch_index,
+                               'client_token': 'fake_client_token'}
+                db_instance.update(extra_db_instance)
+                db_instances.append(db_instance)
+            self.db_api.add_items.assert_called_once_with(
+                mock.ANY, 'i', db_instances)
+            self.assertEqual(
+                [mock.call(os_instance, name=inst['id'])
+                 for os_instance, inst in zip(os_instances, instances)],
+                self.nova.servers.update.mock_calls)
+            format_reservation.assert_called_once_with(
+                mock.ANY, fakes.ID_EC2_RESERVATION_1,
+                [(inst, os_instance, novadb_instances[os_instance.id])
+                 for inst, os_instance in zip(instances, os_instances)],
+                {}, image_ids={fakes.ID_OS_IMAGE_1: fakes.ID_EC2_IMAGE_1})
+
+            # NOTE(ft): all launched instances are rolled back together
+            self.nova.servers.reset_mock()
+            self.db_api.reset_mock()
+            format_reservation.reset_mock()
+            self.db_api.add_items.side_effect = Exception()
+
+            with tools.ScreeningLogger(log_name='ec2api.api'):
+                self.assert_execution_error(
+                    self.ANY_EXECUTE_ERROR, 'RunInstances',
+                    {'ImageId': fakes.ID_EC2_IMAGE_1,
+                     'InstanceType': 'fake_flavor',
+                     'MinCount': '2', 'MaxCount': '3'})
+            self.nova.servers.delete.assert_has_calls(
+                [mock.call(inst['os_id']) for inst in instances],
+                any_order=True)
+            self.assertEqual(3, self.nova.servers.delete.call_count)
+
+            # NOTE(ft): instances which are not found yet are deleted too
+            self.nova.servers.reset_mock()
+            self.db_api.reset_mock()
+            self.db_api.add_items.side_effect = None
+            self.novadb.instance_get_by_uuid.side_effect = Exception()
+
+            with tools.ScreeningLogger(log_name='ec2api.api'):
+                self.assert_execution_error(
+                    self.ANY_EXECUTE_ERROR, 'RunInstances',
+                    {'ImageId': fakes.ID_EC2_IMAGE_1,
+                     'InstanceType': 'fake_flavor',
+                     'MinCount': '2', 'MaxCount': '3'})
+            self.nova.servers.list.assert_called_once_with(
+                search_opts={'name': '^%s' % fakes.ID_EC2_RESERVATION_1})
+            self.nova.servers.delete.assert_has_calls(
+                [mock.call(inst['os_id']) for inst in instances],
+                any_order=True)
+            self.assertEqual(3, self.nova.servers.delete.call_count)
+            self.assertFalse(self.db_api.add_items.called)
+
+            self.nova.servers.reset_mock()
+            self.db_api.reset_mock()
+            self.novadb.instance_get_by_uuid.side_effect = get_novadb_instance
+
+        do_check(
+            instance_api.InstanceEngineNeutron(),
+            extra_kwargs={
+                'nics': [
+                    {'net-id': get_ec2_classic_os_network.return_value['id']}],
+            },
+            extra_db_instance={'vpc_id': None})
+        do_check(instance_api.InstanceEngineNova())
 
     def test_run_instances_invalid_parameters(self):
         self.assert_execution_error('InvalidParameterValue', 'RunInstances',
@@ -649,7 +781,7 @@ class InstanceTestCase(base.ApiTestCase):
         self.nova.servers.get.assert_any_call(fakes.ID_OS_INSTANCE_2)
         self.assertEqual(
             0, self.address_api.dissassociate_address_item.call_count)
-        self.assertFalse(self.db_api.delete_item.called)
+        self.assertFalse(self.db_api.delete_items.called)
         self.assertEqual(2, os_instance_delete.call_count)
         self.assertEqual(2, os_instance_get.call_count)
         for call_num, inst_id in enumerate([fakes.OS_INSTANCE_1,
@@ -694,10 +826,10 @@ class InstanceTestCase(base.ApiTestCase):
                 detach_network_interface.assert_any_call(
                     mock.ANY,
                     ('eni-attach-%s' % ec2_eni['id'].split('-')[-1]))
-            self.assertFalse(self.db_api.delete_item.called)
+            self.assertFalse(self.db_api.delete_items.called)
 
             detach_network_interface.reset_mock()
-            self.db_api.delete_item.reset_mock()
+            self.db_api.delete_items.reset_mock()
 
         # NOTE(ft): 2 instances; the first has 2 correct ports;
         # the second has the first port attached by EC2 API but later detached
@@ -844,6 +976,34 @@ class InstanceTestCase(base.ApiTestCase):
             mock.ANY, set([fakes.ID_EC2_INSTANCE_1]))
         (self.network_interface_api.describe_network_interfaces.
          assert_called_with(mock.ANY))
+        self.assertEqual(2, self.cinder.volumes.list.call_count)
+
+        self.nova.servers.list.reset_mock()
+        self.novadb.instance_get_all_by_uuids.reset_mock()
+        resp = self.execute('DescribeInstances',
+                            {'Filter.1.Name': 'instance-id',
+                             'Filter.1.Value.1': fakes.ID_EC2_INSTANCE_2})
+        self.assertThat(resp, matchers.DictMatches(
+            {'reservationSet': [fakes.EC2_RESERVATION_2]},
+            orderless_lists=True))
+        self.nova.servers.list.assert_called_once_with(
+            search_opts={'all_tenants': mock.ANY,
+                         'project_id': fakes.ID_OS_PROJECT})
+        self.novadb.instance_get_all_by_uuids.assert_called_once_with(
+            mock.ANY, [fakes.ID_OS_INSTANCE_1, fakes.ID_OS_INSTANCE_2])
+
+        describer = instance_api.InstanceDescriber()
+        describer.context = self._create_context()
+        describer.items = [fakes.DB_INSTANCE_1, fakes.DB_INSTANCE_2]
+        filters = [{'name': 'instance-id',
+                    'value': [fakes.ID_EC2_INSTANCE_2]},
+                   {'name': 'availability-zone',
+                    'value': ['fake_zone']}]
+        self.assertEqual({}, describer.get_os_filters(filters))
+        describer.context.is_os_admin = True
+        self.assertEqual({'uuid': fakes.ID_OS_INSTANCE_2,
+                          'availability_zone': 'fake_zone'},
+                         describer.get_os_filters(filters))
 
         self.check_filtering(
             'DescribeInstances', 'reservationSet',
@@ -889,6 +1049,48 @@ class InstanceTestCase(base.ApiTestCase):
             'DescribeInstances', ['reservationSet', 'instancesSet'],
             fakes.ID_EC2_INSTANCE_1, 'instanceId')
 
+    def test_describe_os_instance(self):
+        instance_api.instance_engine = (
+            instance_api.InstanceEngineNeutron())
+        self.set_mock_db_items(
+            fakes.DB_INSTANCE_1, fakes.DB_INSTANCE_2, fakes.DB_IMAGE_1,
+            fakes.DB_IMAGE_ARI_1, fakes.DB_IMAGE_AKI_1)
+        self.nova.servers.get.return_value = fakes.OS_INSTANCE_1
+        self.novadb.instance_get_by_uuid.return_value = (
+            fakes.NOVADB_INSTANCE_1)
+        self.novadb.block_device_mapping_get_all_by_instance.return_value = (
+            fakes.NOVADB_BDM_INSTANCE_1)
+        describe_enis = (self.network_interface_api.
+                         _describe_os_instance_network_interfaces)
+        describe_enis.return_value = [
+            copy.deepcopy(fakes.EC2_NETWORK_INTERFACE_2)]
+        context = self._create_context()
+        # NOTE(ft): the result is not rendered to XML, which makes an empty
+        # list of None
+        expected = copy.deepcopy(fakes.EC2_RESERVATION_1)
+        expected['instancesSet'][0]['productCodesSet'] = None
+
+        self.assertThat(
+            instance_api.describe_os_instance(context,
+                                              fakes.ID_OS_INSTANCE_1),
+            matchers.DictMatches(expected, orderless_lists=True))
+        self.nova.servers.get.assert_called_once_with(fakes.ID_OS_INSTANCE_1)
+        describe_enis.assert_called_once_with(context, fakes.ID_OS_INSTANCE_1)
+        self.assertFalse(self.nova.servers.list.called)
+        self.assertFalse(self.db_api.get_items.called)
+        self.assertFalse(
+            self.network_interface_api.describe_network_interfaces.called)
+
+        context.project_id = fakes.random_os_id()
+        self.assertRaises(exception.InvalidInstanceIDNotFound,
+                          instance_api.describe_os_instance,
+                          context, fakes.ID_OS_INSTANCE_1)
+
+        self.nova.servers.get.side_effect = nova_exception.NotFound('fake')
+        self.assertRaises(exception.InvalidInstanceIDNotFound,
+                          instance_api.describe_os_instance,
+                          self._create_context(), fakes.ID_OS_INSTANCE_1)
+
     def test_describe_instances_ec2_classic(self):
         instance_api.instance_engine = (
             instance_api.InstanceEngineNova())
@@ -907,6 +1109,47 @@ class InstanceTestCase(base.ApiTestCase):
             {'reservationSet': [fakes.EC2_RESERVATION_2]},
             orderless_lists=True))
 
+    @mock.patch('ec2api.api.instance._remove_instances')
+    def test_describe_instances_pagination(self, remove_instances):
+        self.configure(pagination_token_key='fake_key')
+        instance_api.instance_engine = (
+            instance_api.InstanceEngineNova())
+        self.set_mock_db_items(
+            fakes.DB_INSTANCE_1, fakes.DB_INSTANCE_2, fakes.DB_IMAGE_1,
+            fakes.DB_IMAGE_2, fakes.DB_VOLUME_1, fakes.DB_VOLUME_2,
+            fakes.DB_VOLUME_3)
+        self.nova.servers.list.return_value = [fakes.OS_INSTANCE_2]
+        self.novadb.instance_get_by_uuid.return_value = (
+            fakes.NOVADB_INSTANCE_2)
+        self.novadb.block_device_mapping_get_all_by_instance.return_value = (
+            fakes.NOVADB_BDM_INSTANCE_2)
+
+        resp = self.execute('DescribeInstances', {'MaxResults': '1'})
+
+        self.assertThat(resp['reservationSet'], matchers.ListMatches(
+            [fakes.EC2_RESERVATION_2], orderless_lists=True))
+        self.assertIn('nextToken', resp)
+        self.nova.servers.list.assert_called_once_with(
+            search_opts=mock.ANY, limit=1)
+        self.assertEqual(1, self.novadb.instance_get_by_uuid.call_count)
+        # NOTE(ft): the instance is absent in the page, but it isn't obsolete
+        remove_instances.assert_called_once_with(mock.ANY, [],
+                                                 purge_linked_items=False)
+
+        self.nova.servers.list.reset_mock()
+        self.nova.servers.list.return_value = []
+        resp = self.execute('DescribeInstances',
+                            {'MaxResults': '1',
+                             'NextToken': resp['nextToken']})
+
+        self.assertEqual({'reservationSet': []}, resp)
+        self.nova.servers.list.assert_called_once_with(
+            search_opts=mock.ANY, limit=1, marker=fakes.ID_OS_INSTANCE_2)
+
+        self.assert_execution_error(
+            'InvalidParameterCombination', 'DescribeInstances',
+            {'MaxResults': '1', 'InstanceId.1': fakes.ID_EC2_INSTANCE_1})
+
     def test_describe_instances_mutliple_networks(self):
         """Describe 2 instances with various combinations of network."""
         instance_api.instance_engine = (
@@ -1084,6 +1327,20 @@ class InstanceTestCase(base.ApiTestCase):
         do_check(fakes.ID_EC2_INSTANCE_2, 'userData',
                  {'userData': {'value': fakes.USER_DATA_INSTANCE_2}})
 
+    def _fake_create_network_interfaces(self, network_interfaces):
+        network_interfaces = itertools.cycle(network_interfaces)
+
+        def create_network_interfaces(context, cleaner, count, subnet_id,
+                                      **kwargs):
+            created = [next(network_interfaces) for _i in range(count)]
+            for network_interface in created:
+                cleaner.addCleanup(self.neutron.delete_port,
+                                   network_interface['os_id'])
+            return [(network_interface, None)
+                    for network_interface in created]
+
+        return create_network_interfaces
+
     def _build_multiple_data_model(self):
         # NOTE(ft): generate necessary fake data
         # We need 4 detached ports in 2 subnets.
@@ -1742,6 +1999,49 @@ class InstancePrivateTestCase(test_base.BaseTestCase):
                                  'volumeId': 'vol-00000002',
                                  }}]}))
 
+    @mock.patch('cinderclient.v1.client.Client')
+    @mock.patch('ec2api.api.instance.novadb')
+    def test_format_instance_bdm_prefetched_volumes(self, novadb, cinder):
+        cinder = cinder.return_value
+        cinder.volumes.get.return_value = mock.Mock(status='available',
+                                                    attachments=[])
+        id_os_instance = fakes.random_os_id()
+        novadb.block_device_mapping_get_all_by_instance.return_value = (
+            [{'device_name': '/dev/sdb1',
+              'delete_on_termination': False,
+              'snapshot_id': None,
+              'volume_id': '2',
+              'no_device': False},
+             {'device_name': '/dev/sdb2',
+              'delete_on_termination': True,
+              'snapshot_id': None,
+              'volume_id': '3',
+              'no_device': False}])
+        fake_context = mock.Mock(service_catalog=[{'type': 'fake'}])
+
+        result = {}
+        instance_api._cloud_format_instance_bdm(
+            fake_context, id_os_instance, '/dev/vda', result,
+            {'2': {'id': 'vol-00000002'}, '3': {'id': 'vol-00000003'}},
+            {'2': mock.Mock(status='in-use', attachments=[{}])})
+        self.assertThat(
+            result,
+            matchers.DictMatches({
+                'rootDeviceType': 'instance-store',
+                'blockDeviceMapping': [
+                        {'deviceName': '/dev/sdb1',
+                         'ebs': {'status': 'attached',
+                                 'deleteOnTermination': False,
+                                 'volumeId': 'vol-00000002',
+                                 }},
+                        {'deviceName': '/dev/sdb2',
+                         'ebs': {'status': 'detached',
+                                 'deleteOnTermination': True,
+                                 'volumeId': 'vol-00000003',
+                                 }}]},
+                orderless_lists=True))
+        cinder.volumes.get.assert_called_once_with('3')
+
     @mock.patch('ec2api.api.instance._remove_instances')
     @mock.patch('novaclient.v1_1.client.Client')
     def test_get_os_instances_by_instances(self, nova, remove_instances):
@@ -1773,11 +2073,9 @@ class InstancePrivateTestCase(test_base.BaseTestCase):
         do_check(True)
         do_check(False)
 
-    @mock.patch('ec2api.api.network_interface._detach_network_interface_item')
     @mock.patch('ec2api.api.address._disassociate_address_item')
     @mock.patch('ec2api.db.api.IMPL')
-    def test_remove_instances(self, db_api, disassociate_address_item,
-                              detach_network_interface_item):
+    def test_remove_instances(self, db_api, disassociate_address_item):
         fake_context = mock.Mock(service_catalog=[{'type': 'fake'}])
 
         instances = [{'id': fakes.random_ec2_id('i')}
@@ -1812,14 +2110,18 @@ class InstancePrivateTestCase(test_base.BaseTestCase):
             *(network_interfaces + addresses))
 
         def check_calls():
-            for eni in network_interfaces_to_detach:
-                detach_network_interface_item.assert_any_call(fake_context,
-                                                              eni)
-            for eni in network_interfaces_to_delete:
-                db_api.delete_item.assert_any_call(fake_context, eni['id'])
+            db_api.update_items.assert_called_once_with(
+                fake_context,
+                [{'id': eni['id']} for eni in network_interfaces_to_detach])
+            db_api.delete_items.assert_called_once_with(
+                fake_context,
+                [network_interfaces_to_delete[0]['id'],
+                 network_interfaces_to_delete[1]['id'],
+                 instances_to_remove[0]['id'],
+                 instances_to_remove[1]['id'],
+                 instances_to_remove[2]['id']])
             for addr in addresses_to_dissassociate:
                 disassociate_address_item.assert_any_call(fake_context, addr)
-            detach_network_interface_item.reset_mock()
             db_api.reset_mock()
             disassociate_address_item.reset_mock()
 
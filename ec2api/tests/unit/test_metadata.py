@@ -21,6 +21,7 @@ import webob
 
 from ec2api import exception
 from ec2api import metadata
+from ec2api.metadata import cache
 from ec2api.tests.unit import fakes
 from ec2api.tests.unit import matchers
 
@@ -40,6 +41,8 @@ class ProxyTestCase(test_base.BaseTestCase):
                     nova_client_cert='nova_cert',
                     nova_client_priv_key='nova_priv_key',
                     metadata_proxy_shared_secret='secret')
+        cache.reset()
+        self.addCleanup(cache.reset)
 
     @mock.patch('ec2api.metadata.api.get_version_list')
     def test_callable(self, get_version_list):
@@ -170,32 +173,24 @@ class ProxyTestCase(test_base.BaseTestCase):
 
         req = mock.Mock(path_info='/openstack', query_string='', headers=hdrs,
                         method=method, body=body)
-        resp = mock.MagicMock(status=response_code)
+        resp = mock.MagicMock(status_code=response_code,
+                              headers={'content-type': 'text/plain'},
+                              content='content')
         req.response = resp
         build_headers.return_value = hdrs
-        with mock.patch('httplib2.Http') as mock_http:
-            resp.__getitem__.return_value = "text/plain"
-            mock_http.return_value.request.return_value = (resp, 'content')
+        with mock.patch('ec2api.http_pool.request') as mock_request:
+            mock_request.return_value = resp
 
             retval = self.handler._proxy_request(req)
-            mock_http.assert_called_once_with(
-                ca_certs=None, disable_ssl_certificate_validation=True)
-            mock_http.assert_has_calls([
-                mock.call().add_certificate(
-                    cfg.CONF.metadata.nova_client_priv_key,
-                    cfg.CONF.metadata.nova_client_cert,
-                    "%s:%s" % (cfg.CONF.metadata.nova_metadata_ip,
-                               cfg.CONF.metadata.nova_metadata_port)
-                ),
-                mock.call().request(
-                    'http://9.9.9.9:8775/openstack',
-                    method=method,
-                    headers={
-                        'X-Forwarded-For': '8.8.8.8',
-                    },
-                    body=body
-                )]
-            )
+            mock_request.assert_called_once_with(
+                method, 'http://9.9.9.9:8775/openstack',
+                headers={
+                    'X-Forwarded-For': '8.8.8.8',
+                },
+                data=body,
+                verify=False,
+                cert=(cfg.CONF.metadata.nova_client_cert,
+                      cfg.CONF.metadata.nova_client_priv_key))
             build_headers.assert_called_once_with(req)
 
             return retval
@@ -349,8 +344,8 @@ class ProxyTestCase(test_base.BaseTestCase):
         nova.return_value.servers.list.return_value = [fakes.OS_INSTANCE_1]
         db_api.get_item_ids.return_value = [
                 (fakes.ID_EC2_INSTANCE_1, fakes.ID_OS_INSTANCE_1)]
-        instance_api.describe_instances.return_value = {
-               'reservationSet': [fakes.EC2_RESERVATION_1]}
+        instance_api.describe_os_instance.return_value = (
+               fakes.EC2_RESERVATION_1)
         instance_api.describe_instance_attribute.return_value = {
                 'instanceId': fakes.ID_EC2_INSTANCE_1,
                 'userData': {'value': 'fake_user_data'}}
@@ -12,11 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import eventlet
 import mock
 from novaclient import exceptions as nova_exception
 
 from ec2api import exception
 from ec2api.metadata import api
+from ec2api.metadata import cache
 from ec2api.tests.unit import base
 from ec2api.tests.unit import fakes
 from ec2api.tests.unit import matchers
@@ -39,8 +41,8 @@ class MetadataApiTestCase(base.ApiTestCase):
         self.addCleanup(instance_api_patcher.stop)
 
         self.set_mock_db_items(fakes.DB_INSTANCE_1)
-        self.instance_api.describe_instances.return_value = {
-               'reservationSet': [fakes.EC2_RESERVATION_1]}
+        self.instance_api.describe_os_instance.return_value = (
+               fakes.EC2_RESERVATION_1)
         self.instance_api.describe_instance_attribute.return_value = {
                 'instanceId': fakes.ID_EC2_INSTANCE_1,
                 'userData': {'value': 'fake_user_data'}}
@@ -49,6 +51,10 @@ class MetadataApiTestCase(base.ApiTestCase):
                 fakes.NOVADB_BDM_INSTANCE_1)
 
         self.fake_context = self._create_context()
+        # NOTE(ft): tests change mocks between calls, so the cache is
+        # turned on explicitly by tests of the cache only
+        self.configure(cache_expiration=0, group='metadata')
+        self.addCleanup(cache.reset)
 
     def test_get_version_list(self):
         retval = api.get_version_list()
@@ -93,10 +99,8 @@ class MetadataApiTestCase(base.ApiTestCase):
               api.get_metadata_item, self.fake_context, ['9999-99-99'],
               fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2)
 
-        self.db_api.get_item_ids.assert_called_with(
-            self.fake_context, 'i', (fakes.ID_OS_INSTANCE_1,))
-        self.instance_api.describe_instances.assert_called_with(
-            self.fake_context, [fakes.ID_EC2_INSTANCE_1])
+        self.instance_api.describe_os_instance.assert_called_with(
+            self.fake_context, fakes.ID_OS_INSTANCE_1)
         self.instance_api.describe_instance_attribute.assert_called_with(
             self.fake_context, fakes.ID_EC2_INSTANCE_1, 'userData')
         self.novadb.instance_get_by_uuid.assert_called_with(
@@ -104,11 +108,133 @@ class MetadataApiTestCase(base.ApiTestCase):
         (self.novadb.block_device_mapping_get_all_by_instance.
          assert_called_with(self.fake_context, fakes.ID_OS_INSTANCE_1))
 
+    def test_cache(self):
+        self.configure(cache_expiration=15, group='metadata')
+        self.nova.servers.list.return_value = [fakes.OS_INSTANCE_1]
+        self.nova.servers.get.return_value = fakes.OS_INSTANCE_1
+        self.nova.fixed_ips.get.return_value = mock.Mock(hostname='fake_name')
+
+        for _i in range(2):
+            self.assertEqual(
+                (fakes.ID_OS_INSTANCE_1, fakes.ID_OS_PROJECT),
+                api.get_os_instance_and_project_id(
+                    self.fake_context, fakes.IP_NETWORK_INTERFACE_2))
+            self.assertEqual(
+                'fake_user_data',
+                api.get_metadata_item(
+                    self.fake_context, ['latest', 'user-data'],
+                    fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2))
+        self.assertEqual(1, self.nova.fixed_ips.get.call_count)
+        self.nova.servers.get.assert_called_once_with(fakes.ID_OS_INSTANCE_1)
+        self.assertEqual(1, self.instance_api.describe_os_instance.call_count)
+
+        self.assertEqual(
+            fakes.IP_NETWORK_INTERFACE_2,
+            api.get_metadata_item(
+                self.fake_context, ['latest', 'meta-data', 'local-ipv4'],
+                fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2))
+        self.assertEqual(1, self.instance_api.describe_os_instance.call_count)
+
+        # NOTE(ft): a cached metadata must not be given to other tenants
+        self.fake_context.project_id = fakes.random_os_id()
+        self.assertRaises(
+            exception.EC2MetadataNotFound,
+            api.get_metadata_item, self.fake_context, ['latest'],
+            fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2)
+
+        with mock.patch.object(cache, 'time') as time:
+            time.time.return_value = 2 ** 40
+            api.get_os_instance_and_project_id(self.fake_context,
+                                               fakes.IP_NETWORK_INTERFACE_2)
+        self.assertEqual(2, self.nova.fixed_ips.get.call_count)
+
+        # NOTE(ft): the cached IP is given to another instance
+        self.nova.servers.get.return_value = fakes.OS_INSTANCE_2
+        self.nova.servers.list.return_value = [fakes.OS_INSTANCE_2]
+        self.assertRaises(exception.EC2MetadataNotFound,
+                          api.get_os_instance_and_project_id,
+                          self.fake_context, fakes.IP_NETWORK_INTERFACE_2)
+        self.assertEqual(3, self.nova.fixed_ips.get.call_count)
+
+        self.nova.servers.list.return_value = [fakes.OS_INSTANCE_1]
+        api.get_os_instance_and_project_id(self.fake_context,
+                                           fakes.IP_NETWORK_INTERFACE_2)
+        self.assertEqual(4, self.nova.fixed_ips.get.call_count)
+        self.nova.servers.get.side_effect = nova_exception.NotFound('fake')
+        api.get_os_instance_and_project_id(self.fake_context,
+                                           fakes.IP_NETWORK_INTERFACE_2)
+        self.assertEqual(5, self.nova.fixed_ips.get.call_count)
+
+    def test_coalesce_builds(self):
+        describe_os_instance = self.instance_api.describe_os_instance
+
+        def fake_describe_os_instance(*args, **kwargs):
+            # NOTE(ft): let other requests come while metadata is building
+            eventlet.sleep(0)
+            return describe_os_instance.return_value
+
+        describe_os_instance.side_effect = fake_describe_os_instance
+
+        def get_user_data():
+            return api.get_metadata_item(
+                self.fake_context, ['latest', 'user-data'],
+                fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2)
+
+        pool = eventlet.GreenPool()
+        results = [pool.spawn(get_user_data) for _i in range(5)]
+        self.assertEqual(['fake_user_data'] * 5,
+                         [result.wait() for result in results])
+        self.assertEqual(1, describe_os_instance.call_count)
+        self.assertEqual({}, api._builds)
+
+        describe_os_instance.side_effect = (
+            exception.InvalidInstanceIDNotFound(id=fakes.ID_OS_INSTANCE_1))
+        results = [pool.spawn(get_user_data) for _i in range(2)]
+        for result in results:
+            self.assertRaises(exception.EC2MetadataNotFound, result.wait)
+        self.assertEqual({}, api._builds)
+
+    def test_build_metadata_concurrently(self):
+        in_progress = []
+        max_in_progress = []
+
+        def fake_fetch(result):
+            def fetch(*args, **kwargs):
+                in_progress.append(result)
+                max_in_progress.append(len(in_progress))
+                eventlet.sleep(0)
+                in_progress.remove(result)
+                return result
+            return fetch
+
+        self.instance_api.describe_instance_attribute.side_effect = (
+            fake_fetch({'instanceId': fakes.ID_EC2_INSTANCE_1,
+                        'userData': {'value': 'fake_user_data'}}))
+        self.novadb.instance_get_by_uuid.side_effect = (
+            fake_fetch(fakes.NOVADB_INSTANCE_1))
+        self.novadb.block_device_mapping_get_all_by_instance.side_effect = (
+            fake_fetch(fakes.NOVADB_BDM_INSTANCE_1))
+
+        retval = api.get_metadata_item(
+            self.fake_context,
+            ['latest', 'meta-data', 'public-keys', '0', 'openssh-key'],
+            fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2)
+        self.assertEqual(fakes.PUBLIC_KEY_KEY_PAIR, retval)
+        self.assertEqual(3, max(max_in_progress))
+
     def test_invalid_path(self):
         self.assertRaises(exception.EC2MetadataNotFound,
                           api.get_metadata_item, self.fake_context,
                           ['9999-99-99', 'user-data-invalid'],
                           fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2)
+        self.assertRaises(exception.EC2MetadataNotFound,
+                          api.get_metadata_item, self.fake_context,
+                          ['latest', 'user-data-invalid'],
+                          fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2)
+        self.assertRaises(exception.EC2MetadataNotFound,
+                          api.get_metadata_item, self.fake_context,
+                          ['latest', 'meta-data', 'instance-id', 'invalid'],
+                          fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2)
 
     def test_mismatch_project_id(self):
         self.fake_context.project_id = fakes.random_os_id()
@@ -118,8 +244,8 @@ class MetadataApiTestCase(base.ApiTestCase):
               fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2)
 
     def test_non_existing_instance(self):
-        self.instance_api.describe_instances.return_value = {
-               'reservationSet': []}
+        self.instance_api.describe_os_instance.side_effect = (
+               exception.InvalidInstanceIDNotFound(id=fakes.ID_OS_INSTANCE_1))
         self.assertRaises(
               exception.EC2MetadataNotFound,
               api.get_metadata_item, self.fake_context, ['2009-04-04'],
@@ -141,8 +267,8 @@ class MetadataApiTestCase(base.ApiTestCase):
               fakes.ID_OS_INSTANCE_1, fakes.IP_NETWORK_INTERFACE_2)
 
     def test_security_groups(self):
-        self.instance_api.describe_instances.return_value = {
-               'reservationSet': [fakes.EC2_RESERVATION_2]}
+        self.instance_api.describe_os_instance.return_value = (
+               fakes.EC2_RESERVATION_2)
         retval = api.get_metadata_item(
                self.fake_context,
                ['2009-04-04', 'meta-data', 'security-groups'],
@@ -166,8 +292,8 @@ class MetadataApiTestCase(base.ApiTestCase):
         self.assertEqual(fakes.IP_NETWORK_INTERFACE_2, retval)
 
     def test_local_ipv4_from_address(self):
-        self.instance_api.describe_instances.return_value = {
-               'reservationSet': [fakes.EC2_RESERVATION_2]}
+        self.instance_api.describe_os_instance.return_value = (
+               fakes.EC2_RESERVATION_2)
         retval = api.get_metadata_item(
                self.fake_context,
                ['2009-04-04', 'meta-data', 'local-ipv4'],
@@ -14,17 +14,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from keystoneclient.contrib.ec2 import utils as ec2_utils
 from lxml import etree
 import mock
 from oslo_config import cfg
+from oslo_config import fixture as config_fixture
+from oslo_utils import timeutils
 from oslotest import base as test_base
-import requests
 import webob.dec
 import webob.exc
 
 from ec2api import api as ec2
 from ec2api import context
 from ec2api import exception
+from ec2api import http_pool
 from ec2api.tests.unit import tools
 from ec2api import wsgi
 
@@ -104,11 +107,12 @@ class ExecutorTestCase(test_base.BaseTestCase):
 class FakeResponse(object):
     reason = "Test Reason"
 
-    def __init__(self, status_code=400):
+    def __init__(self, status_code=400, result=None):
         self.status_code = status_code
+        self.result = result or {}
 
     def json(self):
-        return {}
+        return self.result
 
 
 class KeystoneAuthTestCase(test_base.BaseTestCase):
@@ -139,7 +143,7 @@ class KeystoneAuthTestCase(test_base.BaseTestCase):
         resp = self.kauth(req)
         self._validate_ec2_error(resp, 400, 'AuthFailure')
 
-    @mock.patch.object(requests, 'request', return_value=FakeResponse())
+    @mock.patch.object(http_pool, 'request', return_value=FakeResponse())
     def test_communication_failure(self, mock_request):
         req = wsgi.Request.blank('/test')
         req.GET['Signature'] = 'test-signature'
@@ -151,7 +155,7 @@ class KeystoneAuthTestCase(test_base.BaseTestCase):
                                         data=mock.ANY, headers=mock.ANY)
 
     @tools.screen_all_logs
-    @mock.patch.object(requests, 'request', return_value=FakeResponse(200))
+    @mock.patch.object(http_pool, 'request', return_value=FakeResponse(200))
     def test_no_result_data(self, mock_request):
         req = wsgi.Request.blank('/test')
         req.GET['Signature'] = 'test-signature'
@@ -161,3 +165,92 @@ class KeystoneAuthTestCase(test_base.BaseTestCase):
         mock_request.assert_called_with('POST',
                                         CONF.keystone_url + '/ec2tokens',
                                         data=mock.ANY, headers=mock.ANY)
+
+    @mock.patch.object(http_pool, 'request')
+    def test_token_cache(self, mock_request):
+        conf = self.useFixture(config_fixture.Config())
+        conf.config(keystone_ec2_tokens_cache_time=60)
+        self.addCleanup(ec2.token_cache.clear)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        token_response = FakeResponse(200, {'access': {
+            'token': {'id': 'fake_token',
+                      'expires': '2100-01-01T00:00:00Z',
+                      'tenant': {'id': 'fake_project'}},
+            'user': {'id': 'fake_user', 'roles': []},
+            'serviceCatalog': []}})
+        credential_response = FakeResponse(200, {'credential': {
+            'access': 'test-key-id', 'secret': 'fake_secret'}})
+        mock_request.side_effect = (
+            lambda method, url, **kwargs: (token_response
+                                           if method == 'POST' else
+                                           credential_response))
+        unauthorized = []
+
+        @webob.dec.wsgify
+        def fake_app(req):
+            self.assertEqual('fake_token',
+                             req.environ['ec2api.context'].auth_token)
+            if unauthorized:
+                raise webob.exc.HTTPUnauthorized()
+            return 'OK'
+
+        kauth = ec2.EC2KeystoneAuth(fake_app)
+
+        def do_request(timestamp, secret='fake_secret'):
+            params = {'Action': 'DescribeInstances',
+                      'AWSAccessKeyId': 'test-key-id',
+                      'SignatureVersion': '2',
+                      'SignatureMethod': 'HmacSHA256',
+                      'Timestamp': timestamp}
+            req = wsgi.Request.blank('/test')
+            params['Signature'] = ec2_utils.Ec2Signer(secret).generate(
+                {'host': req.host, 'verb': 'GET', 'path': '/test',
+                 'params': params})
+            req.GET.update(params)
+            return kauth(req)
+
+        def get_keystone_auth_count():
+            return len([c for c in mock_request.mock_calls
+                        if c[1][0] == 'POST'])
+
+        # NOTE(ft): requests of a client differ by timestamps
+        self.assertEqual(200, do_request('2015-01-01T00:00:00').status_code)
+        self.assertEqual(200, do_request('2015-01-01T00:00:10').status_code)
+        self.assertEqual(1, get_keystone_auth_count())
+        mock_request.assert_any_call(
+            'GET', CONF.keystone_url +
+            '/users/fake_user/credentials/OS-EC2/test-key-id',
+            headers={'X-Auth-Token': 'fake_token'})
+
+        # NOTE(ft): a wrong signature drops the cached secret
+        token_response.status_code = 401
+        self.assertEqual(
+            401,
+            do_request('2015-01-01T00:00:20',
+                       secret='another_secret').status_code)
+        self.assertEqual(2, get_keystone_auth_count())
+        token_response.status_code = 200
+        do_request('2015-01-01T00:00:25')
+        self.assertEqual(3, get_keystone_auth_count())
+
+        timeutils.advance_time_seconds(61)
+        do_request('2015-01-01T00:01:30')
+        self.assertEqual(4, get_keystone_auth_count())
+
+        unauthorized.append(True)
+        self.assertEqual(401, do_request('2015-01-01T00:01:40').status_code)
+        self.assertEqual(4, get_keystone_auth_count())
+        do_request('2015-01-01T00:01:50')
+        self.assertEqual(5, get_keystone_auth_count())
+
+        del unauthorized[:]
+        conf.config(keystone_ec2_tokens_cache_time=3600)
+        do_request('2015-01-01T00:02:00')
+        self.assertEqual(6, get_keystone_auth_count())
+        timeutils.advance_time_seconds(ec2.TOKEN_CACHE_MAX_TIME - 1)
+        do_request('2015-01-01T00:06:59')
+        self.assertEqual(6, get_keystone_auth_count())
+        timeutils.advance_time_seconds(1)
+        do_request('2015-01-01T00:07:00')
+        self.assertEqual(7, get_keystone_auth_count())
@@ -18,7 +18,9 @@ import copy
 import mock
 from neutronclient.common import exceptions as neutron_exception
 
+from ec2api.api import common
 from ec2api.api import ec2utils
+from ec2api.api import network_interface as network_interface_api
 from ec2api.tests.unit import base
 from ec2api.tests.unit import fakes
 from ec2api.tests.unit import matchers
@@ -257,6 +259,56 @@ class NetworkInterfaceTestCase(base.ApiTestCase):
         self.db_api.delete_item.assert_called_once_with(
             mock.ANY, fakes.ID_EC2_NETWORK_INTERFACE_1)
 
+    @tools.screen_unexpected_exception_logs
+    def test_create_network_interfaces_in_bulk(self):
+        self.set_mock_db_items(fakes.DB_SUBNET_1, fakes.DB_VPC_1)
+        self.neutron.show_subnet.return_value = {'subnet': fakes.OS_SUBNET_1}
+        os_ports = [fakes.OS_PORT_1, fakes.OS_PORT_2]
+        self.neutron.create_port.return_value = {'ports': os_ports}
+        network_interfaces = [fakes.DB_NETWORK_INTERFACE_1,
+                              fakes.DB_NETWORK_INTERFACE_2]
+        self.db_api.add_items.return_value = network_interfaces
+        context = self._create_context()
+
+        with common.OnCrashCleaner() as cleaner:
+            result = network_interface_api._create_network_interfaces(
+                context, cleaner, 2, fakes.ID_EC2_SUBNET_1)
+        self.assertEqual(zip(network_interfaces, os_ports), result)
+        os_port_body = {'network_id': fakes.ID_OS_NETWORK_1,
+                        'fixed_ips': [{'subnet_id': fakes.ID_OS_SUBNET_1}],
+                        'security_groups': []}
+        self.neutron.create_port.assert_called_once_with(
+            {'ports': [os_port_body, os_port_body]})
+        self.db_api.add_items.assert_called_once_with(
+            mock.ANY, 'eni',
+            [{'os_id': os_port['id'],
+              'vpc_id': fakes.ID_EC2_VPC_1,
+              'subnet_id': fakes.ID_EC2_SUBNET_1,
+              'description': None,
+              'private_ip_address': os_port['fixed_ips'][0]['ip_address']}
+             for os_port in os_ports])
+        self.neutron.update_port.assert_has_calls(
+            [mock.call(os_port['id'], {'port': {'name': eni['id']}})
+             for eni, os_port in zip(network_interfaces, os_ports)],
+            any_order=True)
+
+        # NOTE(ft): all ports are deleted if one of them is not updated
+        self.neutron.update_port.side_effect = [
+            None, neutron_exception.NeutronClientException()]
+
+        def do_create():
+            with common.OnCrashCleaner() as cleaner:
+                network_interface_api._create_network_interfaces(
+                    context, cleaner, 2, fakes.ID_EC2_SUBNET_1)
+
+        self.assertRaises(neutron_exception.NeutronClientException,
+                          do_create)
+        self.neutron.delete_port.assert_has_calls(
+            [mock.call(fakes.ID_OS_PORT_2), mock.call(fakes.ID_OS_PORT_1)])
+        self.db_api.delete_item.assert_has_calls(
+            [mock.call(mock.ANY, fakes.ID_EC2_NETWORK_INTERFACE_2),
+             mock.call(mock.ANY, fakes.ID_EC2_NETWORK_INTERFACE_1)])
+
     def test_delete_network_interface(self):
         self.set_mock_db_items(fakes.DB_NETWORK_INTERFACE_1)
         resp = self.execute(
@@ -390,6 +442,33 @@ class NetworkInterfaceTestCase(base.ApiTestCase):
             'DescribeNetworkInterfaces', 'networkInterfaceSet',
             fakes.ID_EC2_NETWORK_INTERFACE_1, 'networkInterfaceId')
 
+    def test_describe_os_instance_network_interfaces(self):
+        self.set_mock_db_items(
+            fakes.DB_NETWORK_INTERFACE_1, fakes.DB_NETWORK_INTERFACE_2,
+            fakes.DB_ADDRESS_1, fakes.DB_ADDRESS_2,
+            fakes.DB_INSTANCE_1, fakes.DB_INSTANCE_2)
+        self.neutron.list_ports.return_value = {'ports': [fakes.OS_PORT_2]}
+        self.neutron.list_floatingips.return_value = (
+            {'floatingips': [fakes.OS_FLOATING_IP_2]})
+        context = self._create_context()
+
+        self.assertThat(
+            network_interface_api._describe_os_instance_network_interfaces(
+                context, fakes.ID_OS_INSTANCE_1),
+            matchers.ListMatches([fakes.EC2_NETWORK_INTERFACE_2],
+                                 orderless_lists=True),
+            verbose=True)
+        self.neutron.list_ports.assert_called_once_with(
+            device_id=fakes.ID_OS_INSTANCE_1)
+        self.neutron.list_floatingips.assert_called_once_with(
+            port_id=[fakes.ID_OS_PORT_2])
+        self.assertFalse(self.neutron.list_security_groups.called)
+
+        self.neutron.list_ports.return_value = {'ports': []}
+        self.assertEqual(
+            [], network_interface_api._describe_os_instance_network_interfaces(
+                context, fakes.ID_OS_INSTANCE_2))
+
     def test_describe_network_interface_attribute(self):
         self.set_mock_db_items(fakes.DB_NETWORK_INTERFACE_1)
 
@@ -422,6 +501,7 @@ class NetworkInterfaceTestCase(base.ApiTestCase):
              'SourceDestCheck.Value': 'True'})
 
     def test_reset_network_interface_attribute(self):
+        self.set_mock_db_items(fakes.DB_NETWORK_INTERFACE_1)
         self.execute(
             'ResetNetworkInterfaceAttribute',
             {'NetworkInterfaceId':
@@ -284,6 +284,7 @@ class SecurityGroupTestCase(base.ApiTestCase):
             self.neutron.reset_mock()
             self.db_api.reset_mock()
 
+        self.set_mock_db_items(fakes.DB_SECURITY_GROUP_2)
         self.execute(
             'AuthorizeSecurityGroupIngress',
             {'GroupId': fakes.ID_EC2_SECURITY_GROUP_2,
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+
 import mock
 
 from ec2api.api import ec2utils
@@ -202,3 +204,28 @@ class TagTestCase(base.ApiTestCase):
                                           'key': 'fake-key',
                                           'value': 'fake-value'}]},
                              resp)
+
+    def test_describe_tags_pagination(self):
+        self.configure(pagination_token_key='fake_key')
+        tags = [{'item_id': item_id, 'key': key, 'value': 'fake-value'}
+                for item_id in (fakes.ID_EC2_VPC_2, fakes.ID_EC2_VPC_1)
+                for key in ('key2', 'key1')]
+        self.db_api.get_tags.side_effect = (
+            lambda *args, **kwargs: copy.deepcopy(tags))
+        expected_tags = [{'resourceType': 'vpc',
+                          'resourceId': tag['item_id'],
+                          'key': tag['key'],
+                          'value': tag['value']}
+                         for tag in sorted(tags, key=lambda t: (t['item_id'],
+                                                                t['key']))]
+
+        resp = self.execute('DescribeTags', {'MaxResults': '3'})
+        self.assertEqual(expected_tags[:3], resp['tagSet'])
+        self.assertIn('nextToken', resp)
+
+        resp = self.execute('DescribeTags', {'MaxResults': '3',
+                                             'NextToken': resp['nextToken']})
+        self.assertEqual({'tagSet': expected_tags[3:]}, resp)
+
+        self.assert_execution_error('InvalidParameterValue', 'DescribeTags',
+                                    {'NextToken': 'fake_token'})
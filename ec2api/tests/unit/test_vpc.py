@@ -121,12 +121,9 @@ class VpcTestCase(base.ApiTestCase):
         self.assertEqual(True, resp['return'])
         self.neutron.delete_router.assert_called_once_with(
             fakes.ID_OS_ROUTER_1)
-        self.db_api.delete_item.assert_any_call(
+        self.db_api.delete_items.assert_called_once_with(
             mock.ANY,
-            fakes.ID_EC2_VPC_1)
-        self.db_api.delete_item.assert_any_call(
-            mock.ANY,
-            fakes.ID_EC2_ROUTE_TABLE_1)
+            [fakes.ID_EC2_VPC_1, fakes.ID_EC2_ROUTE_TABLE_1])
 
     def test_delete_vpc_not_found(self):
         self.set_mock_db_items()
@@ -134,14 +131,14 @@ class VpcTestCase(base.ApiTestCase):
         self.assert_execution_error('InvalidVpcID.NotFound', 'DeleteVpc',
                                     {'VpcId': fakes.ID_EC2_VPC_1})
         self.assertEqual(0, self.neutron.delete_router.call_count)
-        self.assertEqual(0, self.db_api.delete_item.call_count)
+        self.assertEqual(0, self.db_api.delete_items.call_count)
 
     def test_delete_vpc_dependency_violation(self):
         def do_check():
             self.assert_execution_error('DependencyViolation', 'DeleteVpc',
                                         {'VpcId': fakes.ID_EC2_VPC_1})
             self.assertEqual(0, self.neutron.delete_router.call_count)
-            self.assertEqual(0, self.db_api.delete_item.call_count)
+            self.assertEqual(0, self.db_api.delete_items.call_count)
 
             self.neutron.reset_mock()
             self.db_api.reset_mock()
@@ -160,12 +157,9 @@ class VpcTestCase(base.ApiTestCase):
             self.assertEqual(True, resp['return'])
             self.neutron.delete_router.assert_called_once_with(
                 fakes.ID_OS_ROUTER_1)
-            self.db_api.delete_item.assert_any_call(
-                mock.ANY,
-                fakes.ID_EC2_VPC_1)
-            self.db_api.delete_item.assert_any_call(
+            self.db_api.delete_items.assert_called_once_with(
                 mock.ANY,
-                fakes.ID_EC2_ROUTE_TABLE_1)
+                [fakes.ID_EC2_VPC_1, fakes.ID_EC2_ROUTE_TABLE_1])
 
             self.neutron.reset_mock()
             self.db_api.reset_mock()
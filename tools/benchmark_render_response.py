@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+# Copyright 2014
+# The Cloudscaling Group, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of EC2 API response rendering.
+
+Renders synthetic DescribeInstances responses of several sizes by the
+single pass renderer of APIRequest and by the legacy renderer which built
+a minidom document and reparsed it with lxml to pretty print, checks that
+both renderers produce the same xml and prints their average latency.
+
+Run like:
+
+    ./tools/benchmark_render_response.py --sizes 100,1000,2000
+"""
+
+import argparse
+import datetime
+import timeit
+from xml.dom import minidom
+
+from lxml import etree
+from oslo_utils import encodeutils
+import six
+
+from ec2api.api import apirequest
+
+
+class LegacyAPIRequest(apirequest.APIRequest):
+
+    def _render_response(self, response_data, request_id):
+        xml = minidom.Document()
+
+        response_el = xml.createElement(self.action + 'Response')
+        response_el.setAttribute('xmlns',
+                                 'http://ec2.amazonaws.com/doc/%s/'
+                                 % self.version)
+        request_id_el = xml.createElement('requestId')
+        request_id_el.appendChild(xml.createTextNode(request_id))
+        response_el.appendChild(request_id_el)
+        if response_data is True:
+            self._render_legacy_dict(xml, response_el, {'return': 'true'})
+        else:
+            self._render_legacy_dict(xml, response_el, response_data)
+
+        xml.appendChild(response_el)
+
+        response = xml.toxml()
+        root = etree.fromstring(response)
+        response = etree.tostring(root, pretty_print=True)
+
+        xml.unlink()
+        return response
+
+    def _render_legacy_dict(self, xml, el, data):
+        for key in data.keys():
+            val = data[key]
+            el.appendChild(self._render_legacy_data(xml, key, val))
+
+    def _render_legacy_data(self, xml, el_name, data):
+        el_name = apirequest._underscore_to_xmlcase(el_name)
+        data_el = xml.createElement(el_name)
+
+        if isinstance(data, list):
+            for item in data:
+                data_el.appendChild(self._render_legacy_data(xml, 'item',
+                                                             item))
+        elif isinstance(data, dict):
+            self._render_legacy_dict(xml, data_el, data)
+        elif hasattr(data, '__dict__'):
+            self._render_legacy_dict(xml, data_el, data.__dict__)
+        elif isinstance(data, bool):
+            data_el.appendChild(xml.createTextNode(str(data).lower()))
+        elif isinstance(data, datetime.datetime):
+            data_el.appendChild(
+                xml.createTextNode(apirequest._database_to_isoformat(data)))
+        elif data is not None:
+            data_el.appendChild(xml.createTextNode(
+                encodeutils.safe_encode(six.text_type(data))))
+
+        return data_el
+
+
+def generate_instance(index):
+    return {
+        'instance_id': 'i-%08x' % index,
+        'image_id': 'ami-%08x' % index,
+        'instance_state': {'code': 16, 'name': 'running'},
+        'private_dns_name': 'server-%s' % index,
+        'dns_name': None,
+        'key_name': 'key & <name>',
+        'ami_launch_index': index,
+        'instance_type': 'm1.small',
+        'launch_time': datetime.datetime.utcnow(),
+        'placement': {'availability_zone': 'nova'},
+        'private_ip_address': '10.0.%s.%s' % (index // 250, index % 250),
+        'source_dest_check': True,
+        'group_set': [{'group_id': 'sg-%08x' % index,
+                       'group_name': 'default'}],
+        'block_device_mapping': [],
+        'tag_set': [{'key': 'Name', 'value': u'server \u2603 %s' % index}],
+    }
+
+
+def generate_response(size):
+    return {'reservation_set': [
+        {'reservation_id': 'r-%08x' % index,
+         'owner_id': 'fake_project',
+         'group_set': [],
+         'instances_set': [generate_instance(index)]}
+        for index in xrange(size)]}
+
+
+def measure(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100,1000,2000',
+                        help='Comma separated numbers of instances to '
+                             'render')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    request = apirequest.APIRequest.__new__(apirequest.APIRequest)
+    legacy_request = LegacyAPIRequest.__new__(LegacyAPIRequest)
+    for req in (request, legacy_request):
+        req.action = 'DescribeInstances'
+        req.version = '2014-10-01'
+
+    print('%10s %14s %14s' % ('instances', 'legacy (ms)', 'stream (ms)'))
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        response = generate_response(size)
+        if (request._render_response(response, 'fake_request_id') !=
+                legacy_request._render_response(response,
+                                                'fake_request_id')):
+            raise RuntimeError('Renderers produce different xml')
+        legacy = measure(
+            lambda: legacy_request._render_response(response,
+                                                    'fake_request_id'),
+            args.repeat)
+        stream = measure(
+            lambda: request._render_response(response, 'fake_request_id'),
+            args.repeat)
+        print('%10d %14.3f %14.3f' % (size, legacy, stream))
+
+
+if __name__ == '__main__':
+    main()